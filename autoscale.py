@@ -0,0 +1,141 @@
+import os
+
+from tab_pool import DEFAULT_MIN_AVAILABLE_MB, available_memory_mb
+
+# watch.py --workers K --autoscale：supervisor 在 [最小, K] 之间按实测吞吐调整同时观看的 worker 数
+DEFAULT_AUTOSCALE = os.getenv("DT_AUTOSCALE", "0").strip().lower() in {"1", "true", "yes", "on"}
+DEFAULT_AUTOSCALE_MIN = int(os.getenv("DT_AUTOSCALE_MIN", "1"))
+# 每个评估窗口的秒数；调整后先丢弃一个窗口（新 worker 登录、打开课程），再用下一个窗口比较
+DEFAULT_AUTOSCALE_INTERVAL = float(os.getenv("DT_AUTOSCALE_INTERVAL", "600"))
+# 主机 CPU 忙碌比例超过该值即减少 worker
+AUTOSCALE_CPU_HIGH = float(os.getenv("DT_AUTOSCALE_CPU_HIGH", "0.85"))
+# 每标签小时卡住次数超过该值即减少 worker（Chrome 解码被限流时视频卡住、走 60s 检测与新标签重试）
+AUTOSCALE_MAX_STALLS_PER_HOUR = float(os.getenv("DT_AUTOSCALE_MAX_STALLS_PER_HOUR", "2"))
+# 新增的 worker 至少要带来 人均吞吐 × 该比例 的增量，否则撤回
+AUTOSCALE_MIN_GAIN = float(os.getenv("DT_AUTOSCALE_MIN_GAIN", "0.5"))
+# 因过载或收益不足减少后，多少个窗口内不再尝试增加
+AUTOSCALE_COOLDOWN_WINDOWS = int(os.getenv("DT_AUTOSCALE_COOLDOWN_WINDOWS", "3"))
+
+
+def _read_cpu_times() -> tuple[float, float] | None:
+    try:
+        with open("/proc/stat", "r", encoding="utf-8") as f:
+            fields = [float(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    if len(fields) < 4:
+        return None
+    # user nice system idle iowait ...：idle + iowait 视为空闲
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0.0)
+    return sum(fields), idle
+
+
+class CpuSampler:
+    """两次采样之间的主机 CPU 忙碌比例（/proc/stat）；不可读时退回 1 分钟负载 / 核数，都没有时为 None。"""
+
+    def __init__(self) -> None:
+        self._last = _read_cpu_times()
+
+    def sample(self) -> float | None:
+        cur = _read_cpu_times()
+        last, self._last = self._last, cur
+        if cur is not None and last is not None and cur[0] > last[0]:
+            total = cur[0] - last[0]
+            return max(0.0, min(1.0, 1.0 - (cur[1] - last[1]) / total))
+        try:
+            return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+        except (AttributeError, OSError):
+            return None
+
+
+def low_memory() -> bool:
+    if DEFAULT_MIN_AVAILABLE_MB <= 0:
+        return False
+    avail = available_memory_mb()
+    return avail is not None and avail < DEFAULT_MIN_AVAILABLE_MB
+
+
+class Autoscaler:
+    """
+    闭环调整 worker 数（爬山）：每个窗口汇总各 worker 的 视频前进秒数 / 观看标签秒数 / 卡住次数。
+    CPU、内存或卡住率超限 → 减一；上次增加后总吞吐没有按人均吞吐的 min_gain 比例增长 → 撤回；
+    否则在上限内加一试探。吞吐（视频秒/墙钟秒）与学时/小时成正比，学时只在课程结束时入账、太稀疏，只用于日志。
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        *,
+        min_workers: int = DEFAULT_AUTOSCALE_MIN,
+        interval: float = DEFAULT_AUTOSCALE_INTERVAL,
+        cpu_high: float = AUTOSCALE_CPU_HIGH,
+        max_stalls_per_hour: float = AUTOSCALE_MAX_STALLS_PER_HOUR,
+        min_gain: float = AUTOSCALE_MIN_GAIN,
+        cooldown_windows: int = AUTOSCALE_COOLDOWN_WINDOWS,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.interval = interval
+        self.cpu_high = cpu_high
+        self.max_stalls_per_hour = max_stalls_per_hour
+        self.min_gain = min_gain
+        self.cooldown_windows = cooldown_windows
+        self.target = self.min_workers
+        self._last_action: str | None = None
+        # 上一次调整前的 (worker 数, 吞吐)，用于判断增加是否值得
+        self._before: tuple[int, float] | None = None
+        self._cooldown = 0
+        # 每个 worker 数上试探无收益的次数：同一处反复无收益时冷却时间加倍，减少来回震荡
+        self._no_gain: dict[int, int] = {}
+
+    def decide(self, sample: dict) -> tuple[int, str]:
+        """
+        sample：throughput（视频秒/墙钟秒，全部 worker 合计）、stalls_per_hour（每标签小时）、
+        cpu（0~1 或 None）、low_memory。返回 (新的目标 worker 数, 原因)。
+        """
+        n = self.target
+        throughput = float(sample.get("throughput") or 0.0)
+        cpu = sample.get("cpu")
+        overloaded = (
+            bool(sample.get("low_memory"))
+            or (cpu is not None and cpu > self.cpu_high)
+            or float(sample.get("stalls_per_hour") or 0.0) > self.max_stalls_per_hour
+        )
+        if overloaded:
+            if n > self.min_workers:
+                return self._set(n - 1, "down", "overload", throughput)
+            return self._hold("overload_at_min")
+
+        if self._last_action == "up" and self._before is not None:
+            prev_n, prev_throughput = self._before
+            per_worker = prev_throughput / max(prev_n, 1)
+            if throughput - prev_throughput < per_worker * self.min_gain:
+                misses = self._no_gain.get(n, 0)
+                self._no_gain[n] = misses + 1
+                target, reason = self._set(prev_n, "down", "no_gain", throughput)
+                self._cooldown = self.cooldown_windows * 2 ** min(misses, 3)
+                return target, reason
+            self._no_gain.pop(n, None)
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return self._hold("cooldown")
+        if n < self.max_workers:
+            return self._set(n + 1, "up", "probe", throughput)
+        return self._hold("steady")
+
+    def _set(self, target: int, action: str, reason: str, throughput: float) -> tuple[int, str]:
+        target = max(self.min_workers, min(self.max_workers, target))
+        if action == "down":
+            self._cooldown = self.cooldown_windows
+            self._before = None
+        else:
+            self._before = (self.target, throughput)
+        self._last_action = action
+        self.target = target
+        return target, reason
+
+    def _hold(self, reason: str) -> tuple[int, str]:
+        self._last_action = None
+        self._before = None
+        return self.target, reason
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import metrics
+from events import emit
+from login import cdp_endpoints, connect_chrome_over_cdp
+
+# 多个 Chrome（PLAYWRIGHT_CDP_ENDPOINT 逗号分隔）时，按 实时标签数 + 渲染进程 JS 堆 选择负载最低的浏览器：
+# 负载 = 标签数 + JS 堆(MB) / DT_BROWSER_POOL_MB_PER_TAB
+DEFAULT_MB_PER_TAB = float(os.getenv("DT_BROWSER_POOL_MB_PER_TAB", "256"))
+# 断开的浏览器至少间隔多少秒再尝试重连
+DEFAULT_RECONNECT_SECONDS = float(os.getenv("DT_BROWSER_POOL_RECONNECT_SECONDS", "60"))
+
+
+def _log(msg: str) -> None:
+    print(f"[BROWSERS] {msg}")
+
+
+def _count_page_targets(endpoint: str) -> int | None:
+    # /json/list 列出该 Chrome 的所有标签（含其它进程/连接打开的），比只数本连接的 context 更准
+    try:
+        with urllib.request.urlopen(endpoint.rstrip("/") + "/json/list", timeout=3) as resp:
+            targets = json.loads(resp.read())
+        return sum(1 for t in targets if t.get("type") == "page")
+    except Exception:
+        return None
+
+
+class BrowserSlot:
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.browser = None
+        self.tab_pools: list = []
+        self.last_attempt = 0.0
+
+    @property
+    def alive(self) -> bool:
+        try:
+            return self.browser is not None and self.browser.is_connected()
+        except Exception:
+            return False
+
+    async def tab_count(self) -> int:
+        if urlsplit(self.endpoint).scheme in {"http", "https"}:
+            n = await asyncio.to_thread(_count_page_targets, self.endpoint)
+            if n is not None:
+                return n
+        return sum(len(ctx.pages) for ctx in self.browser.contexts)
+
+    async def heap_mb(self) -> float:
+        total = 0.0
+        for pool in list(self.tab_pools):
+            try:
+                heap = await pool.renderer_heap_mb()
+            except Exception:
+                heap = None
+            total += heap or 0.0
+        return total
+
+
+class BrowserPool:
+    """
+    一个控制进程同时连接多个 Chrome：新的观看/扫描任务放到负载最低的浏览器上；
+    浏览器断开后不再分配，调用方在其余浏览器上重建任务，断开的浏览器按间隔尝试重连。
+    spread=False（supervisor 的 worker，端点已由 supervisor 分配并排好顺序）时只连接排在最前的可用端点，
+    断开后才按顺序连接下一个，避免 K 个 worker 各自连上全部 N 个浏览器。
+    """
+
+    def __init__(
+        self,
+        playwright,
+        endpoints: list[str] | None = None,
+        *,
+        label: str = "watch",
+        mb_per_tab: float = DEFAULT_MB_PER_TAB,
+        reconnect_seconds: float = DEFAULT_RECONNECT_SECONDS,
+        spread: bool = True,
+    ) -> None:
+        self.playwright = playwright
+        self.slots = [BrowserSlot(e) for e in (endpoints or cdp_endpoints())]
+        self.label = label
+        self.spread = spread
+        self.mb_per_tab = mb_per_tab
+        self.reconnect_seconds = reconnect_seconds
+
+    async def connect(self) -> None:
+        for slot in self.slots:
+            slot.last_attempt = time.monotonic()
+            try:
+                if len(self.slots) == 1:
+                    # 单个端点保持原行为：本地 53333 未启动时自动拉起 Chrome
+                    slot.browser = await connect_chrome_over_cdp(self.playwright, slot.endpoint)
+                else:
+                    slot.browser = await self.playwright.chromium.connect_over_cdp(slot.endpoint)
+                    _log(f"已连接：{slot.endpoint}")
+            except (Exception, SystemExit) as exc:
+                _log(f"连接失败：{slot.endpoint}（{exc}）")
+            if not self.spread and slot.alive:
+                break
+        if not any(s.alive for s in self.slots):
+            if len(self.slots) == 1:
+                raise SystemExit(f"无法连接到 Chrome CDP 端点：{self.slots[0].endpoint}")
+            raise SystemExit(f"无法连接到任何 Chrome CDP 端点：{', '.join(s.endpoint for s in self.slots)}")
+
+    async def _reconnect_dead(self) -> None:
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.alive or now - slot.last_attempt < self.reconnect_seconds:
+                continue
+            slot.last_attempt = now
+            try:
+                slot.browser = await self.playwright.chromium.connect_over_cdp(slot.endpoint)
+                slot.tab_pools.clear()
+                _log(f"已重新连接：{slot.endpoint}")
+                emit("browser_reconnect", context=self.label, endpoint=slot.endpoint)
+            except Exception:
+                slot.browser = None
+
+    async def load(self, slot: BrowserSlot) -> float:
+        tabs = await slot.tab_count()
+        heap = await slot.heap_mb() if self.mb_per_tab > 0 else 0.0
+        return tabs + heap / self.mb_per_tab if self.mb_per_tab > 0 else float(tabs)
+
+    async def pick(self) -> BrowserSlot:
+        """返回负载最低的在线浏览器；全部断开时抛出 SystemExit。"""
+        if not self.spread:
+            return await self._pick_in_order()
+        if len(self.slots) > 1:
+            await self._reconnect_dead()
+        alive = [s for s in self.slots if s.alive]
+        if not alive:
+            raise SystemExit("所有 Chrome CDP 端点均已断开")
+        if len(alive) == 1:
+            return alive[0]
+        loads = {}
+        for slot in alive:
+            try:
+                loads[slot.endpoint] = await self.load(slot)
+            except Exception:
+                loads[slot.endpoint] = float("inf")
+        for endpoint, value in loads.items():
+            if value != float("inf"):
+                metrics.BROWSER_LOAD.set(value, endpoint=endpoint)
+        best = min(alive, key=lambda s: loads[s.endpoint])
+        _log("负载：" + "，".join(f"{e}={v:.1f}" for e, v in loads.items()) + f"，选择 {best.endpoint}")
+        emit("browser_pick", context=self.label, endpoint=best.endpoint, loads=loads)
+        return best
+
+    async def _pick_in_order(self) -> BrowserSlot:
+        for slot in self.slots:
+            if slot.alive:
+                return slot
+        now = time.monotonic()
+        for slot in self.slots:
+            # 从未尝试过的端点立即连接；断开过的按重连间隔
+            if slot.last_attempt and now - slot.last_attempt < self.reconnect_seconds:
+                continue
+            slot.last_attempt = now
+            try:
+                slot.browser = await self.playwright.chromium.connect_over_cdp(slot.endpoint)
+            except Exception as exc:
+                slot.browser = None
+                _log(f"连接失败：{slot.endpoint}（{exc}）")
+                continue
+            slot.tab_pools.clear()
+            _log(f"换用浏览器：{slot.endpoint}")
+            emit("browser_pick", context=self.label, endpoint=slot.endpoint, loads=None)
+            return slot
+        raise SystemExit("所有 Chrome CDP 端点均已断开")
+
+    def register(self, slot: BrowserSlot, tab_pool) -> None:
+        """登记某浏览器上由本进程管理的标签池，用于计算渲染进程内存。"""
+        slot.tab_pools.append(tab_pool)
+
+    def unregister(self, slot: BrowserSlot, tab_pool) -> None:
+        if tab_pool in slot.tab_pools:
+            slot.tab_pools.remove(tab_pool)
+
+    def lost(self, slot: BrowserSlot, exc: BaseException | None = None) -> bool:
+        """
+        slot 已断开且配置了多个端点（可在其它浏览器上重建任务）时记录一次断开并返回 True；
+        其余情况（仍在线、只有一个端点）返回 False，由调用方按原逻辑处理异常。
+        """
+        if slot.alive or len(self.slots) < 2:
+            return False
+        slot.tab_pools.clear()
+        _log(f"浏览器已断开：{slot.endpoint}（{exc}），任务转移到其它浏览器")
+        metrics.BROWSER_LOST.inc(endpoint=slot.endpoint)
+        emit("browser_lost", context=self.label, endpoint=slot.endpoint, error=str(exc) if exc else None)
+        return True
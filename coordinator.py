@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from course_store import LEASED, PENDING, CourseStore
+from course_urls import _course_id, _iter_urls
+from events import emit
+from retry_queue import DEFAULT_RETRY_QUEUE, RetryQueue, partition as retry_partition
+
+# 跨机器观看：coordinator 通过局域网 HTTP 分发课程队列，worker（watch.py --coordinator URL）领取、续租并回报结果。
+# 租约到期未续租的课程重新排队，某台机器宕机不会丢课程。
+DEFAULT_COORDINATOR_URL = os.getenv("DT_COORDINATOR_URL", "")
+DEFAULT_COORDINATOR_STORE = Path(os.getenv("DT_COORDINATOR_STORE", "data/coordinator.sqlite3"))
+# 租约时长（秒）：worker 每 1/3 租约续租一次
+DEFAULT_LEASE_SECONDS = float(os.getenv("DT_COORDINATOR_LEASE_SECONDS", "300"))
+# 共享口令：设置后所有请求需带 Authorization: Bearer <token>
+COORDINATOR_TOKEN = os.getenv("DT_COORDINATOR_TOKEN", "")
+REQUEST_TIMEOUT = float(os.getenv("DT_COORDINATOR_TIMEOUT", "10"))
+# coordinator 不可达时 worker 领取课程的重试总时长（秒，指数退避，封顶 60s 一次）；超过后按“暂无课程”处理
+CLAIM_RETRY_SECONDS = float(os.getenv("DT_COORDINATOR_CLAIM_RETRY_SECONDS", "600"))
+# worker 可以设置的标记：all_done（个人中心显示已全部看完）；drain:* 等由本机 supervisor 管理，不经 HTTP 修改
+WORKER_FLAGS = ("all_done",)
+
+
+def _log(msg: str) -> None:
+    print(f"[COORD] {msg}")
+
+
+class Coordinator:
+    """课程队列的 HTTP 前端：所有对课程库的访问经同一把锁串行化；后台线程定期收回过期租约。"""
+
+    def __init__(
+        self,
+        store: CourseStore,
+        *,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        url_file: Path | None = None,
+        remove_url=None,
+        retry_queue=None,
+        course_id=None,
+    ) -> None:
+        self.store = store
+        # worker 回报的跳过原因记入重试队列（course_id 把 URL 映射为 courseId）
+        self.retry_queue = retry_queue
+        self.course_id = course_id
+        self.lease_seconds = lease_seconds
+        self.url_file = url_file
+        self.remove_url = remove_url
+        self.lock = threading.Lock()
+        self.last_seen: dict[str, float] = {}
+        self.stopped = threading.Event()
+
+    def _touch(self, worker: str) -> None:
+        self.last_seen[worker] = time.time()
+
+    def claim(self, worker: str) -> dict:
+        with self.lock:
+            self._touch(worker)
+            claimed = self.store.claim(worker, self.lease_seconds)
+            done = bool(self.store.flag("all_done"))
+        if claimed is None:
+            return {"course": None, "done": done}
+        seq, line_no, url = claimed
+        _log(f"{worker} 领取：{url}")
+        emit("lease", worker=worker, url=url, seq=seq)
+        return {"course": {"seq": seq, "line_no": line_no, "url": url}, "lease_seconds": self.lease_seconds}
+
+    def heartbeat(self, worker: str, urls: list[str]) -> dict:
+        with self.lock:
+            self._touch(worker)
+            kept = self.store.heartbeat(worker, urls, self.lease_seconds)
+        lost = [u for u in urls if u not in kept]
+        if lost:
+            _log(f"{worker} 的租约已被收回：{lost}")
+        return {"kept": kept, "lost": lost}
+
+    def finish(self, worker: str, url: str, status: str, delta: float | None, cause: str | None = None) -> dict:
+        with self.lock:
+            self._touch(worker)
+            self.store.finish(url, status, delta, cause)
+            entry = None
+            if self.retry_queue is not None and self.course_id is not None:
+                entry = self.retry_queue.record(self.course_id(url), url, status, cause)
+            # coordinator 是 URL 文件的唯一写入方：看完/判定看完的课程立即删除；在锁内改写，HTTP 线程之间不会交错读写
+            if self.remove_url is not None and self.url_file is not None and status in {"completed", "skipped_force"}:
+                self.remove_url(self.url_file, url)
+        _log(f"{worker} 回报：{status} delta={delta} {url}" + (f"（{cause}）" if cause else ""))
+        emit("lease_finish", worker=worker, url=url, status=status, delta=delta, cause=cause)
+        if entry is not None and entry["quarantined"]:
+            _log(f"课程已隔离（失败 {entry['failures']} 次）：{url}")
+        return {"ok": True}
+
+    def release(self, worker: str, count_attempt: bool = True) -> dict:
+        with self.lock:
+            requeued = self.store.release_worker(worker, count_attempt=count_attempt)
+        self.last_seen.pop(worker, None)
+        _log(f"{worker} 退出，释放 {requeued} 门课程")
+        return {"requeued": requeued}
+
+    def set_flag(self, worker: str, name: str, value: str) -> dict:
+        """worker 只能设置 WORKER_FLAGS 中的标记，且必须是领取过课程的 worker（未知来源的请求不能结束整个队列）。"""
+        if name not in WORKER_FLAGS:
+            return {"ok": False, "error": f"flag {name!r} not allowed"}
+        with self.lock:
+            if worker not in self.last_seen:
+                return {"ok": False, "error": "unknown worker"}
+            self._touch(worker)
+            self.store.set_flag(name, value)
+        _log(f"{worker} 设置标记 {name}={value}")
+        emit("coordinator_flag", worker=worker, name=name, value=value)
+        return {"ok": True}
+
+    def status(self) -> dict:
+        with self.lock:
+            counts = self.store.counts()
+            holders = self.store.workers()
+            done = bool(self.store.flag("all_done"))
+        now = time.time()
+        return {
+            "counts": counts,
+            "done": done,
+            "lease_seconds": self.lease_seconds,
+            "workers": {w: {"leases": holders.get(w, 0), "seen_s_ago": round(now - t, 1)} for w, t in self.last_seen.items()},
+        }
+
+    def drained(self) -> bool:
+        with self.lock:
+            counts = self.store.counts()
+            done = bool(self.store.flag("all_done"))
+        if counts.get(LEASED, 0):
+            return False
+        return done or not counts.get(PENDING, 0)
+
+    def reap_forever(self, interval: float = 5.0) -> None:
+        while not self.stopped.wait(interval):
+            with self.lock:
+                requeued = self.store.requeue_expired()
+            if requeued:
+                _log(f"{requeued} 门课程租约过期，已重新排队")
+                emit("lease_expired", requeued=requeued)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    coordinator: Coordinator
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        return
+
+    def _json(self, data, status: int = 200) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if not COORDINATOR_TOKEN:
+            return True
+        return self.headers.get("Authorization", "") == f"Bearer {COORDINATOR_TOKEN}"
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            self._json({"error": "unauthorized"}, 401)
+            return
+        if urlsplit(self.path).path == "/status":
+            self._json(self.coordinator.status())
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            self._json({"error": "unauthorized"}, 401)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}") if length > 0 else {}
+        except Exception:
+            self._json({"error": "bad json"}, 400)
+            return
+        worker = str(data.get("worker") or "")
+        path = urlsplit(self.path).path
+        c = self.coordinator
+        if not worker:
+            self._json({"error": "worker required"}, 400)
+            return
+        if path == "/claim":
+            self._json(c.claim(worker))
+        elif path == "/heartbeat":
+            self._json(c.heartbeat(worker, [str(u) for u in data.get("urls") or []]))
+        elif path == "/finish":
+            delta = data.get("delta")
+            cause = data.get("cause") or None
+            self._json(c.finish(worker, str(data.get("url") or ""), str(data.get("status") or ""), delta, cause))
+        elif path == "/release":
+            self._json(c.release(worker, bool(data.get("count_attempt", True))))
+        elif path == "/flag":
+            result = c.set_flag(worker, str(data.get("name") or ""), str(data.get("value") or "1"))
+            self._json(result, 200 if result.get("ok") else 403)
+        else:
+            self._json({"error": "not found"}, 404)
+
+
+def start_coordinator(coordinator: Coordinator, host: str, port: int) -> ThreadingHTTPServer:
+    handler = type("CoordinatorHandler", (_Handler,), {"coordinator": coordinator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="coordinator-http", daemon=True).start()
+    threading.Thread(target=coordinator.reap_forever, name="coordinator-reaper", daemon=True).start()
+    return server
+
+
+class CoordinatorClient:
+    """
+    worker 侧：与 CourseStore 相同的 claim/finish/set_flag 接口，供 watch.py 的观看循环直接使用；
+    后台线程按 1/3 租约周期为手上的课程续租。
+    """
+
+    def __init__(self, base_url: str, worker_id: str, *, token: str = COORDINATOR_TOKEN) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.worker_id = worker_id
+        self.token = token
+        self.held: set[str] = set()
+        self.lease_seconds = DEFAULT_LEASE_SECONDS
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def location(self) -> str:
+        return self.base_url
+
+    def _call(self, path: str, payload: dict | None = None) -> dict:
+        data = None if payload is None else json.dumps({"worker": self.worker_id, **payload}).encode("utf-8")
+        req = urllib.request.Request(self.base_url + path, data=data, method="POST" if data is not None else "GET")
+        req.add_header("Content-Type", "application/json")
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    def claim(self, worker: str | None = None, *, retry_seconds: float = CLAIM_RETRY_SECONDS) -> tuple[int, int, str] | None:
+        """coordinator 暂时不可达（重启、网络抖动）时按指数退避重试，retry_seconds 后仍失败按暂无课程返回 None。"""
+        deadline = time.monotonic() + retry_seconds
+        attempt = 0
+        while True:
+            try:
+                result = self._call("/claim", {})
+                break
+            except (urllib.error.URLError, OSError) as exc:
+                attempt += 1
+                delay = min(60.0, 2.0**attempt)
+                if time.monotonic() + delay > deadline:
+                    _log(f"领取课程失败 {attempt} 次（{exc}），按暂无课程处理")
+                    return None
+                _log(f"领取课程失败（第 {attempt} 次）：{exc}，{delay:.0f}s 后重试")
+                time.sleep(delay)
+        course = result.get("course")
+        if not course:
+            return None
+        self.lease_seconds = float(result.get("lease_seconds") or self.lease_seconds)
+        with self._lock:
+            self.held.add(course["url"])
+        self._ensure_heartbeat()
+        return int(course["seq"]), int(course.get("line_no") or course["seq"]), str(course["url"])
+
+    def finish(self, url: str, status: str, delta: float | None = None, cause: str | None = None) -> None:
+        with self._lock:
+            self.held.discard(url)
+        for attempt in range(3):
+            try:
+                self._call("/finish", {"url": url, "status": status, "delta": delta, "cause": cause})
+                return
+            except (urllib.error.URLError, OSError) as exc:
+                _log(f"回报结果失败（{attempt + 1}/3）：{exc}")
+                time.sleep(2.0 * (attempt + 1))
+
+    def set_flag(self, name: str, value: str = "1") -> None:
+        try:
+            self._call("/flag", {"name": name, "value": value})
+        except (urllib.error.URLError, OSError) as exc:
+            _log(f"设置标记失败：{exc}")
+
+    def release_worker(self, worker: str | None = None, *, count_attempt: bool = True) -> int:
+        """归还手上的租约（浏览器断开后换浏览器重跑前调用），返回重新排队的条数。"""
+        with self._lock:
+            self.held.clear()
+        try:
+            return int(self._call("/release", {"count_attempt": count_attempt}).get("requeued") or 0)
+        except (urllib.error.URLError, OSError) as exc:
+            _log(f"归还租约失败（将由租约过期收回）：{exc}")
+            return 0
+
+    def _ensure_heartbeat(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._heartbeat_loop, name="coordinator-heartbeat", daemon=True)
+            self._thread.start()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(max(1.0, self.lease_seconds / 3)):
+            with self._lock:
+                urls = sorted(self.held)
+            if not urls:
+                continue
+            try:
+                lost = self._call("/heartbeat", {"urls": urls}).get("lost") or []
+            except (urllib.error.URLError, OSError) as exc:
+                _log(f"续租失败：{exc}")
+                continue
+            if lost:
+                # 租约已被收回（课程可能已交给别的 worker）；仍继续当前课程，结果回报时不会覆盖 completed
+                _log(f"租约已过期：{lost}")
+                with self._lock:
+                    self.held.difference_update(lost)
+
+    def close(self) -> None:
+        """停止续租并归还手上的租约。"""
+        self._stop.set()
+        try:
+            self._call("/release", {"count_attempt": False})
+        except (urllib.error.URLError, OSError) as exc:
+            _log(f"归还租约失败（将由租约过期收回）：{exc}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="课程队列 coordinator：局域网内多台机器的 watch.py --coordinator 从这里领取课程")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_serve = sub.add_parser("serve", help="按 URL 文件建队并提供 HTTP 接口")
+    p_serve.add_argument("--url-file", default=None, help="URL 文件路径（默认优先 URL.txt，其次 url.txt）")
+    p_serve.add_argument("--lines", default=None, help="读取的行范围：32 / 32- / 32-34（按 URL 文件行号）")
+    p_serve.add_argument("--host", default="127.0.0.1", help="监听地址（局域网部署用 0.0.0.0，建议同时设置 DT_COORDINATOR_TOKEN）")
+    p_serve.add_argument("--port", type=int, default=8770)
+    p_serve.add_argument("--store", default=str(DEFAULT_COORDINATOR_STORE), help="课程库（sqlite）")
+    p_serve.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）")
+    p_serve.add_argument("--resume", action="store_true", help="沿用课程库中的进度，不按 URL 文件重新建队")
+    p_serve.add_argument("--keep-serving", action="store_true", help="队列清空后继续运行（默认退出）")
+    p_serve.add_argument(
+        "--follow", action="store_true", help="跟随 URL 文件：扫描追加的新课程随时入队，空闲 --follow-idle 秒后才因队列清空退出"
+    )
+    p_serve.add_argument("--retry-queue", default=str(DEFAULT_RETRY_QUEUE), help="worker 回报的跳过课程记入的重试队列（sqlite）")
+    p_serve.add_argument("--no-retry-queue", action="store_true", help="不使用重试队列")
+    p_serve.add_argument("--follow-idle", type=float, default=None, help="--follow 时无新课程多久后允许退出（秒，0 不退出）")
+
+    p_status = sub.add_parser("status", help="查看 coordinator 队列状态")
+    p_status.add_argument("url", nargs="?", default=DEFAULT_COORDINATOR_URL or "http://127.0.0.1:8770")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "status":
+        req = urllib.request.Request(args.url.rstrip("/") + "/status")
+        if COORDINATOR_TOKEN:
+            req.add_header("Authorization", f"Bearer {COORDINATOR_TOKEN}")
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            print(json.dumps(json.loads(resp.read()), ensure_ascii=False, indent=2))
+        return 0
+
+    from watch import DEFAULT_FOLLOW_IDLE_SECONDS, _UrlFollower, _pick_url_file, _remove_url_from_file
+
+    url_file = Path(args.url_file) if args.url_file else _pick_url_file()
+    store = CourseStore(Path(args.store))
+    retry_queue = None if args.no_retry_queue else RetryQueue(Path(args.retry_queue))
+    if not args.resume:
+        store.reset()
+        items = [] if args.follow and not url_file.exists() else list(_iter_urls(url_file, lines_range=args.lines))
+        if not items and not args.follow:
+            raise SystemExit(f"未找到任何课程 URL：{url_file}（lines={args.lines!r}）")
+        ready, waiting, quarantined = retry_partition(items, retry_queue, _course_id)
+        if waiting or quarantined:
+            _log(f"重试队列：{len(waiting)} 门课程退避中，{len(quarantined)} 门已隔离，本轮不分发")
+        store.add(ready)
+    follower = None
+    if args.follow:
+        # 课程库中已有的（含已看完的）不再入队
+        follower = _UrlFollower(url_file, lines_range=args.lines, seen=store.urls(list(store.counts())))
+    follow_idle = DEFAULT_FOLLOW_IDLE_SECONDS if args.follow_idle is None else args.follow_idle
+    last_new = time.monotonic()
+    coordinator = Coordinator(
+        store,
+        lease_seconds=args.lease_seconds,
+        url_file=url_file,
+        remove_url=_remove_url_from_file,
+        retry_queue=retry_queue,
+        course_id=_course_id,
+    )
+    server = start_coordinator(coordinator, args.host, args.port)
+    _log(f"已启动：http://{args.host}:{server.server_address[1]}（待看 {store.counts().get(PENDING, 0)} 门，租约 {args.lease_seconds:g}s）")
+    _log(f"worker：python watch.py --coordinator http://<本机地址>:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(2.0)
+            if follower is not None:
+                new = follower.poll()
+                if new:
+                    with coordinator.lock:
+                        added = store.add(new)
+                    _log(f"URL 文件新增课程：{added} 门")
+                    emit("follow_new", added=added)
+                    last_new = time.monotonic()
+                if follow_idle <= 0 or time.monotonic() - last_new < follow_idle:
+                    continue
+            if not args.keep_serving and coordinator.drained():
+                _log("队列已清空")
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.stopped.set()
+        server.shutdown()
+    counts = store.counts()
+    _log("课程状态：" + "，".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    emit("coordinator_end", counts=counts)
+    store.close()
+    if retry_queue is not None:
+        retry_queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+# 多进程观看共享的课程状态库（sqlite，WAL）：supervisor 写入待看课程，各 worker 原子领取并回写结果
+DEFAULT_COURSE_STORE = Path(os.getenv("DT_COURSE_STORE", "data/course_store.sqlite3"))
+# 同一课程因 worker 异常退出被重新排队的最大次数，超过后标记为 failed
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("DT_WORKER_MAX_ATTEMPTS", "3"))
+
+# 课程状态：pending 待领取、leased 已被某个 worker 领取，其余为终态
+PENDING = "pending"
+LEASED = "leased"
+FINAL_STATUSES = ("completed", "skipped", "skipped_force", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    url TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    line_no INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    leased_at REAL,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    delta REAL,
+    cause TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS courses_status_seq ON courses (status, seq);
+CREATE TABLE IF NOT EXISTS flags (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS playback (
+    worker TEXT PRIMARY KEY,
+    video_s REAL NOT NULL DEFAULT 0,
+    wall_s REAL NOT NULL DEFAULT 0,
+    stalls INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS account_hours (
+    ts REAL NOT NULL,
+    worker TEXT,
+    hours REAL NOT NULL
+);
+"""
+
+
+class CourseStore:
+    """课程队列 + 状态表。每个进程各自打开连接；领取用 BEGIN IMMEDIATE 保证同一课程只交给一个 worker。"""
+
+    def __init__(self, path: Path = DEFAULT_COURSE_STORE, *, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # coordinator 在多个 HTTP 线程中共用一个连接（由调用方加锁）
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(courses)")}
+        if "lease_expires" not in columns:
+            self._conn.execute("ALTER TABLE courses ADD COLUMN lease_expires REAL")
+        if "cause" not in columns:
+            self._conn.execute("ALTER TABLE courses ADD COLUMN cause TEXT")
+
+    @property
+    def location(self) -> str:
+        return str(self.path)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def reset(self) -> None:
+        """清空上一轮的队列与标记（supervisor 每次启动时按 URL 文件重新建队）。"""
+        with self._conn:
+            self._conn.execute("DELETE FROM courses")
+            self._conn.execute("DELETE FROM flags")
+            self._conn.execute("DELETE FROM playback")
+            self._conn.execute("DELETE FROM account_hours")
+
+    def add(self, items) -> int:
+        """items 为 (line_no, url)；已存在的 URL 忽略。返回新增条数。"""
+        now = time.time()
+        before = self._conn.total_changes
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO courses (url, seq, line_no, updated_at) VALUES (?, ?, ?, ?)",
+                [(url, line_no, line_no, now) for line_no, url in items],
+            )
+        return self._conn.total_changes - before
+
+    def claim(self, worker: str, lease_seconds: float | None = None) -> tuple[int, int, str] | None:
+        """
+        领取下一门待看课程，返回 (seq, line_no, url)；没有待看课程或已标记全部完成时返回 None。
+        lease_seconds 为租约时长：到期未续租（heartbeat）的课程由 requeue_expired 重新排队；None 表示不过期。
+        """
+        if self.flag("all_done"):
+            return None
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT url, seq, line_no FROM courses WHERE status = ? ORDER BY seq LIMIT 1", (PENDING,)
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            url, seq, line_no = row
+            now = time.time()
+            self._conn.execute(
+                "UPDATE courses SET status = ?, worker = ?, leased_at = ?, lease_expires = ?, updated_at = ? "
+                "WHERE url = ?",
+                (LEASED, worker, now, now + lease_seconds if lease_seconds else None, now, url),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return seq, line_no, url
+
+    def heartbeat(self, worker: str, urls, lease_seconds: float) -> list[str]:
+        """续租 worker 名下的课程，返回续租成功的 URL（租约已过期被收回的不在其中）。"""
+        kept = []
+        with self._conn:
+            for url in urls:
+                cur = self._conn.execute(
+                    "UPDATE courses SET lease_expires = ?, updated_at = ? WHERE url = ? AND status = ? AND worker = ?",
+                    (time.time() + lease_seconds, time.time(), url, LEASED, worker),
+                )
+                if cur.rowcount:
+                    kept.append(url)
+        return kept
+
+    def requeue_expired(self) -> int:
+        """租约到期的课程重新排队（累计次数超限则标记 failed）。返回重新排队的条数。"""
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "UPDATE courses SET status = 'failed', worker = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires IS NOT NULL AND lease_expires < ? AND attempts + 1 >= ?",
+                (now, LEASED, now, self.max_attempts),
+            )
+            cur = self._conn.execute(
+                "UPDATE courses SET status = ?, worker = NULL, attempts = attempts + 1, updated_at = ? "
+                "WHERE status = ? AND lease_expires IS NOT NULL AND lease_expires < ?",
+                (PENDING, now, LEASED, now),
+            )
+        return cur.rowcount
+
+    def finish(self, url: str, status: str, delta: float | None = None, cause: str | None = None) -> None:
+        # 租约过期后课程可能已被别的 worker 看完，迟到的结果不覆盖 completed；cause 为跳过原因
+        with self._conn:
+            self._conn.execute(
+                "UPDATE courses SET status = ?, delta = ?, cause = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE url = ? AND status != 'completed'",
+                (status, delta, cause, time.time(), url),
+            )
+
+    def release_worker(self, worker: str, *, count_attempt: bool = True) -> int:
+        """
+        worker 异常退出：其领取中的课程重新排队（累计次数超限则标记 failed）。返回重新排队的条数。
+        count_attempt=False 用于不是课程本身导致的归还（浏览器断开、正常停止），不计入次数。
+        """
+        if not count_attempt:
+            with self._conn:
+                cur = self._conn.execute(
+                    "UPDATE courses SET status = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE status = ? AND worker = ?",
+                    (PENDING, time.time(), LEASED, worker),
+                )
+            return cur.rowcount
+        with self._conn:
+            self._conn.execute(
+                "UPDATE courses SET status = 'failed', worker = NULL, updated_at = ? "
+                "WHERE status = ? AND worker = ? AND attempts + 1 >= ?",
+                (time.time(), LEASED, worker, self.max_attempts),
+            )
+            cur = self._conn.execute(
+                "UPDATE courses SET status = ?, worker = NULL, attempts = attempts + 1, updated_at = ? "
+                "WHERE status = ? AND worker = ?",
+                (PENDING, time.time(), LEASED, worker),
+            )
+        return cur.rowcount
+
+    def workers(self) -> dict[str, int]:
+        """当前持有租约的 worker 及其领取中的课程数。"""
+        rows = self._conn.execute(
+            "SELECT worker, COUNT(*) FROM courses WHERE status = ? AND worker IS NOT NULL GROUP BY worker", (LEASED,)
+        ).fetchall()
+        return {worker: n for worker, n in rows}
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM courses GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def urls(self, statuses) -> list[str]:
+        statuses = tuple(statuses)
+        marks = ",".join("?" for _ in statuses)
+        rows = self._conn.execute(f"SELECT url FROM courses WHERE status IN ({marks}) ORDER BY seq", statuses)
+        return [r[0] for r in rows]
+
+    def credited_since(self, ts: float) -> float:
+        """
+        ts（time.time()）之后入账的学时。worker 回报过账号已完成学时时按账号总数的增长计算
+        （多个进程共用账号，课程结束时不记差值，courses.delta 为空）；否则为之后结束的课程新增学时合计。
+        """
+        before, first, last = self._conn.execute(
+            "SELECT (SELECT MAX(hours) FROM account_hours WHERE ts < ?), "
+            "MIN(hours), MAX(hours) FROM account_hours WHERE ts >= ?",
+            (ts, ts),
+        ).fetchone()
+        if last is not None:
+            # 账号学时只增不减：窗口前的最大值即基准，窗口前没有读数时用窗口内的第一个
+            return max(0.0, float(last) - float(before if before is not None else first))
+        row = self._conn.execute(
+            "SELECT SUM(delta) FROM courses WHERE updated_at >= ? AND delta > 0", (ts,)
+        ).fetchone()
+        return float(row[0] or 0.0)
+
+    def report_account_hours(self, worker: str, hours: float) -> None:
+        """worker 回报读到的账号已完成学时（共用账号时 supervisor 按其增长计算入账速度）。"""
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO account_hours (ts, worker, hours) VALUES (?, ?, ?)", (time.time(), worker, hours)
+            )
+
+    def report_playback(self, worker: str, video_s: float, wall_s: float, stalls: int) -> None:
+        """worker 回报本进程累计的 视频前进秒数 / 观看标签墙钟秒数 / 卡住次数（供 supervisor 自动伸缩）。"""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playback (worker, video_s, wall_s, stalls, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (worker, video_s, wall_s, stalls, time.time()),
+            )
+
+    def playback(self) -> dict[str, tuple[float, float, int]]:
+        rows = self._conn.execute("SELECT worker, video_s, wall_s, stalls FROM playback").fetchall()
+        return {worker: (video_s, wall_s, stalls) for worker, video_s, wall_s, stalls in rows}
+
+    def set_flag(self, name: str, value: str = "1") -> None:
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO flags (name, value) VALUES (?, ?)", (name, value))
+
+    def flag(self, name: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM flags WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def clear_flag(self, name: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM flags WHERE name = ?", (name,))
@@ -0,0 +1,122 @@
+import hashlib
+import re
+from pathlib import Path
+from urllib.parse import unquote
+
+# URL 文件的读取与课程键：watch.py、coordinator.py、get_no_test_urls.py 共用，不必为此导入 watch
+
+
+def _log(msg: str) -> None:
+    print(f"[URLS] {msg}")
+
+
+def _parse_lines_range(lines_arg: str | None) -> tuple[int | None, int | None]:
+    if not lines_arg:
+        return None, None
+    s = str(lines_arg).strip()
+    if not s:
+        return None, None
+
+    if "-" not in s:
+        try:
+            n = int(s)
+        except Exception as exc:
+            raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32 / 32- / 32-34）") from exc
+        if n <= 0:
+            raise SystemExit(f"--lines 行号必须为正整数：{lines_arg!r}")
+        return n, n
+
+    start_s, end_s = [p.strip() for p in s.split("-", 1)]
+    if not start_s:
+        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）")
+
+    try:
+        start = int(start_s)
+    except Exception as exc:
+        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）") from exc
+    if start <= 0:
+        raise SystemExit(f"--lines 起始行号必须为正整数：{lines_arg!r}")
+
+    if end_s == "":
+        return start, None
+
+    try:
+        end = int(end_s)
+    except Exception as exc:
+        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）") from exc
+    if end <= 0:
+        raise SystemExit(f"--lines 结束行号必须为正整数：{lines_arg!r}")
+    if end < start:
+        raise SystemExit(f"--lines 结束行号不能小于起始行号：{lines_arg!r}")
+
+    return start, end
+
+
+_COURSE_ID_RE = re.compile(r"[?&#]courseId=([^&#\s]+)", re.IGNORECASE)
+
+
+def _course_id(url: str) -> str:
+    """
+    课程的规范键：详情链接中的 courseId（在 # 之后的查询串里，解码后），没有时退回整个 URL。
+    同一课程的链接可能带不同的 flag 等参数或出现在多次扫描中，去重与删除都按它比较。
+    """
+    m = _COURSE_ID_RE.search(url)
+    return unquote(m.group(1)).strip() if m else url.strip()
+
+
+def _parse_shard(shard_arg: str | None) -> tuple[int, int] | None:
+    """解析 --shard i/n（1 <= i <= n）。"""
+    if not shard_arg:
+        return None
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", shard_arg)
+    if not m:
+        raise SystemExit(f"--shard 格式错误：{shard_arg!r}（应为 i/n，如 1/3）")
+    i, n = int(m.group(1)), int(m.group(2))
+    if n < 1 or not 1 <= i <= n:
+        raise SystemExit(f"--shard 超出范围：{shard_arg!r}（需 1 <= i <= n）")
+    return i, n
+
+
+def _in_shard(url: str, shard: tuple[int, int] | None) -> bool:
+    # 按 courseId 的 sha1 取模：与行号无关，URL 文件增删行后各分片的课程不变，互不重叠
+    if shard is None:
+        return True
+    i, n = shard
+    digest = hashlib.sha1(_course_id(url).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n == i - 1
+
+
+def _iter_urls(p: Path, *, lines_range: str | None = None, shard: tuple[int, int] | None = None, quiet: bool = False):
+    try:
+        lines = p.read_text(encoding="utf-8").splitlines()
+    except Exception:
+        try:
+            lines = p.read_text(encoding="utf-8-sig").splitlines()
+        except Exception as exc:
+            raise SystemExit(f"无法读取 URL 文件：{p} ({exc})") from exc
+
+    start, end = _parse_lines_range(lines_range)
+    # 按 courseId 去重：同一课程只取第一次出现的行（多次扫描会重复追加）
+    seen: set[str] = set()
+    duplicates = 0
+    for idx, raw in enumerate(lines, start=1):
+        if start is not None and idx < start:
+            continue
+        if end is not None and idx > end:
+            break
+
+        s = (raw or "").strip()
+        if not s:
+            continue
+        if not s.startswith(("https://", "http://")):
+            continue
+        if not _in_shard(s, shard):
+            continue
+        cid = _course_id(s)
+        if cid in seen:
+            duplicates += 1
+            continue
+        seen.add(cid)
+        yield idx, s
+    if duplicates and not quiet:
+        _log(f"URL 文件中有 {duplicates} 条重复课程（courseId 相同），已忽略")
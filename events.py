@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from file_lock import locked
+
+# 结构化事件日志（JSONL）：每行一个事件，带墙钟时间与单调时钟，便于统计吞吐与卡顿
+EVENT_LOG_FILE = Path(os.getenv("DT_EVENT_LOG", "data/watch_events.jsonl"))
+EVENT_LOG_MAX_BYTES = int(os.getenv("DT_EVENT_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+EVENT_LOG_BACKUPS = int(os.getenv("DT_EVENT_LOG_BACKUPS", "5"))
+
+# 一次运行的标识；supervisor 通过 DT_RUN_ID 传给各 worker 进程，同一次多进程运行的事件归为一个 run（按 pid 区分进程）
+RUN_ID = os.getenv("DT_RUN_ID") or uuid.uuid4().hex[:12]
+_RUN_STARTED = time.monotonic()
+_lock = threading.Lock()
+_enabled = os.getenv("DT_EVENT_LOG_DISABLE", "") not in {"1", "true", "yes"}
+
+
+def _rotate(path: Path) -> None:
+    try:
+        if not path.exists() or path.stat().st_size < EVENT_LOG_MAX_BYTES:
+            return
+    except OSError:
+        return
+    for i in range(EVENT_LOG_BACKUPS - 1, 0, -1):
+        src = path.with_name(f"{path.name}.{i}")
+        if src.exists():
+            os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+    if EVENT_LOG_BACKUPS > 0:
+        os.replace(path, path.with_name(f"{path.name}.1"))
+    else:
+        path.unlink()
+
+
+def emit(event: str, **fields) -> None:
+    """写入一条事件；t 为本进程启动以来的单调秒数，耗时类字段由调用方用 time.monotonic() 计算。"""
+    if not _enabled:
+        return
+    now = time.monotonic()
+    record = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "t": round(now - _RUN_STARTED, 3),
+        "run": RUN_ID,
+        "pid": os.getpid(),
+        "event": event,
+    }
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    # supervisor 与各 worker 进程写同一个文件：大小检查、轮转与追加都放在跨进程文件锁内，
+    # 避免两个进程同时轮转把刚轮转出的文件再覆盖掉
+    with _lock:
+        try:
+            with locked(EVENT_LOG_FILE):
+                _rotate(EVENT_LOG_FILE)
+                with EVENT_LOG_FILE.open("a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as exc:
+            print(f"[WARN] 写入事件日志失败：{exc}")
+
+
+def _iter_events(paths: list[Path]):
+    for p in paths:
+        try:
+            with p.open("r", encoding="utf-8") as f:
+                for raw in f:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+                    try:
+                        yield json.loads(raw)
+                    except Exception:
+                        continue
+        except OSError:
+            continue
+
+
+def _log_files(path: Path) -> list[Path]:
+    # 按时间顺序：最旧的轮转文件在前
+    files = [path.with_name(f"{path.name}.{i}") for i in range(EVENT_LOG_BACKUPS, 0, -1)]
+    files.append(path)
+    return [p for p in files if p.exists()]
+
+
+def _wall_time(ev: dict) -> float | None:
+    # 同一 run 可能包含多个进程（各自的单调时钟 t 起点不同），墙钟跨度按 ts 计算；旧日志没有 ts 时退回 t
+    try:
+        return datetime.fromisoformat(str(ev["ts"])).timestamp()
+    except (KeyError, ValueError):
+        t = ev.get("t")
+        return float(t) if isinstance(t, (int, float)) else None
+
+
+def summarize(events) -> dict:
+    runs: dict[str, dict] = {}
+    for ev in events:
+        run = runs.setdefault(
+            str(ev.get("run") or ""),
+            {
+                "t_min": None,
+                "t_max": None,
+                "account_min": None,
+                "account_max": None,
+                "hours": 0.0,
+                "courses": 0,
+                "completed": 0,
+                "skipped": 0,
+                "stalls": 0,
+                "recovery_s": 0.0,
+                "refresh_s": 0.0,
+                "logins": 0,
+                "login_s": 0.0,
+                "slow_windows": 0,
+                "efficiency_video_s": 0.0,
+                "efficiency_wall_s": 0.0,
+            },
+        )
+        t = _wall_time(ev)
+        if t is not None:
+            run["t_min"] = t if run["t_min"] is None else min(run["t_min"], t)
+            run["t_max"] = t if run["t_max"] is None else max(run["t_max"], t)
+        kind = ev.get("event")
+        if kind == "hours_delta" and isinstance(ev.get("delta"), (int, float)):
+            run["hours"] += float(ev["delta"])
+        elif kind == "account_hours" and isinstance(ev.get("hours"), (int, float)):
+            # 共用账号的多进程运行不记每课差值，新增学时按账号已完成学时的增长计算
+            hours = float(ev["hours"])
+            run["account_min"] = hours if run["account_min"] is None else min(run["account_min"], hours)
+            run["account_max"] = hours if run["account_max"] is None else max(run["account_max"], hours)
+        elif kind == "course_end":
+            run["courses"] += 1
+            if ev.get("status") == "completed":
+                run["completed"] += 1
+            else:
+                run["skipped"] += 1
+        elif kind == "stall":
+            run["stalls"] += 1
+        elif kind == "recovery":
+            run["recovery_s"] += float(ev.get("duration_s") or 0)
+        elif kind == "refresh":
+            run["refresh_s"] += float(ev.get("duration_s") or 0)
+        elif kind in {"login", "relogin"}:
+            run["logins"] += 1
+            run["login_s"] += float(ev.get("duration_s") or 0)
+        elif kind == "efficiency":
+            if ev.get("verdict") in {"slow", "recover"}:
+                run["slow_windows"] += 1
+            # 按窗口加权：视频前进秒数 / (墙钟秒数 × 目标倍速)
+            run["efficiency_video_s"] += float(ev.get("video_s") or 0)
+            run["efficiency_wall_s"] += float(ev.get("wall_s") or 0) * float(ev.get("intended") or 1)
+
+    total = {
+        "runs": len(runs),
+        "wall_s": 0.0,
+        "hours": 0.0,
+        "courses": 0,
+        "completed": 0,
+        "skipped": 0,
+        "stalls": 0,
+        "recovery_s": 0.0,
+        "refresh_s": 0.0,
+        "logins": 0,
+        "login_s": 0.0,
+        "slow_windows": 0,
+    }
+    efficiency_video_s = efficiency_wall_s = 0.0
+    for run in runs.values():
+        if run["t_min"] is not None:
+            total["wall_s"] += run["t_max"] - run["t_min"]
+        if run["account_max"] is not None:
+            run["hours"] += run["account_max"] - run["account_min"]
+        for k in (
+            "hours",
+            "courses",
+            "completed",
+            "skipped",
+            "stalls",
+            "recovery_s",
+            "refresh_s",
+            "logins",
+            "login_s",
+            "slow_windows",
+        ):
+            total[k] += run[k]
+        efficiency_video_s += run["efficiency_video_s"]
+        efficiency_wall_s += run["efficiency_wall_s"]
+    wall_h = total["wall_s"] / 3600.0
+    total["hours_per_wall_hour"] = total["hours"] / wall_h if wall_h > 0 else None
+    total["stalls_per_course"] = total["stalls"] / total["courses"] if total["courses"] else None
+    total["stalls_per_wall_hour"] = total["stalls"] / wall_h if wall_h > 0 else None
+    total["recovery_share"] = total["recovery_s"] / total["wall_s"] if total["wall_s"] > 0 else None
+    total["playback_efficiency"] = efficiency_video_s / efficiency_wall_s if efficiency_wall_s > 0 else None
+    return total
+
+
+def _fmt(value, digits: int = 2) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="观看事件日志（JSONL）统计")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_sum = sub.add_parser("summary", help="统计吞吐（学时/小时）、卡顿率、恢复耗时")
+    p_sum.add_argument("--file", default=str(EVENT_LOG_FILE), help=f"事件日志文件（默认 {EVENT_LOG_FILE}，含轮转文件）")
+    p_sum.add_argument("--run", default=None, help="只统计指定 run id")
+    p_sum.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args(argv)
+
+    path = Path(args.file)
+    events = _iter_events(_log_files(path))
+    if args.run:
+        events = (e for e in events if e.get("run") == args.run)
+    total = summarize(events)
+    if args.json:
+        print(json.dumps(total, ensure_ascii=False, indent=2))
+        return 0
+    print(f"运行次数：{total['runs']}  总墙钟：{_fmt(total['wall_s'] / 3600.0)} 小时")
+    print(
+        f"课程：{total['courses']}（完成 {total['completed']}，跳过 {total['skipped']}）"
+        f"  新增学时：{_fmt(total['hours'])}"
+    )
+    print(f"吞吐：{_fmt(total['hours_per_wall_hour'])} 学时/小时")
+    print(f"卡顿：{total['stalls']} 次（每课 {_fmt(total['stalls_per_course'])}，每小时 {_fmt(total['stalls_per_wall_hour'])}）")
+    print(f"恢复耗时：{_fmt(total['recovery_s'], 1)}s（占墙钟 {_fmt((total['recovery_share'] or 0) * 100, 1)}%）")
+    print(f"播放效率：{_fmt(total['playback_efficiency'])}（实测/目标倍速）  偏慢窗口：{total['slow_windows']} 个")
+    print(f"刷新耗时：{_fmt(total['refresh_s'], 1)}s  登录：{total['logins']} 次，共 {_fmt(total['login_s'], 1)}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
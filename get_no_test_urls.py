@@ -6,14 +6,19 @@ from pathlib import Path
 
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright, Page
 
-from login import LOGIN_URL, connect_chrome_over_cdp, ensure_logged_in, load_local_secrets
+import profiling
+from browser_pool import BrowserPool
+from course_urls import _course_id, _iter_urls
+from file_lock import locked
+from netblock import BLOCK_PROFILES, DEFAULT_SCAN_PROFILE, apply_block_profile
+from login import CONTENT_ORIGIN, LOGIN_URL, ensure_logged_in, load_local_secrets, verify_session
 
 
 VIDEO_CARD_SELECTOR = ".video-warp-start"
 STATE_SELECTOR = ".state-paused"
 URL_OUTPUT_FILE = Path("url.txt")
 
-COMMEND_URL = "https://gbwlxy.dtdjzx.gov.cn/content#/commendIndex"
+COMMEND_URL = f"{CONTENT_ORIGIN}/content#/commendIndex"
 
 USER_LOGIN_REF_SELECTOR = ".el-popover__reference"
 
@@ -46,10 +51,29 @@ async def _get_active_page_number(page: Page) -> str:
 
 async def _append_url(url: str) -> None:
     URL_OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with URL_OUTPUT_FILE.open("a", encoding="utf-8") as f:
+    # 观看进程删除已看完的行时持有同一把锁
+    with locked(URL_OUTPUT_FILE), URL_OUTPUT_FILE.open("a", encoding="utf-8") as f:
         f.write(url + "\n")
 
 
+# 输出文件中已有课程的 courseId（首次写入课程链接时从文件加载），重复扫描到的课程不再追加
+_known_course_ids: set[str] | None = None
+
+
+async def _append_course_url(url: str) -> bool:
+    """追加课程详情链接；同一 courseId 已在输出文件中时跳过并返回 False。"""
+    global _known_course_ids
+    if _known_course_ids is None:
+        existing = _iter_urls(URL_OUTPUT_FILE, quiet=True) if URL_OUTPUT_FILE.exists() else ()
+        _known_course_ids = {_course_id(u) for _, u in existing}
+    cid = _course_id(url)
+    if cid in _known_course_ids:
+        return False
+    await _append_url(url)
+    _known_course_ids.add(cid)
+    return True
+
+
 async def _get_user_login_reference_text(page: Page) -> str:
     try:
         el = await call_with_timeout_retry(
@@ -215,17 +239,52 @@ async def perform_scan(
     keep_open: bool,
     skip_login: bool = False,
     page_arg: str | None = None,
+    block_profile: str = DEFAULT_SCAN_PROFILE,
 ) -> None:
     start_page, end_page = _parse_page_range(page_arg)
     async with async_playwright() as p:
-        endpoint = os.getenv("PLAYWRIGHT_CDP_ENDPOINT", "http://127.0.0.1:53333")
-        browser = await connect_chrome_over_cdp(p, endpoint)
-
-        context = browser.contexts[0] if browser.contexts else await browser.new_context()
-        context.set_default_timeout(PW_TIMEOUT_MS)
+        browsers = BrowserPool(p, label="scan")
+        await browsers.connect()
+        progress: dict[str, str] = {}
+        while True:
+            slot = await browsers.pick()
+            try:
+                await _scan_on_browser(
+                    slot.browser, username, password, open_only, skip_login, start_page, end_page, block_profile, progress
+                )
+            except (Exception, SystemExit) as exc:
+                if not browsers.lost(slot, exc):
+                    raise
+            else:
+                # 翻页失败等异常在扫描内部被吞掉：浏览器已断开时同样换浏览器继续
+                if not browsers.lost(slot):
+                    return
+            # 从断开时正在处理的页重新开始（该页已记录的 URL 可能重复写入）
+            if (progress.get("page") or "").isdigit():
+                start_page = int(progress["page"])
+                print(f"[INFO] 在其它浏览器上从第 {start_page} 页继续扫描")
+
+
+async def _scan_on_browser(
+    browser,
+    username: str,
+    password: str,
+    open_only: bool,
+    skip_login: bool,
+    start_page: int | None,
+    end_page: int | None,
+    block_profile: str,
+    progress: dict[str, str],
+) -> None:
+    context = browser.contexts[0] if browser.contexts else await browser.new_context()
+    context.set_default_timeout(PW_TIMEOUT_MS)
+    blocker = await apply_block_profile(context, block_profile, label="scan")
+    try:
         page = await context.new_page()
 
-        await ensure_logged_in(page, username=username, password=password, open_only=open_only, skip_login=skip_login)
+        # 复用的浏览器 context 已登录时（HTTP 探测通过）跳过登录页
+        if skip_login or not await verify_session(context):
+            await ensure_logged_in(page, username=username, password=password, open_only=open_only, skip_login=skip_login)
 
         await page.wait_for_timeout(1000)
         await call_with_timeout_retry(
@@ -263,6 +322,7 @@ async def perform_scan(
         while True:
             current_page_text = await _get_active_page_number(page)
             print(f"[INFO] ========== 开始处理第 {current_page_text} 页 ==========")
+            progress["page"] = current_page_text
             cards_selector = await _wait_for_cards_selector(page, current_page_text)
             if not cards_selector:
                 print(f"[WARN] 第 {current_page_text} 页未加载到卡片，跳过本页")
@@ -366,9 +426,11 @@ async def perform_scan(
                 if text:
                     print(f"[INFO] 详情页文本：{text}，URL：{detail_url}")
                     if text == "否":
-                        await _append_url(detail_url)
-                        no_test_url_count += 1
-                        print(f"[INFO] 已记录：{detail_url}")
+                        if await _append_course_url(detail_url):
+                            no_test_url_count += 1
+                            print(f"[INFO] 已记录：{detail_url}")
+                        else:
+                            print(f"[INFO] 课程已在 {URL_OUTPUT_FILE} 中，跳过：{detail_url}")
                     elif text == "是":
                         print('[INFO] 详情页为"是"，直接返回')
                 else:
@@ -476,8 +538,8 @@ async def perform_scan(
             except Exception as exc:
                 print(f"[WARN] 翻页失败：{exc}")
                 break
-
-        return
+    finally:
+        blocker.report()
 
 
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
@@ -494,12 +556,24 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     )
     parser.add_argument("--page", type=str, default=None, help='扫描页码："起始页" 或 "起始页-末页"（例如 23 或 23-30）')
     parser.add_argument("--start-page", type=int, default=None, help="（兼容参数，已废弃）等价于 --page 起始页")
+    parser.add_argument(
+        "--block-profile",
+        choices=sorted(BLOCK_PROFILES),
+        default=DEFAULT_SCAN_PROFILE,
+        help=f"请求拦截配置（默认 {DEFAULT_SCAN_PROFILE}：丢弃图片/字体/视频/统计脚本；off 关闭）",
+    )
+    parser.add_argument(
+        "--profile-cdp",
+        action="store_true",
+        help="剖析 Playwright 调用耗时，退出时输出按调用点汇总与折叠栈（也可设 DT_PROFILE_CDP=1）",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: list[str] | None = None) -> None:
     load_local_secrets()
     args = parse_args(argv)
+    profiling.enable_from_env(args.profile_cdp)
     open_only = bool(args.open_only)
     keep_open = (not bool(args.close_after)) or open_only
     skip_login = bool(args.skip_login)
@@ -525,6 +599,7 @@ def main(argv: list[str] | None = None) -> None:
                 keep_open=keep_open,
                 skip_login=skip_login,
                 page_arg=page_arg,
+                block_profile=args.block_profile,
             )
         )
     except KeyboardInterrupt:
@@ -0,0 +1,219 @@
+import asyncio
+import base64
+import os
+import re
+
+from events import emit
+
+# 低开销播放：学时只依赖进度上报，不依赖画质。开启后：
+# - HLS 主清单只保留最低码率的一路（按标签用 CDP Fetch 只拦截 .m3u8 的响应改写，不经 context.route，
+#   其余请求照常走 HTTP 缓存），播放器若带 qualityLevels/VHS 也只启用最低一档；
+# - 不进入全屏，页面视口缩小到 LITE_VIEWPORT；
+# - 通过 CDP 焦点模拟与 visibility 覆盖，让后台/最小化的标签仍按前台处理，进度照常上报。
+DEFAULT_LITE_PLAYBACK = os.getenv("DT_LITE_PLAYBACK", "") in {"1", "true", "yes"}
+LITE_VIEWPORT = {
+    "width": int(os.getenv("DT_LITE_VIEWPORT_WIDTH", "640")),
+    "height": int(os.getenv("DT_LITE_VIEWPORT_HEIGHT", "360")),
+}
+
+LITE_INIT_SCRIPT = r"""
+(() => {
+    if (window.__dtLitePlayback) return;
+    window.__dtLitePlayback = true;
+    try {
+        Object.defineProperty(Document.prototype, 'hidden', { get: () => false, configurable: true });
+        Object.defineProperty(Document.prototype, 'visibilityState', { get: () => 'visible', configurable: true });
+        Document.prototype.hasFocus = () => true;
+    } catch (e) {}
+    const swallow = (ev) => ev.stopImmediatePropagation();
+    window.addEventListener('visibilitychange', swallow, true);
+    document.addEventListener('visibilitychange', swallow, true);
+    window.addEventListener('blur', swallow, true);
+    // 全屏只会增加合成与解码开销
+    try {
+        Element.prototype.requestFullscreen = function () { return Promise.resolve(); };
+        Element.prototype.webkitRequestFullscreen = function () {};
+    } catch (e) {}
+
+    const pickLowest = (player) => {
+        try {
+            const levels = typeof player.qualityLevels === 'function' ? player.qualityLevels() : null;
+            if (levels && levels.length) {
+                let low = 0;
+                for (let i = 1; i < levels.length; i++) {
+                    const a = levels[i], b = levels[low];
+                    if ((a.bitrate || a.height || 0) < (b.bitrate || b.height || 0)) low = i;
+                }
+                for (let i = 0; i < levels.length; i++) levels[i].enabled = i === low;
+            }
+        } catch (e) {}
+        try {
+            const tech = player.tech({ IWillNotUseThisInPlugins: true });
+            const vhs = tech && (tech.vhs || tech.hls);
+            if (vhs && typeof vhs.representations === 'function') {
+                const reps = vhs.representations();
+                if (reps.length) {
+                    const low = reps.reduce((m, r) => ((r.bandwidth || 0) < (m.bandwidth || 0) ? r : m), reps[0]);
+                    reps.forEach((r) => r.enabled(r === low));
+                }
+            }
+        } catch (e) {}
+    };
+    const hook = (vjs) => {
+        if (!vjs || vjs.__dtLiteHooked || typeof vjs.hook !== 'function') return;
+        vjs.__dtLiteHooked = true;
+        vjs.hook('setup', (player) => {
+            pickLowest(player);
+            try {
+                const levels = typeof player.qualityLevels === 'function' ? player.qualityLevels() : null;
+                if (levels) levels.on('addqualitylevel', () => pickLowest(player));
+            } catch (e) {}
+            player.on('loadedmetadata', () => pickLowest(player));
+        });
+        try { Object.values(vjs.getPlayers ? vjs.getPlayers() : {}).forEach((p) => p && pickLowest(p)); } catch (e) {}
+    };
+    let current = window.videojs;
+    if (current) hook(current);
+    try {
+        Object.defineProperty(window, 'videojs', {
+            configurable: true,
+            get: () => current,
+            set: (v) => { current = v; hook(v); },
+        });
+    } catch (e) {}
+})();
+"""
+
+_STREAM_INF = "#EXT-X-STREAM-INF"
+_BANDWIDTH_RE = re.compile(r"(?:^|[:,])BANDWIDTH=(\d+)")
+
+
+def _log(msg: str) -> None:
+    print(f"[LITE] {msg}")
+
+
+def lowest_variant_playlist(text: str) -> str | None:
+    """把 HLS 主清单改写为只含最低码率的一路；不是主清单或只有一路时返回 None。"""
+    lines = text.splitlines()
+    header: list[str] = []
+    variants: list[tuple[int, str, str]] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith(_STREAM_INF):
+            uri = ""
+            j = i + 1
+            while j < len(lines):
+                candidate = lines[j].strip()
+                if candidate and not candidate.startswith("#"):
+                    uri = candidate
+                    break
+                j += 1
+            m = _BANDWIDTH_RE.search(line)
+            if uri:
+                variants.append((int(m.group(1)) if m else 0, line, uri))
+            i = j + 1
+            continue
+        header.append(line)
+        i += 1
+    if len(variants) < 2:
+        return None
+    _, inf, uri = min(variants, key=lambda v: v[0])
+    return "\n".join(header + [inf, uri]) + "\n"
+
+
+class LitePlayback:
+    def __init__(self, label: str = "watch") -> None:
+        self.label = label
+        self.rewrites = 0
+        # 焦点模拟与 .m3u8 拦截都绑定在 CDP 会话上，会话断开即失效，因此按页保留
+        self._sessions: dict = {}
+        self._focused: set = set()
+
+    async def apply(self, context) -> None:
+        await context.add_init_script(LITE_INIT_SCRIPT)
+        # 新标签创建时就挂上 .m3u8 拦截，赶在播放器请求主清单之前
+        context.on("page", lambda page: asyncio.ensure_future(self._session(page)))
+        for page in context.pages:
+            await self._session(page)
+        _log(f"已开启低开销播放：最低码率、不全屏、视口 {LITE_VIEWPORT['width']}x{LITE_VIEWPORT['height']}")
+
+    async def _session(self, page):
+        if page in self._sessions:
+            return self._sessions[page]
+        if page.is_closed():
+            return None
+        self._sessions[page] = None
+        try:
+            session = await page.context.new_cdp_session(page)
+            session.on("Fetch.requestPaused", lambda params: asyncio.ensure_future(self._handle_manifest(session, params)))
+            await session.send(
+                "Fetch.enable", {"patterns": [{"urlPattern": "*.m3u8*", "requestStage": "Response"}]}
+            )
+        except Exception as exc:
+            self._sessions.pop(page, None)
+            if not page.is_closed():
+                _log(f"开启 HLS 清单拦截失败：{exc}")
+            return None
+        self._sessions[page] = session
+        page.once("close", self._forget)
+        return session
+
+    def _forget(self, page) -> None:
+        self._sessions.pop(page, None)
+        self._focused.discard(page)
+
+    async def _handle_manifest(self, session, params: dict) -> None:
+        request_id = params.get("requestId")
+        rewritten = None
+        status = params.get("responseStatusCode")
+        if status and 200 <= int(status) < 300 and not params.get("responseErrorReason"):
+            try:
+                result = await session.send("Fetch.getResponseBody", {"requestId": request_id})
+                raw = result.get("body") or ""
+                text = base64.b64decode(raw).decode("utf-8", "replace") if result.get("base64Encoded") else raw
+                rewritten = lowest_variant_playlist(text)
+            except Exception:
+                rewritten = None
+        try:
+            if rewritten is None:
+                await session.send("Fetch.continueRequest", {"requestId": request_id})
+                return
+            headers = [
+                h
+                for h in params.get("responseHeaders") or []
+                if str(h.get("name") or "").lower() not in {"content-length", "content-encoding"}
+            ]
+            await session.send(
+                "Fetch.fulfillRequest",
+                {
+                    "requestId": request_id,
+                    "responseCode": int(status),
+                    "responseHeaders": headers,
+                    "body": base64.b64encode(rewritten.encode("utf-8")).decode("ascii"),
+                },
+            )
+            self.rewrites += 1
+        except Exception:
+            # 标签已关闭或请求已取消
+            pass
+
+    async def apply_page(self, page) -> None:
+        """每个播放页只需一次：焦点模拟 + 小视口。"""
+        if page in self._focused:
+            return
+        session = await self._session(page)
+        if session is not None:
+            try:
+                await session.send("Emulation.setFocusEmulationEnabled", {"enabled": True})
+                self._focused.add(page)
+            except Exception as exc:
+                _log(f"开启焦点模拟失败：{exc}")
+        try:
+            await page.set_viewport_size(LITE_VIEWPORT)
+        except Exception:
+            pass
+
+    def report(self) -> None:
+        _log(f"HLS 主清单改写为最低码率：{self.rewrites} 次")
+        emit("lite_playback", context=self.label, manifest_rewrites=self.rewrites)
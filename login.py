@@ -4,12 +4,14 @@ import re
 from datetime import datetime
 import argparse
 import asyncio
+import hashlib
 import json
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 from pathlib import Path
 from typing import TYPE_CHECKING
 os.environ.setdefault("PADDLE_DISABLE_ONEDNN", "1")
@@ -31,28 +33,65 @@ def _safe_print(msg: str) -> None:
     except OSError:
         pass
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright, Page
+import profiling
+from events import emit
 try:
-    import cv2
     import numpy as np
-    from paddleocr import PaddleOCR
     from PIL import Image, ImageFilter, ImageOps
 except Exception:
-    cv2 = None
     np = None
-    PaddleOCR = None
     Image = None
     ImageFilter = None
     ImageOps = None
+try:
+    import cv2
+except Exception:
+    cv2 = None
+# PaddleOCR 体积大、导入慢，仅在选用 paddle 识别后端时再导入
+PaddleOCR = None
 if TYPE_CHECKING:
     from PIL import Image as PILImage
     ImageType = PILImage.Image
 else:
     ImageType = object
-LOGIN_URL = "https://sso.dtdjzx.gov.cn/sso/login"
-MEMBER_URL = "https://www.dtdjzx.gov.cn/member/"
-PERSONAL_CENTER_URL = "https://gbwlxy.dtdjzx.gov.cn/content#/personalCenter"
+# 站点地址可整体替换（例如指向 mock_site.py 的本地替身站点做离线压测）
+SSO_ORIGIN = os.getenv("DT_SSO_ORIGIN", "https://sso.dtdjzx.gov.cn").rstrip("/")
+WWW_ORIGIN = os.getenv("DT_WWW_ORIGIN", "https://www.dtdjzx.gov.cn").rstrip("/")
+CONTENT_ORIGIN = os.getenv("DT_CONTENT_ORIGIN", "https://gbwlxy.dtdjzx.gov.cn").rstrip("/")
+LOGIN_URL = f"{SSO_ORIGIN}/sso/login"
+MEMBER_URL = f"{WWW_ORIGIN}/member/"
+PERSONAL_CENTER_URL = f"{CONTENT_ORIGIN}/content#/personalCenter"
 PW_TIMEOUT_MS = 4000
 DEFAULT_STATE_FILE = Path("storage_state.json")
+# 验证码策略：逐字符置信度低于阈值时直接刷新，不浪费一次提交
+CAPTCHA_MIN_CHAR_CONFIDENCE = float(os.getenv("DT_CAPTCHA_MIN_CHAR_CONFIDENCE", "0.5"))
+CAPTCHA_MAX_SUBMITS = int(os.getenv("DT_CAPTCHA_MAX_SUBMITS", "20"))
+CAPTCHA_RESULT_TIMEOUT_MS = int(os.getenv("DT_CAPTCHA_RESULT_TIMEOUT_MS", "6000"))
+# 参与逐字符投票的预处理变体（按优先级）；首个变体结果长度与置信度达标时不再识别其余变体
+CAPTCHA_VOTE_VARIANTS = ("otsu_dilate", "adaptive_blur_noline_close", "otsu")
+# 验证码识别后端：paddle（通用 OCR）/ template（基于 captcha_debug 标注样本的模板匹配，仅依赖 numpy+pillow）
+CAPTCHA_BACKEND = os.getenv("DT_CAPTCHA_BACKEND", "paddle").strip().lower()
+CAPTCHA_TEMPLATES_FILE = Path(
+    os.getenv("DT_CAPTCHA_TEMPLATES", str(Path(__file__).resolve().parent / "captcha_templates.npz"))
+)
+CAPTCHA_CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+# 会话校验：最近校验过且 cookie 未过期时视为新鲜，跳过校验导航
+SESSION_FRESH_SECONDS = int(os.getenv("DT_SESSION_FRESH_SECONDS", "600"))
+SESSION_EXPIRY_MARGIN_SECONDS = 300
+# 未登录时访问会被重定向到 sso/login，用一次 HTTP 请求代替整页加载
+SESSION_PROBE_URL = os.getenv("DT_SESSION_PROBE_URL", MEMBER_URL)
+# 前端脚本跳转登录页时 HTTP 仍是 200 且地址不变，只看最终地址会误判：正文含登录表单、未登录时的“用户登录”按钮
+# 或跳转 sso/login 的脚本即判为未登录。DT_SESSION_PROBE_MARKER 可另外指定只有登录后才出现的文本（如姓名），
+# 设置后正文必须包含它；默认不要求（.el-popover__reference 未登录时也存在，不能当作登录标记）
+SESSION_PROBE_MARKER = os.getenv("DT_SESSION_PROBE_MARKER", "")
+_LOGGED_OUT_MARKERS = ('id="validateCode"', "id='validateCode'", ">用户登录<")
+_LOGIN_REDIRECT_RE = re.compile(r"""(location(\.href)?\s*=|location\.(replace|assign)\(|http-equiv=["']?refresh)[^<]{0,200}sso/login""", re.I)
+# 登录态保存的去抖间隔（秒）：间隔内的重复保存直接跳过
+STATE_SAVE_DEBOUNCE_SECONDS = float(os.getenv("DT_STATE_SAVE_DEBOUNCE_SECONDS", "60"))
+def cdp_endpoints() -> list[str]:
+    # PLAYWRIGHT_CDP_ENDPOINT 可写多个（逗号分隔），watch/scan 在这些 Chrome 之间分配任务
+    raw = os.getenv("PLAYWRIGHT_CDP_ENDPOINT", "http://127.0.0.1:53333")
+    return [e.strip() for e in raw.split(",") if e.strip()] or ["http://127.0.0.1:53333"]
 async def connect_chrome_over_cdp(p, endpoint: str):
     try:
         browser = await p.chromium.connect_over_cdp(endpoint)
@@ -265,35 +304,173 @@ async def _apply_storage_state_to_context(context, state_file: Path) -> bool:
         except Exception:
             pass
     origins = state.get("origins") or []
+    entries = []
     for origin_entry in origins:
         origin = (origin_entry or {}).get("origin")
         items = (origin_entry or {}).get("localStorage") or []
-        if not origin or not items:
-            continue
+        if origin and items:
+            entries.append({"origin": origin, "items": items})
+    if entries:
+        # 用 init script 在页面首次打开对应 origin 时写入 localStorage，不再为每个 origin 单独导航
+        # 只补写缺失的键，避免覆盖站点后续更新的值
         try:
-            p = await context.new_page()
-            try:
-                await call_with_timeout_retry(p.goto, "加载登录态 origin", origin, wait_until="domcontentloaded")
-                await p.evaluate(
-                    """(items) => {
-                        for (const it of items) {
-                            if (!it || !it.name) continue;
-                            try { localStorage.setItem(it.name, it.value ?? ''); } catch (e) {}
-                        }
-                    }""",
-                    items,
-                )
-            finally:
-                await p.close()
+            await context.add_init_script(
+                script="(() => {"
+                f"const entries = {json.dumps(entries, ensure_ascii=False)};"
+                """
+                for (const e of entries) {
+                    if (e.origin !== location.origin) continue;
+                    for (const it of e.items) {
+                        if (!it || !it.name) continue;
+                        try {
+                            if (localStorage.getItem(it.name) === null) localStorage.setItem(it.name, it.value ?? '');
+                        } catch (err) {}
+                    }
+                }
+                })()"""
+            )
         except Exception:
-            continue
+            pass
     return True
-async def _save_storage_state(context, state_file: Path) -> None:
+def _session_meta_file(state_file: Path) -> Path:
+    return state_file.with_name(state_file.name + ".meta.json")
+def _read_session_meta(state_file: Path) -> dict:
+    try:
+        return json.loads(_session_meta_file(state_file).read_text(encoding="utf-8")) or {}
+    except Exception:
+        return {}
+def _cookies_expire_at(state_file: Path) -> float | None:
+    # 返回站点持久 cookie 中最早的过期时间；会话 cookie（expires=-1）不参与
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    expiries = [
+        float(c.get("expires") or -1)
+        for c in (state.get("cookies") or [])
+        if "dtdjzx.gov.cn" in str(c.get("domain") or "") and float(c.get("expires") or -1) > 0
+    ]
+    return min(expiries) if expiries else None
+def mark_session_verified(state_file: Path | None) -> None:
+    if state_file is None:
+        return
+    meta = {"verified_at": time.time(), "cookies_expire_at": _cookies_expire_at(state_file)}
+    try:
+        _write_json_atomic(_session_meta_file(state_file), meta)
+    except Exception:
+        pass
+def is_session_fresh(state_file: Path | None) -> bool:
+    if state_file is None or not state_file.exists():
+        return False
+    meta = _read_session_meta(state_file)
+    verified_at = float(meta.get("verified_at") or 0)
+    now = time.time()
+    if now - verified_at > SESSION_FRESH_SECONDS:
+        return False
+    try:
+        # 校验之后 storage_state 又被改写过（例如重新登录），以文件为准重新校验
+        if state_file.stat().st_mtime > verified_at + 1:
+            return False
+    except Exception:
+        return False
+    expire_at = meta.get("cookies_expire_at")
+    return expire_at is None or float(expire_at) - now > SESSION_EXPIRY_MARGIN_SECONDS
+async def _probe_session(context) -> bool:
+    try:
+        resp = await context.request.get(SESSION_PROBE_URL, timeout=PW_TIMEOUT_MS * 2)
+    except Exception as exc:
+        print(f"[WARN] 会话探测请求失败：{exc}")
+        return False
+    try:
+        final_url = resp.url or ""
+        ok = resp.ok and "sso/login" not in final_url and not final_url.startswith(LOGIN_URL)
+        body = await resp.text() if ok else ""
+        await resp.dispose()
+    except Exception:
+        return False
+    if not ok or any(m in body for m in _LOGGED_OUT_MARKERS) or _LOGIN_REDIRECT_RE.search(body):
+        return False
+    if SESSION_PROBE_MARKER and SESSION_PROBE_MARKER not in body:
+        print(f"[INFO] 会话探测响应中没有登录标记 {SESSION_PROBE_MARKER!r}，改为页面校验")
+        return False
+    return True
+async def verify_session(context, state_file: Path | None = None) -> bool:
+    """
+    校验当前 context 的登录态：最近校验过且 cookie 未临近过期时直接视为有效；
+    否则用一次 context.request 的 HTTP 请求探测，成功后记录校验时间。
+    """
+    if is_session_fresh(state_file):
+        print("[INFO] 登录态最近已校验且未过期，跳过校验")
+        return True
+    if await _probe_session(context):
+        print("[INFO] 登录态有效（HTTP 探测）")
+        mark_session_verified(state_file)
+        return True
+    return False
+def _storage_state_digest(state: dict) -> str:
+    # 只比较 cookie 的身份与值（过期时间按小时取整）以及 localStorage，忽略滑动过期带来的秒级变化
+    cookies = sorted(
+        (
+            str(c.get("domain") or ""),
+            str(c.get("path") or ""),
+            str(c.get("name") or ""),
+            str(c.get("value") or ""),
+            int(float(c.get("expires") or -1) // 3600),
+        )
+        for c in (state.get("cookies") or [])
+    )
+    origins = sorted(
+        (str(o.get("origin") or ""), sorted((str(i.get("name")), str(i.get("value"))) for i in (o.get("localStorage") or [])))
+        for o in (state.get("origins") or [])
+    )
+    raw = json.dumps([cookies, origins], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+def _write_json_atomic(path: Path, data) -> None:
+    # 先写临时文件再原子替换，避免崩溃或并发写入留下截断的文件
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+# 按文件记录：上次写入内容的摘要、上次保存尝试时间、保存锁
+_state_digests: dict[str, str] = {}
+_state_save_times: dict[str, float] = {}
+_state_save_locks: dict[str, asyncio.Lock] = {}
+async def _save_storage_state(context, state_file: Path, *, force: bool = False) -> bool:
+    """
+    保存登录态：去抖（STATE_SAVE_DEBOUNCE_SECONDS 内多次调用只写一次）、内容未变化不写、原子替换。
+    force=True 时跳过去抖（例如刚重新登录）。返回是否真正写入了文件。
+    """
     try:
         state_file.parent.mkdir(parents=True, exist_ok=True)
     except Exception:
         pass
-    await context.storage_state(path=str(state_file))
+    key = str(state_file.resolve())
+    lock = _state_save_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        now = time.monotonic()
+        last = _state_save_times.get(key)
+        if not force and last is not None and now - last < STATE_SAVE_DEBOUNCE_SECONDS:
+            return False
+        _state_save_times[key] = now
+        if key not in _state_digests and state_file.exists():
+            try:
+                _state_digests[key] = _storage_state_digest(json.loads(state_file.read_text(encoding="utf-8")))
+            except Exception:
+                pass
+        state = await context.storage_state()
+        digest = _storage_state_digest(state)
+        if digest == _state_digests.get(key) and state_file.exists():
+            return False
+        await asyncio.to_thread(_write_json_atomic, state_file, state)
+        _state_digests[key] = digest
+        return True
 async def _wait_for_login(page: Page, *, interval_seconds: int = 2) -> None:
     print(f"[INFO] 程序每 {interval_seconds}s 检查是否已登录")
     log_every = max(1, int(10 // interval_seconds))
@@ -312,8 +489,14 @@ def _is_logged_in_by_url(page: Page) -> bool:
 _paddle_ocr = None
 _ocr_warmed = False
 def _ensure_ocr_ready() -> None:
+    global PaddleOCR
     global _paddle_ocr
     global _ocr_warmed
+    if PaddleOCR is None:
+        try:
+            from paddleocr import PaddleOCR
+        except Exception:
+            PaddleOCR = None
     if PaddleOCR is None or Image is None or ImageFilter is None or ImageOps is None or np is None:
         raise SystemExit("缺少 OCR 依赖，请安装 paddleocr/paddlepaddle/pillow/numpy")
     try:
@@ -479,6 +662,29 @@ def _pick_best_candidate(candidates: list[tuple[str, float]]) -> str:
     normed.sort(key=lambda x: (len(x[0]), x[1]), reverse=True)
     return normed[0][0] if normed else ""
 
+def _vote_captcha_chars(candidates: list[tuple[str, float]], expected_len: int = 4) -> tuple[str, list[float]]:
+    # 多个变体的识别结果按位置加权投票；某位的置信度 = 该位胜出字符的得分之和 / 候选数
+    if not candidates:
+        return "", []
+    normed = [(_normalize_captcha(t, expected_len=expected_len), max(float(s), 0.0)) for t, s in candidates]
+    if not any(s for _, s in normed):
+        # 旧版 PaddleOCR 不返回得分时按等权投票
+        normed = [(t, 1.0) for t, _ in normed]
+    exact = [(t, s) for t, s in normed if len(t) == expected_len]
+    if not exact:
+        return _pick_best_candidate(candidates), []
+    total = float(len(normed))
+    chars: list[str] = []
+    confs: list[float] = []
+    for pos in range(expected_len):
+        weights: dict[str, float] = {}
+        for t, s in exact:
+            weights[t[pos]] = weights.get(t[pos], 0.0) + s
+        ch, w = max(weights.items(), key=lambda x: x[1])
+        chars.append(ch)
+        confs.append(min(1.0, w / total))
+    return "".join(chars), confs
+
 def _build_captcha_variants(img_bytes: bytes) -> list[tuple[str, "ImageType"]]:
     raw_rgb = Image.open(io.BytesIO(img_bytes)).convert("RGB")
     raw = ImageOps.autocontrast(raw_rgb.convert("L"))
@@ -540,44 +746,53 @@ def _build_captcha_variants(img_bytes: bytes) -> list[tuple[str, "ImageType"]]:
         except Exception:
             pass
     return variants
-def _ocr_captcha_bytes(img_bytes: bytes, *, debug: bool = False, debug_dir: Path | None = None) -> str:
+def _ocr_captcha_scored(
+    img_bytes: bytes, *, debug: bool = False, debug_dir: Path | None = None
+) -> tuple[str, list[float]]:
     _ensure_ocr_ready()
     variants = _build_captcha_variants(img_bytes)
     candidates: list[tuple[str, float]] = []
+
+    def run(tag: str, img) -> None:
+        if debug and debug_dir is not None:
+            try:
+                debug_dir.mkdir(parents=True, exist_ok=True)
+                name = _variant_display_name(tag)
+                img.save(debug_dir / f"{_safe_filename(name)}.png")
+            except Exception:
+                pass
+        arr = np.array(img.convert("RGB"), dtype=np.uint8)
+        candidates.extend(_extract_ocr_candidates(_run_ocr_on_array(arr)))
+
     try:
-        preferred = None
-        for tag, img in variants:
-            if tag == "otsu_dilate":
-                preferred = (tag, img)
-                break
-        if preferred is not None:
-            tag, img = preferred
-            if debug and debug_dir is not None:
-                try:
-                    debug_dir.mkdir(parents=True, exist_ok=True)
-                    name = _variant_display_name(tag)
-                    img.save(debug_dir / f"{_safe_filename(name)}.png")
-                except Exception:
-                    pass
-            arr = np.array(img.convert("RGB"), dtype=np.uint8)
-            result = _run_ocr_on_array(arr)
-            candidates.extend(_extract_ocr_candidates(result))
+        by_tag = dict(variants)
+        preferred = [(tag, by_tag[tag]) for tag in CAPTCHA_VOTE_VARIANTS if tag in by_tag]
+        if preferred:
+            # 首选变体已得到 4 位且逐字符置信度达标时直接返回；否则再跑其余变体参与投票，避免每次都识别多遍
+            for i, (tag, img) in enumerate(preferred):
+                run(tag, img)
+                text, confs = _vote_captcha_chars(candidates, expected_len=4)
+                if i + 1 < len(preferred) and _captcha_confident(text, confs):
+                    break
         else:
             for tag, img in variants:
-                if debug and debug_dir is not None:
-                    try:
-                        debug_dir.mkdir(parents=True, exist_ok=True)
-                        name = _variant_display_name(tag)
-                        img.save(debug_dir / f"{_safe_filename(name)}.png")
-                    except Exception:
-                        pass
-                arr = np.array(img.convert("RGB"), dtype=np.uint8)
-                result = _run_ocr_on_array(arr)
-                candidates.extend(_extract_ocr_candidates(result))
+                run(tag, img)
     except Exception:
-        return ""
-    text = _pick_best_candidate(candidates)
-    return _normalize_captcha(text, expected_len=4)
+        return "", []
+    text, confs = _vote_captcha_chars(candidates, expected_len=4)
+    return _normalize_captcha(text, expected_len=4), confs
+
+def _captcha_confident(text: str, confs: list[float], expected_len: int = 4) -> bool:
+    return len(text) == expected_len and len(confs) == expected_len and min(confs) >= CAPTCHA_MIN_CHAR_CONFIDENCE
+
+def _should_refresh_low_confidence(confs: list[float], low_conf_streak: int) -> bool:
+    # 连续多次低置信度时仍提交一次，避免识别器整体偏低时永远不提交
+    min_conf = min(confs) if confs else 0.0
+    return min_conf < CAPTCHA_MIN_CHAR_CONFIDENCE and low_conf_streak < 3
+
+def _ocr_captcha_bytes(img_bytes: bytes, *, debug: bool = False, debug_dir: Path | None = None) -> str:
+    code, _ = _ocr_captcha_scored(img_bytes, debug=debug, debug_dir=debug_dir)
+    return code
 
 def _ocr_debug_variants(img_bytes: bytes, debug_dir: Path) -> list[tuple[str, str]]:
     _ensure_ocr_ready()
@@ -596,13 +811,148 @@ def _ocr_debug_variants(img_bytes: bytes, debug_dir: Path) -> list[tuple[str, st
         text = _pick_best_candidate(_extract_ocr_candidates(result))
         results.append((_variant_display_name(tag), _normalize_captcha(text, expected_len=4)))
     return results
+_TEMPLATE_GLYPH_SIZE = (16, 20)
+_captcha_templates = None
+def _binarize_captcha_array(img_bytes: bytes):
+    # 大津二值化 + 去细横线（不依赖 cv2），返回字符像素为 True 的掩码
+    arr = np.asarray(ImageOps.autocontrast(Image.open(io.BytesIO(img_bytes)).convert("L")), dtype=np.uint8)
+    if set(np.unique(arr).tolist()) <= {0, 255}:
+        # captcha_debug 中保存的是已二值化的变体图，直接使用
+        return arr < 128
+    hist = np.bincount(arr.ravel(), minlength=256).astype(np.float64)
+    total = arr.size
+    cum = np.cumsum(hist)
+    cum_mean = np.cumsum(hist * np.arange(256))
+    w0 = cum / total
+    w1 = 1.0 - w0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu0 = cum_mean / cum
+        mu1 = (cum_mean[-1] - cum_mean) / (total - cum)
+        between = w0 * w1 * (mu0 - mu1) ** 2
+    thr = int(np.nanargmax(between))
+    mask = arr <= thr
+    # 去掉干扰横线：上下都没有字符像素的孤立行像素
+    up = np.zeros_like(mask)
+    down = np.zeros_like(mask)
+    up[1:, :] = mask[:-1, :]
+    down[:-1, :] = mask[1:, :]
+    line_px = mask & ~up & ~down
+    return mask & ~line_px
+def _segment_captcha_glyphs(mask, expected_len: int = 4) -> list:
+    cols = mask.sum(axis=0)
+    inked = cols >= 2
+    runs: list[list[int]] = []
+    start = None
+    for x, on in enumerate(inked.tolist() + [False]):
+        if on and start is None:
+            start = x
+        elif not on and start is not None:
+            if x - start >= 2:
+                runs.append([start, x])
+            start = None
+    if not runs:
+        return []
+    # 多于期望个数：合并间隙最小的相邻块；少于期望个数：拆分最宽的块
+    while len(runs) > expected_len:
+        gaps = [runs[i + 1][0] - runs[i][1] for i in range(len(runs) - 1)]
+        i = gaps.index(min(gaps))
+        runs[i : i + 2] = [[runs[i][0], runs[i + 1][1]]]
+    while len(runs) < expected_len:
+        i = max(range(len(runs)), key=lambda k: runs[k][1] - runs[k][0])
+        a, b = runs[i]
+        if b - a < 2:
+            break
+        mid = (a + b) // 2
+        runs[i : i + 1] = [[a, mid], [mid, b]]
+    glyphs = []
+    for a, b in runs:
+        piece = mask[:, a:b]
+        rows = np.where(piece.any(axis=1))[0]
+        if rows.size:
+            piece = piece[rows[0] : rows[-1] + 1, :]
+        img = Image.fromarray((piece * 255).astype(np.uint8)).resize(_TEMPLATE_GLYPH_SIZE, Image.BILINEAR)
+        vec = np.asarray(img, dtype=np.float32).ravel()
+        vec -= vec.mean()
+        norm = float(np.linalg.norm(vec))
+        glyphs.append(vec / norm if norm > 0 else vec)
+    return glyphs
+def _load_captcha_templates():
+    global _captcha_templates
+    if _captcha_templates is None:
+        if np is None or Image is None:
+            raise SystemExit("模板识别后端需要 numpy/pillow，请安装 requirements-lite.txt")
+        if not CAPTCHA_TEMPLATES_FILE.exists():
+            raise SystemExit(
+                f"未找到验证码模板文件：{CAPTCHA_TEMPLATES_FILE}，"
+                "请先运行 python login.py --train-captcha-templates captcha_debug"
+            )
+        data = np.load(CAPTCHA_TEMPLATES_FILE)
+        _captcha_templates = (data["labels"].tolist(), data["vectors"].astype(np.float32))
+    return _captcha_templates
+def _recognize_captcha_template(img_bytes: bytes) -> tuple[str, list[float]]:
+    labels, vectors = _load_captcha_templates()
+    glyphs = _segment_captcha_glyphs(_binarize_captcha_array(img_bytes))
+    chars: list[str] = []
+    confs: list[float] = []
+    for vec in glyphs:
+        sims = vectors @ vec
+        best = int(np.argmax(sims))
+        chars.append(labels[best])
+        confs.append(max(0.0, min(1.0, float(sims[best]))))
+    return "".join(chars), confs
+def _recognize_captcha_paddle(img_bytes: bytes) -> tuple[str, list[float]]:
+    return _ocr_captcha_scored(img_bytes)
+# 识别后端注册表：名称 -> (img_bytes) -> (验证码, 逐字符置信度)
+CAPTCHA_RECOGNIZERS = {
+    "paddle": _recognize_captcha_paddle,
+    "template": _recognize_captcha_template,
+}
+def _recognize_captcha(img_bytes: bytes) -> tuple[str, list[float]]:
+    recognizer = CAPTCHA_RECOGNIZERS.get(CAPTCHA_BACKEND)
+    if recognizer is None:
+        raise SystemExit(f"未知验证码识别后端：{CAPTCHA_BACKEND!r}（可选：{', '.join(CAPTCHA_RECOGNIZERS)}）")
+    code, confs = recognizer(img_bytes)
+    return _normalize_captcha(code, expected_len=4), confs
+def train_captcha_templates(corpus_dir: Path, out_file: Path = CAPTCHA_TEMPLATES_FILE) -> int:
+    if np is None or Image is None:
+        raise SystemExit("训练验证码模板需要 numpy/pillow")
+    pattern = re.compile(r"_成功_([A-Z0-9]{4})(?:\.png)?(?:_1)?$")
+    labels: list[str] = []
+    vectors = []
+    used = 0
+    samples = [p for p in sorted(Path(corpus_dir).glob("*.png")) if pattern.search(p.stem)]
+    # 优先使用原图样本，与推理时的截图输入一致；没有原图时再用二值化变体图
+    raw_samples = [p for p in samples if "_原图_" in p.stem]
+    for path in raw_samples or samples:
+        m = pattern.search(path.stem)
+        try:
+            glyphs = _segment_captcha_glyphs(_binarize_captcha_array(path.read_bytes()))
+        except Exception as exc:
+            print(f"[WARN] 读取样本失败：{path.name}（{exc}）")
+            continue
+        if len(glyphs) != 4:
+            continue
+        for ch, vec in zip(m.group(1), glyphs):
+            labels.append(ch)
+            vectors.append(vec)
+        used += 1
+    if not vectors:
+        raise SystemExit(f"{corpus_dir} 中没有可用的已标注样本（文件名需包含 _成功_XXXX）")
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(out_file, labels=np.array(labels), vectors=np.stack(vectors).astype(np.float32))
+    missing = sorted(set(CAPTCHA_CHARSET) - set(labels))
+    print(f"[INFO] 已训练验证码模板：{used} 张样本，{len(labels)} 个字符 -> {out_file}")
+    if missing:
+        print(f"[WARN] 以下字符没有样本，将无法识别：{''.join(missing)}")
+    return used
 def _mark_captcha_image(src: Path | None, status: str, code: str | None = None) -> None:
     if not src or not src.exists():
         return
     try:
         base = src.stem
         if code:
-            name = f"{base}_{code}"
+            # 保留状态，"_成功_XXXX" 的样本即为模板识别后端的训练标注
+            name = f"{base}_{status}_{code}"
         else:
             name = f"{base}_{status}"
         name = _safe_filename(name) + src.suffix
@@ -612,7 +962,11 @@ def _mark_captcha_image(src: Path | None, status: str, code: str | None = None)
         src.replace(dest)
     except Exception:
         return
-async def _solve_captcha_text(page: Page) -> tuple[str, Path | None]:
+    # 同一时间戳的原图一并标注，供模板后端训练使用（与推理时的输入一致）
+    raw = src.with_name(f"{src.stem.split('_', 1)[0]}_原图{src.suffix}")
+    if raw != src:
+        _mark_captcha_image(raw, status, code)
+async def _solve_captcha_text(page: Page) -> tuple[str, list[float], Path | None]:
     img = page.locator("#yanzhengma").first
     try:
         await img.wait_for(state="visible", timeout=PW_TIMEOUT_MS)
@@ -647,10 +1001,86 @@ async def _solve_captcha_text(page: Page) -> tuple[str, Path | None]:
         img_path = None
         debug_dir = None
         print(f"[WARN] 保存验证码截图失败: {exc}")
-    code = _ocr_captcha_bytes(img_bytes, debug=False, debug_dir=debug_dir)
-    if len(code) != 4:
-        return code, img_path
-    return code, img_path
+    # 识别（尤其是 PaddleOCR 首次加载）放到线程中，避免阻塞事件循环里的播放监控
+    code, confs = await asyncio.to_thread(_recognize_captcha, img_bytes)
+    return code, confs, img_path
+async def _refresh_captcha(page: Page) -> None:
+    # 点击刷新后等待新图片 load 事件，而不是固定等待
+    img = page.locator("#yanzhengma").first
+    try:
+        await img.evaluate(
+            """(el) => {
+                el.__dtLoaded = false;
+                el.addEventListener('load', () => { el.__dtLoaded = true; }, { once: true });
+            }"""
+        )
+        await img.click(timeout=PW_TIMEOUT_MS)
+        await page.wait_for_function(
+            "(el) => el && el.__dtLoaded && el.complete && el.naturalWidth > 0",
+            await img.element_handle(timeout=PW_TIMEOUT_MS),
+            timeout=PW_TIMEOUT_MS,
+        )
+    except Exception:
+        await page.wait_for_timeout(800)
+async def _clear_captcha_message(page: Page) -> None:
+    try:
+        await page.evaluate(
+            """() => {
+                const el = document.querySelector('#validateCodeMessage');
+                if (el) el.innerText = '';
+            }"""
+        )
+    except Exception:
+        pass
+async def _wait_login_outcome(page: Page, timeout_ms: int = CAPTCHA_RESULT_TIMEOUT_MS) -> str:
+    # 等待提交结果：跳转 member 返回 "ok"，出现 #validateCodeMessage 返回其文本，超时返回 ""
+    url_task = asyncio.ensure_future(
+        page.wait_for_url(lambda u: u.startswith(MEMBER_URL) or "www.dtdjzx.gov.cn/member" in u, wait_until="commit", timeout=timeout_ms)
+    )
+    msg_task = asyncio.ensure_future(
+        page.wait_for_function(
+            """() => {
+                const el = document.querySelector('#validateCodeMessage');
+                const t = el ? (el.innerText || '').trim() : '';
+                return t || false;
+            }""",
+            timeout=timeout_ms,
+        )
+    )
+    pending = {url_task, msg_task}
+    result = ""
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if url_task in done and not url_task.exception():
+                result = "ok"
+                break
+            if msg_task in done and not msg_task.exception():
+                try:
+                    result = str(await msg_task.result().json_value() or "").strip()
+                except Exception:
+                    result = ""
+                if result:
+                    break
+    finally:
+        for t in pending:
+            t.cancel()
+        for t in (url_task, msg_task):
+            if t.done() and not t.cancelled():
+                t.exception()
+    if _is_logged_in_by_url(page):
+        return "ok"
+    return result
+_login_timings: list[float] = []
+def _record_login_time(started: float, submits: int, refreshes: int) -> None:
+    elapsed = time.monotonic() - started
+    _login_timings.append(elapsed)
+    emit("login", ok=True, duration_s=round(elapsed, 3), submits=submits, refreshes=refreshes, backend=CAPTCHA_BACKEND)
+    mean = sum(_login_timings) / len(_login_timings)
+    print(
+        f"[INFO] 登录耗时 {elapsed:.1f}s（提交 {submits} 次，刷新验证码 {refreshes} 次），"
+        f"本进程平均登录耗时 {mean:.1f}s（{len(_login_timings)} 次）"
+    )
 async def _has_captcha_error(page: Page) -> bool:
     loc = page.locator("#validateCodeMessage").first
     if await loc.count() == 0:
@@ -701,14 +1131,29 @@ async def ensure_logged_in(page: Page, username: str, password: str, open_only:
     if password:
         await page.fill("#password", password)
 
+    started = time.monotonic()
     login_attempts = 0  # 统计登录失败次数（仅提交后失败才计数）
+    refreshes = 0
+    low_conf_streak = 0
     while True:
         if _is_logged_in_by_url(page):
             print(f"[INFO] 检测到跳转 member（{page.url}），登录成功")
+            _record_login_time(started, login_attempts, refreshes)
             return
+        if CAPTCHA_MAX_SUBMITS > 0 and login_attempts >= CAPTCHA_MAX_SUBMITS:
+            emit(
+                "login",
+                ok=False,
+                duration_s=round(time.monotonic() - started, 3),
+                submits=login_attempts,
+                refreshes=refreshes,
+                backend=CAPTCHA_BACKEND,
+            )
+            raise SystemExit(f"验证码已提交 {login_attempts} 次仍未登录成功，停止重试（DT_CAPTCHA_MAX_SUBMITS）")
         img_path = None
+        confs: list[float] = []
         try:
-            code, img_path = await _solve_captcha_text(page)
+            code, confs, img_path = await _solve_captcha_text(page)
         except Exception as exc:
             print(f"[WARN] OCR 失败，转人工输入：{exc}")
             _mark_captcha_image(img_path, "识别失败", None)
@@ -718,32 +1163,41 @@ async def ensure_logged_in(page: Page, username: str, password: str, open_only:
             safe_code = re.sub(r"[^A-Z0-9]", "?", safe_code)
             _safe_print(f"[WARN] 识别验证码是{safe_code!r}，不是4位，点击验证码图片刷新后重试")
             _mark_captcha_image(img_path, "长度不对", safe_code)
-            try:
-                await page.locator("#yanzhengma").click()
-            except Exception:
-                pass
-            await page.wait_for_timeout(800)
+            await _refresh_captcha(page)
+            refreshes += 1
             continue
+        min_conf = min(confs) if confs else 0.0
+        if _should_refresh_low_confidence(confs, low_conf_streak):
+            low_conf_streak += 1
+            conf_text = "/".join(f"{c:.2f}" for c in confs) or "无"
+            _safe_print(f"[WARN] 识别验证码是{code}，逐字符置信度 {conf_text} 过低，直接刷新验证码")
+            _mark_captcha_image(img_path, "置信度低", code)
+            await _refresh_captcha(page)
+            refreshes += 1
+            continue
+        low_conf_streak = 0
         attempt_no = login_attempts + 1
-        _safe_print(f"[INFO] 识别验证码是{code}，第{attempt_no}次尝试登录")
+        _safe_print(f"[INFO] 识别验证码是{code}（最低字符置信度 {min_conf:.2f}），第{attempt_no}次尝试登录")
         await page.fill("#validateCode", code)
+        await _clear_captcha_message(page)
         await _submit_login_form(page)
-        await page.wait_for_timeout(1500)
-        if _is_logged_in_by_url(page):
+        outcome = await _wait_login_outcome(page)
+        if outcome == "ok" or _is_logged_in_by_url(page):
             _mark_captcha_image(img_path, "成功", code)
             print(f"[INFO] 登录成功：{page.url}")
+            _record_login_time(started, attempt_no, refreshes)
             return
         login_attempts += 1  # 仅在提交后未登录成功时累加失败次数
-        if await _has_captcha_error(page):
-            safe_code = re.sub(r"[^A-Z0-9]", "?", str(code))
+        safe_code = re.sub(r"[^A-Z0-9]", "?", str(code))
+        if "验证码错误" in outcome or await _has_captcha_error(page):
             _safe_print(f"[WARN] 验证码错误，点击验证码图片刷新后重试（第{login_attempts}次）：{safe_code!r}")
             _mark_captcha_image(img_path, "验证码错误", safe_code)
-            try:
-                await page.locator("#yanzhengma").click()
-            except Exception:
-                pass
-            await page.wait_for_timeout(800)
-            continue
+        elif outcome:
+            _safe_print(f"[WARN] 登录失败：{outcome}，刷新验证码后重试（第{login_attempts}次）")
+        else:
+            _safe_print(f"[WARN] 提交后 {CAPTCHA_RESULT_TIMEOUT_MS}ms 内未跳转也无提示，刷新验证码后重试（第{login_attempts}次）")
+        await _refresh_captcha(page)
+        refreshes += 1
 
 async def perform_login(
     username: str,
@@ -756,7 +1210,8 @@ async def perform_login(
     save_state: bool = True,
 ) -> None:
     async with async_playwright() as p:
-        endpoint = os.getenv("PLAYWRIGHT_CDP_ENDPOINT", "http://127.0.0.1:53333")
+        # 多个端点时登录用第一个（登录态保存到文件，其它浏览器加载同一份）
+        endpoint = cdp_endpoints()[0]
         browser = await connect_chrome_over_cdp(p, endpoint)
         context = browser.contexts[0] if browser.contexts else await browser.new_context()
         context.set_default_timeout(PW_TIMEOUT_MS)
@@ -767,17 +1222,13 @@ async def perform_login(
                 print(f"[INFO] 已加载登录态：{state_file}")
         page = await context.new_page()
         open_only_effective = False
+        state_valid = False
         if loaded_state:
-            state_valid = False
             try:
-                print("[INFO] 校验登录态（打开个人中心）")
-                await page.goto(PERSONAL_CENTER_URL, wait_until="domcontentloaded", timeout=PW_TIMEOUT_MS)
-                await page.wait_for_timeout(1000)
-                state_valid = _is_logged_in_by_url(page) or "personalCenter" in (page.url or "")
-                if state_valid:
-                    print(f"[INFO] 登录态有效（{page.url}）")
-                else:
-                    print(f"[WARN] 登录态无效（当前URL={page.url!r}），将重新登录")
+                print("[INFO] 校验登录态")
+                state_valid = await verify_session(context, state_file)
+                if not state_valid:
+                    print("[WARN] 登录态无效，将重新登录")
             except Exception as exc:
                 print(f"[WARN] 登录态校验失败（{exc}），将重新登录")
             if not state_valid:
@@ -801,16 +1252,19 @@ async def perform_login(
                 except Exception:
                     pass
                 open_only_effective = False
-        await ensure_logged_in(
-            page,
-            username=username,
-            password=password,
-            open_only=open_only_effective,
-            skip_login=skip_login,
-        )
-        if save_state and _is_logged_in_by_url(page):
+        if not state_valid:
+            await ensure_logged_in(
+                page,
+                username=username,
+                password=password,
+                open_only=open_only_effective,
+                skip_login=skip_login,
+            )
+        logged_in = state_valid or _is_logged_in_by_url(page)
+        if save_state and logged_in:
             try:
-                await _save_storage_state(context, state_file)
+                await _save_storage_state(context, state_file, force=True)
+                mark_session_verified(state_file)
                 print(f"[INFO] 已保存登录态：{state_file}")
             except Exception as exc:
                 print(f"[WARN] 保存登录态失败：{exc}")
@@ -826,6 +1280,19 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser.add_argument("--state-file", default=str(DEFAULT_STATE_FILE), help="登录态文件")
     parser.add_argument("--no-load-state", action="store_true", help="不加载登录态")
     parser.add_argument("--no-save-state", action="store_true", help="不保存登录态")
+    parser.add_argument(
+        "--train-captcha-templates",
+        nargs="?",
+        const="captcha_debug",
+        default=None,
+        metavar="DIR",
+        help="用 DIR（默认 captcha_debug）中已标注的验证码训练模板识别后端后退出",
+    )
+    parser.add_argument(
+        "--profile-cdp",
+        action="store_true",
+        help="剖析 Playwright 调用耗时，退出时输出按调用点汇总与折叠栈（也可设 DT_PROFILE_CDP=1）",
+    )
     return parser.parse_args(argv)
 def login_flow(
     username: str, password: str, open_only: bool, keep_open: bool, skip_login: bool
@@ -846,6 +1313,10 @@ def login_flow(
 def main(argv: list[str] | None = None) -> None:
     load_local_secrets()
     args = parse_args(argv)
+    profiling.enable_from_env(args.profile_cdp)
+    if args.train_captcha_templates:
+        train_captcha_templates(Path(args.train_captcha_templates))
+        return
     open_only = False
     keep_open = not bool(args.close_after)
     skip_login = bool(args.skip_login)
@@ -0,0 +1,234 @@
+import asyncio
+import math
+import os
+import threading
+
+# Prometheus 文本格式的轻量指标（不依赖 prometheus_client）；watch.py --metrics-port 开启 HTTP 端点
+DEFAULT_METRICS_PORT = int(os.getenv("DT_METRICS_PORT", "0"))
+DEFAULT_METRICS_HOST = os.getenv("DT_METRICS_HOST", "127.0.0.1")
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + float(amount)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._functions: dict[tuple[str, ...], object] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def set_function(self, fn, **labels) -> None:
+        # 抓取时再计算取值（例如当前标签页数）
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def remove(self, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._functions.pop(key, None)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = _DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._data: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            data = self._data.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    data[0][i] += 1
+            data[1] += float(value)
+            data[2] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._data.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for b, c in zip(self.buckets, counts):
+                le = f'le="{_fmt_value(b)}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {c}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {count}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+COURSES = _register(Counter("dt_courses_total", "按结果统计的课程数（completed/skipped/skipped_force）", ("status",)))
+RECOVERY_ACTIONS = _register(
+    Counter("dt_recovery_actions_total", "按恢复级别统计的恢复动作（reload/new_tab/relogin/skip）", ("level",))
+)
+CDP_LATENCY = _register(Histogram("dt_cdp_roundtrip_seconds", "一次 CDP 往返（读取播放状态）的耗时", ("op",)))
+PERSONAL_CENTER_LATENCY = _register(
+    Histogram(
+        "dt_personal_center_refresh_seconds",
+        "刷新个人中心（新开标签到可读）的耗时",
+        buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0),
+    )
+)
+CREDITED_HOURS = _register(Counter("dt_credited_hours_total", "本进程累计新增学时"))
+COMPLETED_HOURS = _register(Gauge("dt_completed_hours", "个人中心显示的已完成学时"))
+OPEN_TABS = _register(Gauge("dt_open_tabs", "每个 browser context 当前打开的标签页数", ("context",)))
+RENDERER_HEAP = _register(Gauge("dt_renderer_js_heap_bytes", "每个 browser context 各标签 JS 堆合计（字节）", ("context",)))
+BLOCKED_REQUESTS = _register(
+    Counter("dt_blocked_requests_total", "按拦截配置与资源类型统计被拦截的请求数", ("profile", "type"))
+)
+NETWORK_BYTES = _register(
+    Counter("dt_network_bytes_total", "挂了拦截配置的标签实际下载的字节数（CDP encodedDataLength）", ("context",))
+)
+TAB_ADMISSION_WAITS = _register(
+    Counter("dt_tab_admission_waits_total", "新开标签因标签数/内存超限而等待的次数", ("context", "reason"))
+)
+WATCH_POLL_DELAY = _register(
+    Histogram(
+        "dt_watch_poll_delay_seconds",
+        "观看循环两次检测之间的等待时长（按阶段：base/adaptive/ending/completing）",
+        ("phase",),
+        buckets=(1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+    )
+)
+BROWSER_LOAD = _register(Gauge("dt_browser_load", "多浏览器分配时各 CDP 端点的负载（标签数 + JS 堆折算）", ("endpoint",)))
+BROWSER_LOST = _register(Counter("dt_browser_lost_total", "观看/扫描途中断开的浏览器次数", ("endpoint",)))
+COURSE_FAILURES = _register(Counter("dt_course_failures_total", "跳过课程按原因统计（media_error/stall/navigation/login），记入重试队列", ("cause",)))
+PLAYBACK_EFFICIENCY = _register(Gauge("dt_playback_efficiency", "当前课程标签最近一个窗口的播放效率（实测倍速 / 目标倍速）"))
+PLAYBACK_EFFICIENCY_WINDOWS = _register(
+    Histogram(
+        "dt_playback_efficiency_ratio",
+        "各评估窗口的播放效率分布（实测倍速 / 目标倍速）",
+        buckets=(0.1, 0.25, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.5),
+    )
+)
+SLOW_TAB_ACTIONS = _register(
+    Counter("dt_slow_tab_actions_total", "播放效率低于阈值的标签的处理次数（nudge 切前台恢复倍速/new_tab 换新标签/accept 接受当前倍速/skip 跳过）", ("action",))
+)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = (await asyncio.wait_for(reader.readline(), timeout=5)).decode("latin-1")
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in {b"\r\n", b"\n"}:
+                break
+        parts = request_line.split()
+        path = parts[1] if len(parts) >= 2 else "/"
+        if path.split("?", 1)[0] in {"/metrics", "/"}:
+            body = render().encode("utf-8")
+            status = "200 OK"
+            ctype = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+            ctype = "text/plain; charset=utf-8"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode(
+                "latin-1"
+            )
+            + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+async def start_metrics_server(port: int, host: str = DEFAULT_METRICS_HOST):
+    server = await asyncio.start_server(_handle, host, port)
+    print(f"[INFO] 指标端点已启动：http://{host}:{port}/metrics")
+    return server
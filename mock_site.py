@@ -0,0 +1,909 @@
+import argparse
+import json
+import os
+import random
+import secrets
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http import cookies as http_cookies
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+# 本地替身站点：复刻 login.py / get_no_test_urls.py / watch.py 依赖的页面与选择器
+# （sso 登录 + 验证码、member、个人中心 .plan-all.pro/.plan-all-y、commendIndex 卡片与分页、
+# coursedetail 是/否 与 video.js 播放器），可控制卡顿、媒体错误与会话过期，用于离线复现与压测。
+# 三个站点 origin 都映射到同一个本地地址：DT_SSO_ORIGIN / DT_WWW_ORIGIN / DT_CONTENT_ORIGIN。
+
+ROOT = Path(__file__).resolve().parent
+SESSION_COOKIE = "DTSESSION"
+CAPTCHA_COOKIE = "DTCAPTCHA"
+CAPTCHA_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+# 5x7 点阵字体（验证码图片用；不依赖 pillow）
+_FONT = {
+    "A": ".###.|#...#|#...#|#####|#...#|#...#|#...#",
+    "B": "####.|#...#|#...#|####.|#...#|#...#|####.",
+    "C": ".###.|#...#|#....|#....|#....|#...#|.###.",
+    "D": "###..|#..#.|#...#|#...#|#...#|#..#.|###..",
+    "E": "#####|#....|#....|####.|#....|#....|#####",
+    "F": "#####|#....|#....|####.|#....|#....|#....",
+    "G": ".###.|#...#|#....|#.###|#...#|#...#|.####",
+    "H": "#...#|#...#|#...#|#####|#...#|#...#|#...#",
+    "J": "..###|...#.|...#.|...#.|...#.|#..#.|.##..",
+    "K": "#...#|#..#.|#.#..|##...|#.#..|#..#.|#...#",
+    "L": "#....|#....|#....|#....|#....|#....|#####",
+    "M": "#...#|##.##|#.#.#|#.#.#|#...#|#...#|#...#",
+    "N": "#...#|#...#|##..#|#.#.#|#..##|#...#|#...#",
+    "P": "####.|#...#|#...#|####.|#....|#....|#....",
+    "Q": ".###.|#...#|#...#|#...#|#.#.#|#..#.|.##.#",
+    "R": "####.|#...#|#...#|####.|#.#..|#..#.|#...#",
+    "S": ".####|#....|#....|.###.|....#|....#|####.",
+    "T": "#####|..#..|..#..|..#..|..#..|..#..|..#..",
+    "U": "#...#|#...#|#...#|#...#|#...#|#...#|.###.",
+    "V": "#...#|#...#|#...#|#...#|#...#|.#.#.|..#..",
+    "W": "#...#|#...#|#...#|#.#.#|#.#.#|#.#.#|.#.#.",
+    "X": "#...#|#...#|.#.#.|..#..|.#.#.|#...#|#...#",
+    "Y": "#...#|#...#|.#.#.|..#..|..#..|..#..|..#..",
+    "Z": "#####|....#|...#.|..#..|.#...|#....|#####",
+    "2": ".###.|#...#|....#|...#.|..#..|.#...|#####",
+    "3": "#####|...#.|..#..|...#.|....#|#...#|.###.",
+    "4": "...#.|..##.|.#.#.|#..#.|#####|...#.|...#.",
+    "5": "#####|#....|####.|....#|....#|#...#|.###.",
+    "6": "..##.|.#...|#....|####.|#...#|#...#|.###.",
+    "7": "#####|....#|...#.|..#..|.#...|.#...|.#...",
+    "8": ".###.|#...#|#...#|.###.|#...#|#...#|.###.",
+    "9": ".###.|#...#|#...#|.####|....#|...#.|.##..",
+}
+
+
+def _png_gray(width: int, height: int, pixels: bytearray) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + bytes(pixels[y * width : (y + 1) * width]) for y in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_captcha(code: str, rng: random.Random | None = None) -> bytes:
+    """按点阵字体渲染 4 位验证码：浅色噪点背景、深色字符、随机上下抖动与一条细干扰线。"""
+    rng = rng or random.Random()
+    scale, gap, margin = 3, 5, 8
+    width = margin * 2 + len(code) * 5 * scale + (len(code) - 1) * gap
+    height = 40
+    pixels = bytearray(rng.randint(215, 250) for _ in range(width * height))
+    x = margin
+    for ch in code:
+        rows = _FONT[ch].split("|")
+        top = rng.randint(4, height - 7 * scale - 4)
+        ink = rng.randint(20, 70)
+        for gy, row in enumerate(rows):
+            for gx, on in enumerate(row):
+                if on != "#":
+                    continue
+                for dy in range(scale):
+                    for dx in range(scale):
+                        pixels[(top + gy * scale + dy) * width + x + gx * scale + dx] = ink
+        x += 5 * scale + gap
+    line_y = rng.randint(5, height - 6)
+    for lx in range(width):
+        pixels[line_y * width + lx] = min(pixels[line_y * width + lx], 120)
+    return _png_gray(width, height, pixels)
+
+
+class MockSite:
+    """替身站点的全部状态：课程、会话、验证码与请求统计（线程安全）。"""
+
+    def __init__(
+        self,
+        *,
+        courses: int = 30,
+        min_duration: int = 120,
+        max_duration: int = 360,
+        hours_per_course: float = 0.5,
+        required_hours: float | None = None,
+        completed_hours: float = 1.0,
+        test_rate: float = 0.3,
+        learned_rate: float = 0.2,
+        stall_rate: float = 0.0,
+        media_error_rate: float = 0.0,
+        session_ttl: float = 0.0,
+        time_scale: float = 1.0,
+        report_interval: float = 5.0,
+        page_size: int = 12,
+        username: str = "mock",
+        password: str = "mock",
+        seed: int | None = None,
+    ) -> None:
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.hours_per_course = hours_per_course
+        self.completed_hours = completed_hours
+        self.required_hours = required_hours or completed_hours + hours_per_course * courses * 2
+        self.session_ttl = session_ttl
+        self.time_scale = time_scale
+        self.report_interval = report_interval
+        self.page_size = page_size
+        self.username = username
+        self.password = password
+        self.sessions: dict[str, float] = {}
+        self.captchas: dict[str, str] = {}
+        self.stats: dict[str, float] = {}
+        self.started = time.monotonic()
+        self.courses: dict[str, dict] = {}
+        for i in range(courses):
+            cid = str(3600000000000000000 + i * 7919)
+            self.courses[cid] = {
+                "id": cid,
+                "title": f"替身课程 {i + 1:03d}",
+                "duration": self.rng.randint(min_duration, max_duration),
+                "has_test": self.rng.random() < test_rate,
+                "learned": self.rng.random() < learned_rate,
+                "position": 0.0,
+                "media_error": self.rng.random() < media_error_rate,
+                "stall_at": None,
+                "credited_at": None,
+            }
+        for c in self.courses.values():
+            if self.rng.random() < stall_rate:
+                c["stall_at"] = float(self.rng.randint(30, max(31, c["duration"] - 30)))
+
+    # ---- 统计 ----
+    def count(self, key: str, amount: float = 1) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            credited = [c for c in self.courses.values() if c["credited_at"] is not None]
+            return {
+                "uptime_s": round(time.monotonic() - self.started, 3),
+                "stats": dict(self.stats),
+                "credited_courses": len(credited),
+                "credited_hours": round(len(credited) * self.hours_per_course, 4),
+                "completed_hours": round(self.completed_hours, 4),
+                "required_hours": round(self.required_hours, 4),
+                "sessions": len(self.sessions),
+            }
+
+    def configure(self, **knobs) -> None:
+        with self.lock:
+            for key in ("session_ttl", "time_scale", "report_interval"):
+                if key in knobs:
+                    setattr(self, key, float(knobs[key]))
+            if "stall_course" in knobs:
+                c = self.courses.get(str(knobs["stall_course"]))
+                if c is not None:
+                    c["stall_at"] = float(knobs.get("stall_at") or 30)
+            if "media_error_course" in knobs:
+                c = self.courses.get(str(knobs["media_error_course"]))
+                if c is not None:
+                    c["media_error"] = bool(knobs.get("media_error", True))
+
+    # ---- 会话与验证码 ----
+    def new_session(self) -> str:
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = time.monotonic() + self.session_ttl if self.session_ttl > 0 else float("inf")
+        return token
+
+    def session_valid(self, token: str | None) -> bool:
+        if not token:
+            return False
+        with self.lock:
+            expires = self.sessions.get(token)
+            if expires is None:
+                return False
+            if time.monotonic() >= expires:
+                self.sessions.pop(token, None)
+                self.stats["session_expired"] = self.stats.get("session_expired", 0) + 1
+                return False
+            return True
+
+    def expire_sessions(self) -> None:
+        with self.lock:
+            self.sessions.clear()
+
+    def new_captcha(self, key: str) -> bytes:
+        code = "".join(self.rng.choice(CAPTCHA_CHARS) for _ in range(4))
+        with self.lock:
+            self.captchas[key] = code
+        return render_captcha(code, self.rng)
+
+    def check_login(self, key: str | None, username: str, password: str, code: str) -> str:
+        with self.lock:
+            expected = self.captchas.pop(key or "", None)
+        if expected is None or expected != (code or "").strip().upper():
+            self.count("login_captcha_error")
+            return "验证码错误"
+        if self.password and (username != self.username or password != self.password):
+            self.count("login_bad_password")
+            return "用户名或密码错误"
+        self.count("login_ok")
+        return ""
+
+    # ---- 课程 ----
+    def progress(self) -> dict:
+        with self.lock:
+            pct = int(min(100, self.completed_hours / self.required_hours * 100)) if self.required_hours else 100
+            return {"percent": pct, "completed_hours": round(self.completed_hours, 2), "required_hours": self.required_hours}
+
+    def course_page(self, page_no: int) -> dict:
+        with self.lock:
+            items = list(self.courses.values())
+        pages = max(1, (len(items) + self.page_size - 1) // self.page_size)
+        page_no = min(max(1, page_no), pages)
+        chunk = items[(page_no - 1) * self.page_size : page_no * self.page_size]
+        return {
+            "page": page_no,
+            "pages": pages,
+            "items": [{"id": c["id"], "title": c["title"], "learned": c["learned"]} for c in chunk],
+        }
+
+    def course(self, cid: str) -> dict | None:
+        with self.lock:
+            c = self.courses.get(cid)
+            if c is None:
+                return None
+            data = dict(c)
+            # 已学完的课程重新打开从头播放；未学完从上次上报的位置继续
+            if c["learned"]:
+                data["position"] = 0.0
+            data["time_scale"] = self.time_scale
+            data["report_interval"] = self.report_interval
+            return data
+
+    def report(self, cid: str, position: float, stalled: bool = False) -> dict:
+        with self.lock:
+            c = self.courses.get(cid)
+            if c is None:
+                return {"ok": False}
+            self.stats["reports"] = self.stats.get("reports", 0) + 1
+            if stalled and c["stall_at"] is not None:
+                # 卡顿只发生一次：重新打开后恢复正常
+                c["stall_at"] = None
+                self.stats["stalls"] = self.stats.get("stalls", 0) + 1
+            if not c["learned"]:
+                c["position"] = max(c["position"], float(position))
+            credited = False
+            if c["position"] >= c["duration"] - 1 and c["credited_at"] is None and not c["learned"]:
+                c["learned"] = True
+                c["credited_at"] = time.monotonic()
+                self.completed_hours += self.hours_per_course
+                credited = True
+            return {"ok": True, "credited": credited}
+
+
+_LOGIN_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>统一身份认证</title>
+<style>body{font-family:sans-serif}#loginForm div{margin:8px}#yanzhengma{cursor:pointer;vertical-align:middle}</style>
+</head><body>
+<form id="loginForm" onsubmit="return false">
+  <div><input id="username" placeholder="用户名"></div>
+  <div><input id="password" type="password" placeholder="密码"></div>
+  <div><input id="validateCode" placeholder="验证码"><img id="yanzhengma" src="/sso/captcha?r=0" alt="验证码"></div>
+  <div><a href="javascript:void(0)" id="loginBtn">登录</a></div>
+  <div id="validateCodeMessage"></div>
+</form>
+<script>
+const img = document.getElementById('yanzhengma');
+img.addEventListener('click', () => { img.src = '/sso/captcha?r=' + Math.random(); });
+async function submitLogin() {
+  const body = new URLSearchParams({
+    username: document.getElementById('username').value,
+    password: document.getElementById('password').value,
+    code: document.getElementById('validateCode').value,
+  });
+  const resp = await fetch('/sso/doLogin', { method: 'POST', body });
+  const data = await resp.json();
+  if (data.ok) { location.href = data.redirect; return; }
+  document.getElementById('validateCodeMessage').innerText = data.message || '登录失败';
+}
+document.getElementById('loginBtn').addEventListener('click', submitLogin);
+document.getElementById('validateCode').addEventListener('keydown', (e) => { if (e.key === 'Enter') submitLogin(); });
+</script>
+</body></html>
+"""
+
+_MEMBER_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>会员中心</title></head>
+<body><h3>会员中心（替身）</h3><a href="/content#/personalCenter">个人中心</a></body></html>
+"""
+
+_CONTENT_HTML = r"""<!doctype html>
+<html><head><meta charset="utf-8"><title>网络学院（替身）</title>
+<style>
+body{font-family:sans-serif;margin:0}
+header{padding:8px;border-bottom:1px solid #ccc}
+.video-warp-start{display:inline-block;width:180px;margin:8px;border:1px solid #ddd;vertical-align:top}
+.video-warp-start img{width:180px;height:100px;background:#9ab;display:block;cursor:pointer}
+.el-pager{list-style:none;padding:0}.el-pager li{display:inline-block;margin:0 4px;padding:2px 6px;cursor:pointer}
+.number.active{color:#fff;background:#409eff}
+.btn-quicknext.disabled{color:#ccc}
+.video-js{position:relative;width:640px;height:400px;background:#000}
+.video-js video{width:640px;height:360px;display:block}
+.vjs-control-bar{display:flex;gap:8px;align-items:center;height:40px;background:#333;color:#fff;padding:0 8px}
+.vjs-control-bar button{height:28px}
+.vjs-playback-rate{position:relative;cursor:pointer}
+.vjs-menu{display:none;position:absolute;bottom:30px;left:0;background:#222;list-style:none;margin:0;padding:4px}
+.vjs-playback-rate.open .vjs-menu{display:block}
+.vjs-error-display{position:absolute;top:120px;left:40px;color:#f66}
+</style></head>
+<body>
+<header><span class="el-popover__reference" id="userRef">用户登录</span></header>
+<main id="app"></main>
+<script>
+const LOGIN = '/sso/login';
+const app = document.getElementById('app');
+let player = null;
+let winStart = 1;
+
+async function api(path, opts) {
+  const resp = await fetch(path, Object.assign({ credentials: 'same-origin' }, opts || {}));
+  if (resp.status === 401) { location.href = LOGIN; throw new Error('unauthorized'); }
+  return resp.json();
+}
+function h(tag, attrs, children) {
+  const el = document.createElement(tag);
+  for (const [k, v] of Object.entries(attrs || {})) {
+    if (k === 'class') el.className = v; else if (k === 'text') el.textContent = v; else el.setAttribute(k, v);
+  }
+  for (const c of children || []) el.appendChild(c);
+  return el;
+}
+function clock(sec) {
+  sec = Math.max(0, Math.floor(sec));
+  const h_ = Math.floor(sec / 3600), m = Math.floor((sec % 3600) / 60), s = sec % 60;
+  const ss = String(s).padStart(2, '0');
+  return h_ > 0 ? `${h_}:${String(m).padStart(2, '0')}:${ss}` : `${m}:${ss}`;
+}
+
+async function renderPersonalCenter() {
+  const p = await api('/api/progress');
+  app.replaceChildren(h('div', { class: 'plan-right' }, [
+    h('div', { class: 'plan-all pro', text: `${p.percent}%` }),
+    h('div', { class: 'plan-all-y', text: `已完成：${p.completed_hours}学时` }),
+    h('div', { class: 'plan-all-y', text: `要求：${p.required_hours}学时` }),
+  ]));
+}
+
+async function renderCommend(pageNo) {
+  const data = await api('/api/courses?page=' + pageNo);
+  const cards = data.items.map((c) => {
+    const img = h('img', { alt: c.title });
+    img.addEventListener('click', () => {
+      window.open(`/content#/commend/coursedetail?courseId=${c.id}&flag=kc`, '_blank');
+    });
+    return h('div', { class: 'video-warp-start' }, [
+      img,
+      h('div', { text: c.title }),
+      h('span', { class: 'state-paused', text: c.learned ? '已学习' : '未学习' }),
+    ]);
+  });
+  if (pageNo < winStart || pageNo > winStart + 6) winStart = Math.max(1, Math.min(pageNo - 3, data.pages - 6));
+  const pager = h('ul', { class: 'el-pager' });
+  const end = Math.min(data.pages, winStart + 6);
+  for (let n = winStart; n <= end; n++) {
+    const li = h('li', { class: n === data.page ? 'number active' : 'number', text: String(n) });
+    li.addEventListener('click', () => { location.hash = '#/commendIndex?page=' + n; });
+    pager.appendChild(li);
+  }
+  const quick = h('li', { class: end < data.pages ? 'btn-quicknext' : 'btn-quicknext disabled', text: '»' });
+  quick.addEventListener('click', () => {
+    if (end >= data.pages) return;
+    winStart = Math.min(winStart + 5, Math.max(1, data.pages - 6));
+    renderCommend(data.page);
+  });
+  pager.appendChild(quick);
+  app.replaceChildren(h('div', { class: 'list' }, cards), pager);
+}
+
+function mountPlayer(course) {
+  const st = { pos: course.position, dur: course.duration, rate: 1, playing: false, ended: false, stalled: false };
+  const video = h('video', { class: 'vjs-tech' });
+  const playBtn = h('button', { class: 'vjs-play-control vjs-control vjs-button vjs-paused', title: 'Play', text: '▶' });
+  const fsBtn = h('button', { class: 'vjs-fullscreen-control vjs-control vjs-button', title: 'Fullscreen', text: '⛶' });
+  const cur = h('div', { class: 'vjs-current-time-display', text: clock(st.pos) });
+  const dur = h('div', { class: 'vjs-duration-display', text: clock(st.dur) });
+  const menu = h('ul', { class: 'vjs-menu' }, ['2x', '1.5x', '1.25x', '1x'].map((r) => {
+    const li = h('li', { class: 'vjs-menu-item' }, [h('span', { class: 'vjs-menu-item-text', text: r })]);
+    li.addEventListener('click', (e) => { e.stopPropagation(); video.playbackRate = parseFloat(r); rateBox.classList.remove('open'); });
+    return li;
+  }));
+  const rateBox = h('div', { class: 'vjs-playback-rate vjs-menu-button' }, [h('span', { text: '1x' }), menu]);
+  rateBox.addEventListener('click', () => rateBox.classList.toggle('open'));
+  const errorBox = h('div', { class: 'vjs-error-display' }, [h('div', {
+    text: course.media_error
+      ? 'The media could not be loaded, either because the server or network failed or because the format is not supported.'
+      : '',
+  })]);
+  const root = h('div', { id: 'vjs_video_433', class: 'video-js' }, [
+    video,
+    h('div', { class: 'vjs-poster' }),
+    h('div', { class: 'vjs-text-track-display' }),
+    h('div', { class: 'vjs-loading-spinner' }),
+    h('div', { class: 'vjs-control-bar' }, [playBtn, fsBtn, cur, dur, rateBox]),
+    errorBox,
+  ]);
+
+  Object.defineProperties(video, {
+    currentTime: { get: () => st.pos, set: (v) => { st.pos = Math.max(0, Math.min(st.dur, Number(v) || 0)); st.ended = false; } },
+    duration: { get: () => st.dur },
+    paused: { get: () => !st.playing },
+    ended: { get: () => st.ended },
+    readyState: { get: () => (course.media_error ? 0 : 4) },
+    playbackRate: { get: () => st.rate, set: (v) => { st.rate = Number(v) || 1; rateBox.firstChild.textContent = st.rate + 'x'; } },
+    muted: { get: () => true, set: () => {} },
+  });
+  video.play = () => {
+    if (course.media_error) return Promise.reject(new Error('MEDIA_ERR_SRC_NOT_SUPPORTED'));
+    if (st.ended) { st.pos = 0; st.ended = false; }
+    st.playing = true;
+    return Promise.resolve();
+  };
+  video.pause = () => { st.playing = false; };
+  video.addEventListener('click', () => (st.playing ? video.pause() : video.play().catch(() => {})));
+  playBtn.addEventListener('click', () => (st.playing ? video.pause() : video.play().catch(() => {})));
+
+  let last = performance.now();
+  let lastReport = last;
+  const report = (stalled) => {
+    lastReport = performance.now();
+    api('/api/report', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ id: course.id, position: st.pos, stalled: !!stalled }),
+    }).catch(() => {});
+  };
+  const timer = setInterval(() => {
+    const now = performance.now();
+    const dt = (now - last) / 1000;
+    last = now;
+    if (st.playing && !st.stalled) {
+      st.pos += dt * st.rate * course.time_scale;
+      if (course.stall_at != null && st.pos >= course.stall_at) {
+        st.pos = course.stall_at;
+        st.stalled = true;
+        report(true);
+      }
+      if (st.pos >= st.dur) {
+        st.pos = st.dur;
+        st.playing = false;
+        st.ended = true;
+        report(false);
+      }
+    }
+    if (st.playing && !st.stalled && now - lastReport >= course.report_interval * 1000) report(false);
+    if (!st.stalled) cur.textContent = clock(st.pos);
+    playBtn.className = 'vjs-play-control vjs-control vjs-button ' + (st.playing ? 'vjs-playing' : 'vjs-paused') + (st.ended ? ' vjs-ended' : '');
+    playBtn.title = st.ended ? 'Replay' : st.playing ? 'Pause' : 'Play';
+  }, 250);
+  return { root, stop: () => clearInterval(timer) };
+}
+
+async function renderDetail(courseId) {
+  const course = await api('/api/course?id=' + encodeURIComponent(courseId));
+  if (player) player.stop();
+  player = mountPlayer(course);
+  app.replaceChildren(
+    h('div', { class: 'titleContent' }, [h('label', { text: '随堂测验：' }), h('span', { text: course.has_test ? '是' : '否' })]),
+    h('h3', { text: course.title }),
+    player.root,
+  );
+}
+
+async function route() {
+  const hash = location.hash || '#/personalCenter';
+  const [path, query] = hash.slice(1).split('?');
+  const params = new URLSearchParams(query || '');
+  if (player && !path.startsWith('/commend/coursedetail')) { player.stop(); player = null; }
+  if (path.startsWith('/personalCenter')) return renderPersonalCenter();
+  if (path.startsWith('/commendIndex')) return renderCommend(parseInt(params.get('page') || '1', 10));
+  if (path.startsWith('/commend/coursedetail')) return renderDetail(params.get('courseId'));
+  app.textContent = '未知页面';
+}
+window.addEventListener('hashchange', route);
+api('/api/user').then((u) => { document.getElementById('userRef').textContent = u.name; }).catch(() => {});
+route();
+</script>
+</body></html>
+"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    site: MockSite
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        return
+
+    def _cookies(self) -> http_cookies.SimpleCookie:
+        jar = http_cookies.SimpleCookie()
+        try:
+            jar.load(self.headers.get("Cookie") or "")
+        except Exception:
+            pass
+        return jar
+
+    def _cookie(self, name: str) -> str | None:
+        morsel = self._cookies().get(name)
+        return morsel.value if morsel else None
+
+    def _send(self, status: int, body: bytes, ctype: str, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, data, status: int = 200, headers: dict | None = None) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", headers)
+
+    def _html(self, text: str) -> None:
+        self._send(200, text.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _redirect(self, location: str) -> None:
+        self._send(302, b"", "text/plain", {"Location": location})
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def _authed(self) -> bool:
+        return self.site.session_valid(self._cookie(SESSION_COOKIE))
+
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        site = self.site
+        url = urlsplit(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+        site.count("requests")
+        if path.startswith("/api/"):
+            site.count("requests_api")
+        elif path == "/sso/captcha":
+            site.count("requests_captcha")
+        else:
+            site.count("requests_page")
+
+        if path == "/sso/login":
+            if self._authed():
+                self._redirect("/member/")
+                return
+            self._html(_LOGIN_HTML)
+        elif path == "/sso/captcha":
+            key = self._cookie(CAPTCHA_COOKIE) or secrets.token_hex(8)
+            self._send(200, site.new_captcha(key), "image/png", {"Set-Cookie": f"{CAPTCHA_COOKIE}={key}; Path=/"})
+        elif path in {"/member", "/member/"}:
+            if not self._authed():
+                self._redirect("/sso/login?service=member")
+                return
+            self._html(_MEMBER_HTML)
+        elif path in {"/content", "/content/"}:
+            if not self._authed():
+                self._redirect("/sso/login?service=content")
+                return
+            self._html(_CONTENT_HTML)
+        elif path == "/api/user":
+            if not self._authed():
+                self._json({"error": "unauthorized"}, 401)
+                return
+            self._json({"name": site.username})
+        elif path == "/api/progress":
+            if not self._authed():
+                self._json({"error": "unauthorized"}, 401)
+                return
+            self._json(site.progress())
+        elif path == "/api/courses":
+            if not self._authed():
+                self._json({"error": "unauthorized"}, 401)
+                return
+            self._json(site.course_page(int((query.get("page") or ["1"])[0] or 1)))
+        elif path == "/api/course":
+            if not self._authed():
+                self._json({"error": "unauthorized"}, 401)
+                return
+            course = site.course((query.get("id") or [""])[0])
+            if course is None:
+                self._json({"error": "not found"}, 404)
+                return
+            self._json(course)
+        elif path == "/__mock/stats":
+            self._json(site.snapshot())
+        elif path == "/favicon.ico":
+            self._send(404, b"", "text/plain")
+        else:
+            self._send(404, b"not found\n", "text/plain; charset=utf-8")
+
+    def do_POST(self) -> None:
+        site = self.site
+        path = urlsplit(self.path).path
+        site.count("requests")
+        body = self._body()
+        if path == "/sso/doLogin":
+            site.count("requests_page")
+            form = {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+            message = site.check_login(
+                self._cookie(CAPTCHA_COOKIE), form.get("username", ""), form.get("password", ""), form.get("code", "")
+            )
+            if message:
+                self._json({"ok": False, "message": message})
+                return
+            token = site.new_session()
+            self._json({"ok": True, "redirect": "/member/"}, headers={"Set-Cookie": f"{SESSION_COOKIE}={token}; Path=/"})
+        elif path == "/api/report":
+            site.count("requests_api")
+            if not self._authed():
+                self._json({"error": "unauthorized"}, 401)
+                return
+            try:
+                data = json.loads(body or b"{}")
+            except Exception:
+                data = {}
+            self._json(site.report(str(data.get("id") or ""), float(data.get("position") or 0), bool(data.get("stalled"))))
+        elif path == "/__mock/session":
+            token = site.new_session()
+            self._json({"token": token, "cookie": SESSION_COOKIE})
+        elif path == "/__mock/expire":
+            site.expire_sessions()
+            self._json({"ok": True})
+        elif path == "/__mock/config":
+            try:
+                site.configure(**json.loads(body or b"{}"))
+            except Exception as exc:
+                self._json({"ok": False, "error": str(exc)}, 400)
+                return
+            self._json({"ok": True})
+        else:
+            self._send(404, b"not found\n", "text/plain; charset=utf-8")
+
+
+def start_mock_site(site: MockSite, host: str = "127.0.0.1", port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    handler = type("MockSiteHandler", (_Handler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-site", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def site_env(base_url: str) -> dict[str, str]:
+    return {"DT_SSO_ORIGIN": base_url, "DT_WWW_ORIGIN": base_url, "DT_CONTENT_ORIGIN": base_url}
+
+
+def course_urls(site: MockSite, base_url: str, *, include_learned: bool = False) -> list[str]:
+    return [
+        f"{base_url}/content#/commend/coursedetail?courseId={c['id']}&flag=kc"
+        for c in site.courses.values()
+        if (include_learned or not c["learned"]) and not c["has_test"]
+    ]
+
+
+def write_captcha_corpus(out_dir: Path, count: int, seed: int | None = None) -> int:
+    """生成带标注的验证码样本（文件名含 _原图_成功_XXXX），供 login.py --train-captcha-templates 训练。"""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        code = "".join(rng.choice(CAPTCHA_CHARS) for _ in range(4))
+        (out_dir / f"mock{i:05d}_原图_成功_{code}.png").write_bytes(render_captcha(code, rng))
+    return count
+
+
+def _site_from_args(args: argparse.Namespace) -> MockSite:
+    return MockSite(
+        courses=args.courses,
+        min_duration=args.min_duration,
+        max_duration=args.max_duration,
+        stall_rate=args.stall_rate,
+        media_error_rate=args.media_error_rate,
+        session_ttl=args.session_ttl,
+        time_scale=args.time_scale,
+        report_interval=args.report_interval,
+        learned_rate=args.learned_rate,
+        seed=args.seed,
+    )
+
+
+def _serve(args: argparse.Namespace) -> int:
+    site = _site_from_args(args)
+    server, base = start_mock_site(site, args.host, args.port)
+    print(f"[INFO] 替身站点已启动：{base}（课程 {len(site.courses)} 门，账号 {site.username}/{site.password}）")
+    print("[INFO] 让脚本指向替身站点：")
+    for k, v in site_env(base).items():
+        print(f"  {k}={v}")
+    if args.url_file:
+        Path(args.url_file).write_text("\n".join(course_urls(site, base)) + "\n", encoding="utf-8")
+        print(f"[INFO] 已写出课程 URL：{args.url_file}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+
+def _bench(args: argparse.Namespace) -> int:
+    import events
+    import urllib.request
+
+    site = _site_from_args(args)
+    server, base = start_mock_site(site, args.host, 0)
+    work = Path(tempfile.mkdtemp(prefix="dt-bench-"))
+    try:
+        urls = course_urls(site, base)[: args.limit or None]
+        url_file = work / "url.txt"
+        url_file.write_text("\n".join(urls) + "\n", encoding="utf-8")
+        state_file = work / "storage_state.json"
+        with urllib.request.urlopen(urllib.request.Request(f"{base}/__mock/session", method="POST", data=b"")) as resp:
+            token = json.loads(resp.read())["token"]
+        state = {
+            "cookies": [
+                {
+                    "name": SESSION_COOKIE,
+                    "value": token,
+                    "domain": urlsplit(base).hostname,
+                    "path": "/",
+                    "expires": -1,
+                    "httpOnly": False,
+                    "secure": False,
+                    "sameSite": "Lax",
+                }
+            ],
+            "origins": [],
+        }
+        state_file.write_text(json.dumps(state), encoding="utf-8")
+
+        env = dict(os.environ)
+        env.update(site_env(base))
+        env.update(
+            {
+                "DT_STORAGE_STATE_FILE": str(state_file),
+                "DT_EVENT_LOG": str(work / "events.jsonl"),
+                "DT_PROFILE_CDP": "1",
+                "DT_PROFILE_CDP_OUTPUT": str(work / "cdp_profile.folded"),
+                "DT_CRAWLER_USERNAME": site.username,
+                "DT_CRAWLER_PASSWORD": site.password,
+                "DT_NOTIFY_SINKS": "log",
+                "DT_CAPTCHA_BACKEND": "template",
+            }
+        )
+        if args.session_ttl > 0:
+            # 会话会过期时需要自动登录：用替身验证码样本训练模板后端
+            corpus = work / "captcha_corpus"
+            write_captcha_corpus(corpus, 200, seed=args.seed)
+            env["DT_CAPTCHA_TEMPLATES"] = str(work / "captcha_templates.npz")
+            subprocess.run(
+                [sys.executable, str(ROOT / "login.py"), "--train-captcha-templates", str(corpus)],
+                env=env,
+                cwd=work,
+                check=False,
+            )
+
+        cmd = [sys.executable, str(ROOT / "watch.py"), "--url-file", str(url_file)] + list(args.watch_args or [])
+        print(f"[INFO] 替身站点：{base}，课程 {len(urls)} 门，工作目录：{work}")
+        print(f"[INFO] 运行：{' '.join(cmd)}")
+        started = time.monotonic()
+        try:
+            proc = subprocess.run(cmd, env=env, cwd=work, timeout=args.timeout or None)
+            exit_code = proc.returncode
+        except subprocess.TimeoutExpired:
+            exit_code = None
+            print(f"[WARN] 超过 {args.timeout}s 仍未结束，已终止")
+        wall = time.monotonic() - started
+
+        snap = site.snapshot()
+        summary = events.summarize(events._iter_events(events._log_files(work / "events.jsonl")))
+        try:
+            cdp = json.loads((work / "cdp_profile.json").read_text(encoding="utf-8"))
+        except Exception:
+            cdp = {}
+        credited = snap["credited_courses"]
+        result = {
+            "courses": len(urls),
+            "credited_courses": credited,
+            "wall_s": round(wall, 3),
+            "courses_per_hour": round(credited / (wall / 3600.0), 3) if wall > 0 else None,
+            "credited_hours": snap["credited_hours"],
+            "http_requests": int(snap["stats"].get("requests", 0)),
+            "http_requests_per_course": round(snap["stats"].get("requests", 0) / credited, 2) if credited else None,
+            "progress_reports": int(snap["stats"].get("reports", 0)),
+            "playwright_calls": cdp.get("calls"),
+            "playwright_calls_per_course": round(cdp["calls"] / credited, 2) if credited and cdp.get("calls") else None,
+            "playwright_seconds": cdp.get("seconds"),
+            "stalls": summary.get("stalls"),
+            "recovery_s": summary.get("recovery_s"),
+            "refresh_s": summary.get("refresh_s"),
+            "logins": summary.get("logins"),
+            "exit_code": exit_code,
+            "scenario": {
+                "time_scale": args.time_scale,
+                "stall_rate": args.stall_rate,
+                "media_error_rate": args.media_error_rate,
+                "session_ttl": args.session_ttl,
+                "watch_args": list(args.watch_args or []),
+            },
+        }
+        print("\n===== 替身站点压测结果 =====")
+        for k, v in result.items():
+            if k != "scenario":
+                print(f"{k:>28}: {v}")
+        if args.json:
+            Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"[INFO] 结果已写入：{args.json}")
+        return 0
+    finally:
+        server.shutdown()
+        if args.keep_workdir:
+            print(f"[INFO] 保留工作目录：{work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="本地替身站点：离线复现登录/扫描/观看流程并压测")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    def scenario(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--courses", type=int, default=30, help="课程数（默认 30）")
+        p.add_argument("--min-duration", type=int, default=120, help="视频最短时长（秒，默认 120）")
+        p.add_argument("--max-duration", type=int, default=360, help="视频最长时长（秒，默认 360）")
+        p.add_argument("--learned-rate", type=float, default=0.2, help="已学习课程比例（默认 0.2）")
+        p.add_argument("--stall-rate", type=float, default=0.0, help="播放中途卡住（一次）的课程比例")
+        p.add_argument("--media-error-rate", type=float, default=0.0, help="媒体加载失败的课程比例")
+        p.add_argument("--session-ttl", type=float, default=0.0, help="登录会话有效秒数（0 表示不过期）")
+        p.add_argument("--time-scale", type=float, default=1.0, help="视频时钟加速倍数（叠加在播放倍速上）")
+        p.add_argument("--report-interval", type=float, default=5.0, help="播放器进度上报间隔（秒）")
+        p.add_argument("--seed", type=int, default=None, help="随机种子（固定后场景可复现）")
+
+    p_serve = sub.add_parser("serve", help="启动替身站点")
+    scenario(p_serve)
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--url-file", default=None, help="写出可观看（未学习、无随堂测验）课程的 URL 文件")
+
+    p_bench = sub.add_parser("bench", help="启动替身站点并运行 watch.py，统计 课程/小时 与往返次数")
+    scenario(p_bench)
+    p_bench.set_defaults(courses=6, time_scale=10.0, learned_rate=0.0, seed=1)
+    p_bench.add_argument("--limit", type=int, default=0, help="最多观看的课程数（0 表示全部）")
+    p_bench.add_argument("--timeout", type=float, default=3600, help="watch.py 最长运行秒数")
+    p_bench.add_argument("--json", default=None, help="把结果写入 JSON 文件，便于前后对比")
+    p_bench.add_argument("--keep-workdir", action="store_true", help="保留临时工作目录（事件日志、剖析结果）")
+    p_bench.add_argument("watch_args", nargs=argparse.REMAINDER, help="传给 watch.py 的参数（放在 -- 之后）")
+
+    p_corpus = sub.add_parser("captcha-corpus", help="生成带标注的替身验证码样本")
+    p_corpus.add_argument("out_dir")
+    p_corpus.add_argument("--count", type=int, default=200)
+    p_corpus.add_argument("--seed", type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.cmd == "serve":
+        return _serve(args)
+    if args.cmd == "bench":
+        if args.watch_args and args.watch_args[0] == "--":
+            args.watch_args = args.watch_args[1:]
+        return _bench(args)
+    n = write_captcha_corpus(Path(args.out_dir), args.count, args.seed)
+    print(f"[INFO] 已生成 {n} 张验证码样本：{args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
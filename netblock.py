@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+import metrics
+from events import emit
+from login import SSO_ORIGIN
+
+# 请求拦截配置：自动化只需要页面文本、播放器脚本、视频流与进度上报接口，图片/字体/统计脚本一律丢弃。
+# 用 CDP Network.setBlockedURLs 在浏览器内按通配模式拦截：请求不经过 Python，也不像 context.route 那样
+# 关闭 HTTP 缓存（定时刷新播放页时脚本、样式仍走缓存）。
+DEFAULT_WATCH_PROFILE = os.getenv("DT_BLOCK_PROFILE_WATCH", "watch")
+DEFAULT_SCAN_PROFILE = os.getenv("DT_BLOCK_PROFILE_SCAN", "scan")
+# 逗号分隔的放行模式（URLPattern 语法，须为绝对地址，如 https://cdn.example.com/*），优先于拦截规则；
+# 需要支持 setBlockedURLs urlPatterns 的 Chrome，旧版本会忽略放行规则
+BLOCK_ALLOW = [s.strip() for s in os.getenv("DT_BLOCK_ALLOW", "").split(",") if s.strip()]
+# 额外拦截的模式：逗号分隔，* 匹配任意字符，与整个 URL 比较（setBlockedURLs 的 urls 语法）
+BLOCK_EXTRA = [s.strip() for s in os.getenv("DT_BLOCK_EXTRA", "").split(",") if s.strip()]
+
+# 登录页的验证码是图片，sso 下的请求始终放行
+_ALWAYS_ALLOW = (f"{SSO_ORIGIN}/sso/*",)
+
+_IMAGE_EXTS = ("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp")
+_FONT_EXTS = ("woff", "woff2", "ttf", "otf", "eot")
+_MEDIA_EXTS = ("mp4", "m3u8", "ts", "flv", "webm", "mp3", "m4a")
+_ANALYTICS_HOSTS = (
+    "hm.baidu.com",
+    "*cnzz.com",
+    "*51.la",
+    "*google-analytics.com",
+    "*googletagmanager.com",
+    "*umeng.com",
+)
+
+
+def _ext_patterns(exts: tuple[str, ...]) -> list[str]:
+    return [p for ext in exts for p in (f"*.{ext}", f"*.{ext}?*")]
+
+
+def _host_patterns(hosts: tuple[str, ...]) -> list[str]:
+    return [f"*://{h}/*" for h in hosts]
+
+
+BLOCK_PROFILES: dict[str, list[str]] = {
+    "off": [],
+    # 观看：保留视频流、脚本、样式与 XHR（进度上报）
+    "watch": _ext_patterns(_IMAGE_EXTS + _FONT_EXTS) + _host_patterns(_ANALYTICS_HOSTS),
+    # 扫描：只读列表文本，视频也不需要
+    "scan": _ext_patterns(_IMAGE_EXTS + _FONT_EXTS + _MEDIA_EXTS) + _host_patterns(_ANALYTICS_HOSTS),
+}
+
+
+def _log(msg: str) -> None:
+    print(f"[NET] {msg}")
+
+
+class NetBlocker:
+    """
+    按 profile 给 context 的每个标签下发拦截模式，并从 CDP 网络事件统计被拦截的请求数与实际下载字节
+    （loadingFinished.encodedDataLength，含响应头，缓存命中不计）。
+    """
+
+    def __init__(self, profile: str, label: str = "watch") -> None:
+        if profile not in BLOCK_PROFILES:
+            raise SystemExit(f"未知的拦截配置：{profile!r}（可选：{', '.join(BLOCK_PROFILES)}）")
+        self.profile = profile
+        self.label = label
+        self.blocked: dict[str, int] = {}
+        self.bytes = 0
+        self.patterns = list(BLOCK_PROFILES[profile])
+        if BLOCK_EXTRA and profile != "off":
+            self.patterns += BLOCK_EXTRA
+        self._allow = [{"urlPattern": p, "block": False} for p in (*_ALWAYS_ALLOW, *BLOCK_ALLOW)]
+        self._sessions: dict = {}
+
+    async def apply(self, context) -> None:
+        if not self.patterns:
+            return
+        # 新标签在 page 事件里挂上；首个导航的主文档不受影响，图片/字体在解析后才请求
+        context.on("page", lambda page: asyncio.ensure_future(self.attach(page)))
+        for page in context.pages:
+            await self.attach(page)
+        _log(f"已启用请求拦截配置：{self.profile}")
+
+    async def attach(self, page) -> None:
+        if page in self._sessions or page.is_closed():
+            return
+        self._sessions[page] = None
+        try:
+            session = await page.context.new_cdp_session(page)
+            session.on("Network.loadingFailed", self._on_failed)
+            session.on("Network.loadingFinished", self._on_finished)
+            await session.send("Network.enable")
+            await session.send("Network.setBlockedURLs", {"urls": self.patterns, "urlPatterns": self._allow})
+        except Exception as exc:
+            self._sessions.pop(page, None)
+            if not page.is_closed():
+                _log(f"标签拦截规则下发失败：{exc}")
+            return
+        self._sessions[page] = session
+        page.once("close", lambda p: self._sessions.pop(p, None))
+
+    def _on_failed(self, params: dict) -> None:
+        if params.get("blockedReason") != "inspector":
+            return
+        kind = str(params.get("type") or "other").lower()
+        self.blocked[kind] = self.blocked.get(kind, 0) + 1
+        metrics.BLOCKED_REQUESTS.inc(profile=self.profile, type=kind)
+
+    def _on_finished(self, params: dict) -> None:
+        n = int(params.get("encodedDataLength") or 0)
+        if n > 0:
+            self.bytes += n
+            metrics.NETWORK_BYTES.inc(n, context=self.label)
+
+    def summary(self) -> dict:
+        return {
+            "profile": self.profile,
+            "requests": sum(self.blocked.values()),
+            "by_type": dict(sorted(self.blocked.items())),
+            "downloaded_bytes": self.bytes,
+        }
+
+    def report(self) -> dict:
+        summary = self.summary()
+        if not self.patterns:
+            return summary
+        by_type = "，".join(f"{k}={v}" for k, v in summary["by_type"].items()) or "无"
+        _log(
+            f"请求拦截（{self.profile}）：共 {summary['requests']} 个请求（{by_type}），"
+            f"实际下载 {summary['downloaded_bytes'] / (1024 * 1024):.1f}MB"
+        )
+        emit("netblock", context=self.label, **summary)
+        return summary
+
+
+async def apply_block_profile(context, profile: str, label: str = "watch") -> NetBlocker:
+    blocker = NetBlocker(profile, label)
+    await blocker.apply(context)
+    return blocker
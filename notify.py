@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import queue
+import smtplib
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from email.mime.text import MIMEText
+
+from events import emit
+
+# 提醒通知：调用方只入队，后台线程合并短时间内的多条提醒为一封摘要，按通道重试投递，不阻塞事件循环。
+# 配置从环境变量读取（secrets.local.env 会由 load_local_secrets 载入）：
+#   DT_NOTIFY_SINKS        逗号分隔的通道：smtp / webhook / log（默认 smtp）
+#   DT_NOTIFY_TO           收件人（逗号分隔）
+#   DT_SMTP_HOST/PORT/USER/PASSWORD/FROM/SSL/STARTTLS  SMTP 参数（SSL 默认开启，端口默认 465）
+#   DT_NOTIFY_WEBHOOK_URL  webhook 通道地址（POST JSON：subject/body）
+NOTIFY_COALESCE_SECONDS = float(os.getenv("DT_NOTIFY_COALESCE_SECONDS", "20"))
+NOTIFY_RETRIES = int(os.getenv("DT_NOTIFY_RETRIES", "4"))
+NOTIFY_BACKOFF_SECONDS = float(os.getenv("DT_NOTIFY_BACKOFF_SECONDS", "2"))
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("DT_NOTIFY_TIMEOUT_SECONDS", "15"))
+# 进程退出时最多等待未发送提醒的秒数
+NOTIFY_FLUSH_SECONDS = float(os.getenv("DT_NOTIFY_FLUSH_SECONDS", "60"))
+
+
+def _log(msg: str) -> None:
+    print(f"[NOTIFY] {msg}")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _split_addrs(value: str | None) -> list[str]:
+    return [a.strip() for a in (value or "").split(",") if a.strip()]
+
+
+class SmtpSink:
+    name = "smtp"
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        sender: str,
+        to: list[str],
+        *,
+        ssl: bool = True,
+        starttls: bool = False,
+        timeout: float = NOTIFY_TIMEOUT_SECONDS,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.to = to
+        self.ssl = ssl
+        self.starttls = starttls
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> "SmtpSink | None":
+        to = _split_addrs(os.getenv("DT_NOTIFY_TO"))
+        host = os.getenv("DT_SMTP_HOST", "smtp.gmail.com")
+        user = os.getenv("DT_SMTP_USER", "")
+        sender = os.getenv("DT_SMTP_FROM") or user
+        if not to or not host or not sender:
+            _log("SMTP 通道缺少 DT_NOTIFY_TO / DT_SMTP_USER（或 DT_SMTP_FROM），已忽略")
+            return None
+        ssl = _env_flag("DT_SMTP_SSL", True)
+        return cls(
+            host,
+            int(os.getenv("DT_SMTP_PORT", "465" if ssl else "25")),
+            user,
+            os.getenv("DT_SMTP_PASSWORD", ""),
+            sender,
+            to,
+            ssl=ssl,
+            starttls=_env_flag("DT_SMTP_STARTTLS", False),
+        )
+
+    def send(self, subject: str, body: str) -> None:
+        msg = MIMEText(body, "plain", "utf-8")
+        msg["Subject"] = subject
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(self.to)
+        smtp_cls = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        with smtp_cls(self.host, self.port, timeout=self.timeout) as server:
+            if self.starttls and not self.ssl:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+            server.sendmail(self.sender, self.to, msg.as_string())
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = NOTIFY_TIMEOUT_SECONDS) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> "WebhookSink | None":
+        url = os.getenv("DT_NOTIFY_WEBHOOK_URL", "")
+        if not url:
+            _log("webhook 通道缺少 DT_NOTIFY_WEBHOOK_URL，已忽略")
+            return None
+        return cls(url)
+
+    def send(self, subject: str, body: str) -> None:
+        data = json.dumps({"subject": subject, "body": body}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json; charset=utf-8"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            if resp.status >= 400:
+                raise RuntimeError(f"webhook 返回 HTTP {resp.status}")
+
+
+class LogSink:
+    name = "log"
+
+    @classmethod
+    def from_env(cls) -> "LogSink":
+        return cls()
+
+    def send(self, subject: str, body: str) -> None:
+        _log(f"{subject}\n{body}")
+
+
+NOTIFY_SINKS = {
+    "smtp": SmtpSink,
+    "webhook": WebhookSink,
+    "log": LogSink,
+}
+
+
+def sinks_from_env() -> list:
+    sinks = []
+    for name in _split_addrs(os.getenv("DT_NOTIFY_SINKS", "smtp")):
+        sink_cls = NOTIFY_SINKS.get(name.lower())
+        if sink_cls is None:
+            _log(f"未知通知通道：{name}（可选：{', '.join(NOTIFY_SINKS)}）")
+            continue
+        sink = sink_cls.from_env()
+        if sink is not None:
+            sinks.append(sink)
+    return sinks
+
+
+def _digest(items: list[tuple[float, str, str]]) -> tuple[str, str]:
+    if len(items) == 1:
+        return items[0][1], items[0][2]
+    subjects = []
+    for _, subject, _ in items:
+        if subject not in subjects:
+            subjects.append(subject)
+    subject = f"[{len(items)} 条提醒] " + " / ".join(subjects)
+    parts = []
+    for ts, item_subject, body in items:
+        when = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        parts.append(f"== {when} {item_subject} ==\n{body}")
+    return subject, "\n\n".join(parts)
+
+
+class Notifier:
+    """
+    后台投递线程：notify() 只入队立即返回；首条提醒到达后等待 coalesce 秒收集后续提醒合并为一封摘要，
+    每个通道独立按指数退避重试。flush() 供退出前等待发送完成。
+    """
+
+    def __init__(
+        self,
+        sinks: list,
+        *,
+        coalesce: float = NOTIFY_COALESCE_SECONDS,
+        retries: int = NOTIFY_RETRIES,
+        backoff: float = NOTIFY_BACKOFF_SECONDS,
+    ) -> None:
+        self.sinks = sinks
+        self.coalesce = coalesce
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: queue.Queue = queue.Queue()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def notify(self, subject: str, body: str) -> None:
+        if not self.sinks:
+            _log(f"未配置可用通知通道，丢弃提醒：{subject}")
+            return
+        with self._lock:
+            self._idle.clear()
+            self._queue.put((time.time(), subject, body))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float | None = NOTIFY_FLUSH_SECONDS) -> bool:
+        if self._idle.is_set():
+            return True
+        # 跳过合并等待，立即发送已入队的提醒
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._idle.set()
+                        self._thread = None
+                        return
+                continue
+            items = [first]
+            deadline = time.monotonic() + self.coalesce
+            while not self._wake.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wake.wait(min(remaining, 0.5))
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            subject, body = _digest(items)
+            for sink in self.sinks:
+                self._deliver(sink, subject, body, len(items))
+            with self._lock:
+                if self._queue.empty():
+                    self._wake.clear()
+                    self._idle.set()
+
+    def _deliver(self, sink, subject: str, body: str, count: int) -> bool:
+        started = time.monotonic()
+        for attempt in range(1, self.retries + 1):
+            try:
+                sink.send(subject, body)
+                emit(
+                    "notify",
+                    sink=sink.name,
+                    ok=True,
+                    count=count,
+                    attempt=attempt,
+                    duration_s=round(time.monotonic() - started, 3),
+                )
+                return True
+            except Exception as exc:
+                if attempt >= self.retries:
+                    _log(f"{sink.name} 通道发送失败（已重试 {attempt} 次）：{exc}")
+                    emit("notify", sink=sink.name, ok=False, count=count, attempt=attempt, error=str(exc))
+                    return False
+                delay = self.backoff * (2 ** (attempt - 1))
+                _log(f"{sink.name} 通道发送失败：{exc}，{delay:.0f}s 后重试")
+                time.sleep(delay)
+        return False
+
+
+_notifier: Notifier | None = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier() -> Notifier:
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = Notifier(sinks_from_env())
+            atexit.register(_notifier.flush)
+        return _notifier
+
+
+def notify(subject: str, body: str) -> None:
+    """非阻塞地提交一条提醒。"""
+    get_notifier().notify(subject, body)
+
+
+def flush(timeout: float | None = NOTIFY_FLUSH_SECONDS) -> bool:
+    if _notifier is None:
+        return True
+    return _notifier.flush(timeout)
+
+
+async def _serve_smtp(host: str, port: int) -> None:
+    # 本地 SMTP 替身：只实现投递所需的最少命令，把收到的邮件打印出来，用于联调通知配置
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        def reply(line: str) -> None:
+            writer.write((line + "\r\n").encode("utf-8"))
+
+        reply("220 dt-notify smtp stand-in")
+        await writer.drain()
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                cmd = raw.decode("utf-8", "replace").strip()
+                verb = cmd.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    reply("250-localhost")
+                    reply("250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    reply("235 ok")
+                elif verb == "DATA":
+                    reply("354 end with .")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        line = await reader.readline()
+                        if not line or line in {b".\r\n", b".\n"}:
+                            break
+                        lines.append(line.decode("utf-8", "replace").rstrip("\r\n"))
+                    print(f"----- {datetime.now():%H:%M:%S} 收到邮件 -----")
+                    print("\n".join(lines))
+                    reply("250 queued")
+                elif verb == "QUIT":
+                    reply("221 bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("250 ok")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"[INFO] SMTP 替身已启动：{host}:{port}（DT_SMTP_HOST={host} DT_SMTP_PORT={port} DT_SMTP_SSL=0）")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from login import load_local_secrets
+
+    parser = argparse.ArgumentParser(description="提醒通知：发送测试提醒 / 启动本地 SMTP 替身")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_test = sub.add_parser("test", help="按当前配置发送一条测试提醒")
+    p_test.add_argument("--subject", default="测试提醒")
+    p_test.add_argument("--body", default="这是一条测试提醒。")
+    p_smtp = sub.add_parser("smtp-server", help="启动本地 SMTP 替身，打印收到的邮件")
+    p_smtp.add_argument("--host", default="127.0.0.1")
+    p_smtp.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "smtp-server":
+        try:
+            asyncio.run(_serve_smtp(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    load_local_secrets()
+    notify(args.subject, args.body)
+    return 0 if flush() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+
+import metrics
+from events import emit
+
+# 播放效率 = 实测倍速（currentTime 前进秒数 / 墙钟秒数）/ 目标倍速。
+# 后台被 Chrome 限流的标签仍在前进（不会触发“60s 未变化”），但可能只有 0.3x，按窗口检测出来单独处理
+DEFAULT_EFFICIENCY_WINDOW = float(os.getenv("DT_EFFICIENCY_WINDOW_SECONDS", "120"))
+# 窗口效率低于该值判为偏慢（默认 0.6：目标 2x 时低于 1.2x）
+DEFAULT_EFFICIENCY_THRESHOLD = float(os.getenv("DT_EFFICIENCY_THRESHOLD", "0.6"))
+# 连续偏慢的窗口数：未达到时只做轻量处理（切到前台、恢复倍速与播放），达到后换新标签重新播放
+DEFAULT_EFFICIENCY_STRIKES = int(os.getenv("DT_EFFICIENCY_STRIKES", "2"))
+
+
+def _log(msg: str) -> None:
+    print(f"[EFFICIENCY] {msg}")
+
+
+class PlaybackMonitor:
+    """
+    单个播放标签的效率窗口：观看循环每次读数后 add(前进的视频秒数, 经过的墙钟秒数)，
+    凑满 window_seconds 墙钟后给出判定：ok / slow（轻量处理）/ recover（换新标签）。
+    定时刷新、恢复动作本身的耗时用 exclude() 扣除，不算在标签头上；完全没有前进交给卡住检测处理。
+    sink（有 add(video_s, wall_s) 的累计器）收到同一份未扣除的读数，进程累计与效率窗口出自同一个计量点。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        intended_rate: float,
+        *,
+        window_seconds: float = DEFAULT_EFFICIENCY_WINDOW,
+        threshold: float = DEFAULT_EFFICIENCY_THRESHOLD,
+        strikes: int = DEFAULT_EFFICIENCY_STRIKES,
+        sink=None,
+    ) -> None:
+        self.url = url
+        self.sink = sink
+        self.intended_rate = intended_rate
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.strikes = max(1, strikes)
+        self.efficiency: float | None = None
+        self.low_windows = 0
+        self._video_s = 0.0
+        self._wall_s = 0.0
+        self._excluded_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.threshold > 0
+
+    def reset(self) -> None:
+        """丢弃当前窗口（新标签重试、接近结尾等不宜评估的阶段）。"""
+        self._video_s = 0.0
+        self._wall_s = 0.0
+        self._excluded_s = 0.0
+
+    def accept(self, rate: float | None = None) -> None:
+        """接受偏慢：给出 rate（播放器实际接受的倍速）时按该倍速继续评估，否则本标签不再评估（读数仍计入 sink）。"""
+        if rate:
+            self.intended_rate = rate
+        else:
+            self.window_seconds = 0
+        self.low_windows = 0
+        self.reset()
+
+    def exclude(self, seconds: float) -> None:
+        self._excluded_s += max(0.0, seconds)
+
+    def add(self, video_s: float, wall_s: float, *, evaluate: bool = True) -> str | None:
+        """记一次读数；evaluate=False 时只计入 sink 并丢弃当前窗口（如最后一个窗口内，结尾停在最后一秒会拉低效率）。"""
+        if self.sink is not None:
+            self.sink.add(video_s, wall_s)
+        if not evaluate:
+            self.reset()
+            return None
+        if not self.enabled:
+            return None
+        excluded = min(self._excluded_s, max(0.0, wall_s))
+        self._excluded_s -= excluded
+        self._video_s += max(0.0, video_s)
+        self._wall_s += max(0.0, wall_s - excluded)
+        if self._wall_s < self.window_seconds:
+            return None
+        video_s, wall_s = self._video_s, self._wall_s
+        self.reset()
+        if video_s <= 0:
+            # 整个窗口没有前进：由卡住检测（新标签重试/跳过）处理
+            return None
+        rate = video_s / wall_s
+        self.efficiency = rate / self.intended_rate
+        metrics.PLAYBACK_EFFICIENCY.set(self.efficiency)
+        metrics.PLAYBACK_EFFICIENCY_WINDOWS.observe(self.efficiency)
+        if self.efficiency >= self.threshold:
+            self.low_windows = 0
+            verdict = "ok"
+        else:
+            self.low_windows += 1
+            verdict = "recover" if self.low_windows >= self.strikes else "slow"
+            if verdict == "recover":
+                self.low_windows = 0
+        _log(
+            f"播放效率 {self.efficiency:.2f}（实测 {rate:.2f}x / 目标 {self.intended_rate:g}x，"
+            f"{wall_s:.0f}s 窗口）" + ("" if verdict == "ok" else f"，低于 {self.threshold:g}：{verdict}")
+        )
+        emit(
+            "efficiency",
+            url=self.url,
+            efficiency=round(self.efficiency, 4),
+            rate=round(rate, 4),
+            intended=self.intended_rate,
+            video_s=round(video_s, 3),
+            wall_s=round(wall_s, 3),
+            verdict=verdict,
+        )
+        return verdict
@@ -0,0 +1,180 @@
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from playwright.async_api import (
+    BrowserContext,
+    ElementHandle,
+    Frame,
+    Locator,
+    Page,
+    TimeoutError as PlaywrightTimeoutError,
+)
+
+# Playwright 调用剖析：开启后包装 Page/Locator 等的异步方法，按调用点统计次数、耗时、超时，
+# 退出时打印汇总并写出 flamegraph.pl 可用的折叠栈文件
+PROFILE_ENV = "DT_PROFILE_CDP"
+PROFILE_OUTPUT = Path(os.getenv("DT_PROFILE_CDP_OUTPUT", "data/cdp_profile.folded"))
+PROFILE_TOP = int(os.getenv("DT_PROFILE_CDP_TOP", "30"))
+
+_ROOT = Path(__file__).resolve().parent
+_SKIP_FILES = {str(Path(__file__).resolve())}
+_PATCHED_CLASSES = (Page, Frame, Locator, ElementHandle, BrowserContext)
+# 只剖析与页面交互相关的方法；事件注册、属性读取等同步方法不包装
+_SKIP_METHODS = {"expect_event", "expect_console_message", "expect_download", "expect_file_chooser", "expect_popup"}
+
+_lock = threading.Lock()
+# 调用点 -> [次数, 总耗时, 最大耗时, 超时次数, 异常次数]
+_sites: dict[tuple[str, str], list] = {}
+# 折叠栈 -> 总耗时（秒）
+_stacks: dict[str, float] = {}
+_enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _describe_target(obj, args) -> str:
+    # 选择器是定位慢等待的关键：Locator 取自身选择器，其余取第一个字符串参数（选择器/URL/脚本）
+    sel = None
+    if isinstance(obj, Locator):
+        try:
+            sel = obj._impl_obj._selector
+        except Exception:
+            sel = None
+    if sel is None and args and isinstance(args[0], str):
+        sel = args[0]
+    if not sel:
+        return ""
+    sel = " ".join(str(sel).split())
+    return sel if len(sel) <= 60 else sel[:57] + "..."
+
+
+@functools.lru_cache(maxsize=None)
+def _repo_module(filename: str) -> str | None:
+    # 只保留本仓库模块的栈帧；返回模块名，非本仓库返回 None
+    if filename in _SKIP_FILES:
+        return None
+    try:
+        path = Path(filename).resolve()
+    except Exception:
+        return None
+    return path.stem if path.parent == _ROOT else None
+
+
+def _repo_stack(frame) -> tuple[str, list[str]]:
+    site = "?"
+    stack: list[str] = []
+    while frame is not None:
+        module = _repo_module(frame.f_code.co_filename)
+        if module is not None:
+            if site == "?":
+                site = f"{module}:{frame.f_lineno} {frame.f_code.co_name}"
+            stack.append(f"{module}.{frame.f_code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return site, stack
+
+
+def _record(site: str, call: str, stack: list[str], elapsed: float, timeout: bool, error: bool) -> None:
+    key = (site, call)
+    folded = ";".join(stack + [call]) if stack else call
+    with _lock:
+        entry = _sites.setdefault(key, [0, 0.0, 0.0, 0, 0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[3] += int(timeout)
+        entry[4] += int(error)
+        _stacks[folded] = _stacks.get(folded, 0.0) + elapsed
+
+
+def _wrap(cls_name: str, name: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        site, stack = _repo_stack(sys._getframe(1))
+        target = _describe_target(self, args)
+        call = f"{cls_name}.{name}({target})" if target else f"{cls_name}.{name}"
+        started = time.perf_counter()
+        timeout = error = False
+        try:
+            return await fn(self, *args, **kwargs)
+        except PlaywrightTimeoutError:
+            timeout = True
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            _record(site, call, stack, time.perf_counter() - started, timeout, error)
+
+    wrapper.__dt_profiled__ = True
+    return wrapper
+
+
+def enable() -> None:
+    global _enabled
+    if _enabled:
+        return
+    for cls in _PATCHED_CLASSES:
+        for name, fn in list(vars(cls).items()):
+            if name.startswith("_") or name in _SKIP_METHODS:
+                continue
+            if not inspect.iscoroutinefunction(fn) or getattr(fn, "__dt_profiled__", False):
+                continue
+            setattr(cls, name, _wrap(cls.__name__, name, fn))
+    _enabled = True
+    atexit.register(dump)
+    print(f"[INFO] 已开启 Playwright 调用剖析，退出时输出汇总与折叠栈：{PROFILE_OUTPUT}")
+
+
+def enable_from_env(flag: bool = False) -> None:
+    if flag or os.getenv(PROFILE_ENV, "") in {"1", "true", "yes"}:
+        enable()
+
+
+def dump() -> None:
+    with _lock:
+        sites = sorted(_sites.items(), key=lambda kv: kv[1][1], reverse=True)
+        stacks = dict(_stacks)
+    if not sites:
+        return
+    total = sum(v[1] for _, v in sites) or 1.0
+    print(f"\n===== Playwright 调用剖析（按总耗时排序，前 {PROFILE_TOP} 项）=====")
+    print(f"{'总耗时s':>9} {'占比':>6} {'次数':>6} {'均值ms':>8} {'最大ms':>8} {'超时':>4} {'异常':>4}  调用点 / 调用")
+    for (site, call), (count, spent, worst, timeouts, errors) in sites[:PROFILE_TOP]:
+        print(
+            f"{spent:9.2f} {spent / total * 100:5.1f}% {count:6d} {spent / count * 1000:8.1f} {worst * 1000:8.1f}"
+            f" {timeouts:4d} {errors:4d}  {site} / {call}"
+        )
+    try:
+        PROFILE_OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+        with PROFILE_OUTPUT.open("w", encoding="utf-8") as f:
+            for stack, spent in sorted(stacks.items()):
+                # flamegraph.pl 要求整数样本值：以毫秒计
+                f.write(f"{stack.replace(' ', '_')} {max(1, int(spent * 1000))}\n")
+        print(f"[INFO] 折叠栈已写入：{PROFILE_OUTPUT}（flamegraph.pl {PROFILE_OUTPUT} > cdp.svg）")
+    except Exception as exc:
+        print(f"[WARN] 写入折叠栈失败：{exc}")
+    # 机器可读汇总（mock_site.py bench 用来统计往返次数）
+    try:
+        summary = {
+            "calls": sum(v[0] for _, v in sites),
+            "seconds": round(sum(v[1] for _, v in sites), 3),
+            "timeouts": sum(v[3] for _, v in sites),
+            "errors": sum(v[4] for _, v in sites),
+            "sites": [
+                {"site": site, "call": call, "count": c, "seconds": round(t, 4), "max_s": round(m, 4)}
+                for (site, call), (c, t, m, _, _) in sites
+            ],
+        }
+        PROFILE_OUTPUT.with_suffix(".json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    except Exception as exc:
+        print(f"[WARN] 写入剖析汇总失败：{exc}")
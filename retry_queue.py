@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# 看不下去（跳过）的课程的重试队列：按失败原因退避，反复因课程本身问题失败的课程隔离，不再占用观看时间
+DEFAULT_RETRY_QUEUE = Path(os.getenv("DT_RETRY_QUEUE", "data/retry_queue.sqlite3"))
+# 第 n 次失败后等待 BACKOFF × 2^(n-1) 秒再重试，封顶 BACKOFF_MAX
+RETRY_BACKOFF_SECONDS = float(os.getenv("DT_RETRY_BACKOFF_SECONDS", "600"))
+RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("DT_RETRY_BACKOFF_MAX_SECONDS", "86400"))
+# 课程本身的失败（如媒体加载失败）累计达到该次数即隔离；任意原因累计达到 MAX_FAILURES 也隔离
+QUARANTINE_AFTER = int(os.getenv("DT_RETRY_QUARANTINE_AFTER", "3"))
+MAX_FAILURES = int(os.getenv("DT_RETRY_MAX_FAILURES", "8"))
+
+# 失败原因 → 是否属于课程本身的问题（计入隔离）。login 与课程无关，不退避、不计数
+CAUSES = {
+    "media_error": True,
+    "stall": False,
+    "slow": False,
+    "navigation": False,
+    "login": False,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS failures (
+    course_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    cause TEXT NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    permanent INTEGER NOT NULL DEFAULT 0,
+    causes TEXT NOT NULL DEFAULT '{}',
+    first_failed_at REAL,
+    last_failed_at REAL,
+    next_retry_at REAL,
+    quarantined INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _log(msg: str) -> None:
+    print(f"[RETRY] {msg}")
+
+
+def backoff_seconds(failures: int) -> float:
+    if failures <= 0:
+        return 0.0
+    return min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2.0 ** (failures - 1))
+
+
+class RetryQueue:
+    """
+    按 courseId 记录失败课程（sqlite，WAL，多个 worker 进程可共用）。
+    建队时 state() 为 backoff / quarantined 的课程暂不看；课程看完（或判定看完）后 record_success 清除记录。
+    """
+
+    def __init__(self, path: Path = DEFAULT_RETRY_QUEUE) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _row(self, course_id: str) -> dict | None:
+        cur = self._conn.execute("SELECT * FROM failures WHERE course_id = ?", (course_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cur.description], row))
+
+    def record_failure(self, course_id: str, url: str, cause: str) -> dict:
+        """记录一次失败，返回更新后的记录（含 next_retry_at 与 quarantined）。"""
+        permanent = CAUSES.get(cause, False)
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            entry = self._row(course_id) or {
+                "course_id": course_id,
+                "failures": 0,
+                "permanent": 0,
+                "causes": "{}",
+                "first_failed_at": now,
+                "quarantined": 0,
+            }
+            causes = json.loads(entry["causes"] or "{}")
+            causes[cause] = causes.get(cause, 0) + 1
+            if cause != "login":
+                entry["failures"] += 1
+            if permanent:
+                entry["permanent"] += 1
+            entry.update(url=url, cause=cause, causes=json.dumps(causes, sort_keys=True), last_failed_at=now)
+            entry["next_retry_at"] = now + (0.0 if cause == "login" else backoff_seconds(entry["failures"]))
+            if entry["permanent"] >= QUARANTINE_AFTER or entry["failures"] >= MAX_FAILURES:
+                entry["quarantined"] = 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failures (course_id, url, cause, failures, permanent, causes, first_failed_at, "
+                "last_failed_at, next_retry_at, quarantined) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    course_id,
+                    url,
+                    cause,
+                    entry["failures"],
+                    entry["permanent"],
+                    entry["causes"],
+                    entry["first_failed_at"],
+                    now,
+                    entry["next_retry_at"],
+                    entry["quarantined"],
+                ),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return entry
+
+    def record_success(self, course_id: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM failures WHERE course_id = ?", (course_id,))
+
+    def record(self, course_id: str, url: str, status: str, cause: str | None) -> dict | None:
+        """按课程结果更新：看完（completed / skipped_force）清除记录，跳过按原因记一次失败；返回失败记录或 None。"""
+        if status in {"completed", "skipped_force"}:
+            self.record_success(course_id)
+            return None
+        if status != "skipped" or not cause:
+            return None
+        return self.record_failure(course_id, url, cause)
+
+    def state(self, course_id: str, now: float | None = None) -> str:
+        """ready（没有失败记录或已到重试时间）/ backoff（退避中）/ quarantined（已隔离）。"""
+        row = self._conn.execute(
+            "SELECT next_retry_at, quarantined FROM failures WHERE course_id = ?", (course_id,)
+        ).fetchone()
+        if row is None:
+            return "ready"
+        next_retry_at, quarantined = row
+        if quarantined:
+            return "quarantined"
+        if next_retry_at is not None and next_retry_at > (time.time() if now is None else now):
+            return "backoff"
+        return "ready"
+
+    def due(self, course_id: str, now: float | None = None) -> bool:
+        """有失败记录、未隔离且已到重试时间（用于本轮内把退避结束的课程重新入队）。"""
+        row = self._conn.execute(
+            "SELECT next_retry_at, quarantined FROM failures WHERE course_id = ?", (course_id,)
+        ).fetchone()
+        if row is None or row[1]:
+            return False
+        return (row[0] or 0) <= (time.time() if now is None else now)
+
+    def entries(self) -> list[dict]:
+        cur = self._conn.execute("SELECT * FROM failures ORDER BY quarantined DESC, next_retry_at")
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def release(self, course_id: str | None = None) -> int:
+        """解除隔离并清除失败记录（course_id 为 None 时清除全部）。"""
+        with self._conn:
+            if course_id is None:
+                cur = self._conn.execute("DELETE FROM failures")
+            else:
+                cur = self._conn.execute("DELETE FROM failures WHERE course_id = ?", (course_id,))
+        return cur.rowcount
+
+
+def partition(items, queue: RetryQueue | None, course_id) -> tuple[list, list, list]:
+    """把 [(line_no, url)] 分成 (可看, 退避中, 已隔离)。"""
+    if queue is None:
+        return list(items), [], []
+    ready, waiting, quarantined = [], [], []
+    now = time.time()
+    for item in items:
+        state = queue.state(course_id(item[1]), now)
+        if state == "quarantined":
+            quarantined.append(item)
+        elif state == "backoff":
+            waiting.append(item)
+        else:
+            ready.append(item)
+    return ready, waiting, quarantined
+
+
+def _fmt_ts(ts: float | None) -> str:
+    return time.strftime("%m-%d %H:%M", time.localtime(ts)) if ts else "-"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="查看/清理跳过课程的重试队列")
+    parser.add_argument("--queue", default=str(DEFAULT_RETRY_QUEUE), help=f"重试队列（sqlite，默认 {DEFAULT_RETRY_QUEUE}）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_list = sub.add_parser("list", help="列出失败课程")
+    p_list.add_argument("--json", action="store_true", help="输出 JSON")
+    p_release = sub.add_parser("release", help="解除隔离并清除失败记录")
+    p_release.add_argument("course_id", nargs="?", default=None, help="courseId（省略时清除全部）")
+    args = parser.parse_args(argv)
+
+    queue = RetryQueue(Path(args.queue))
+    try:
+        if args.cmd == "release":
+            n = queue.release(args.course_id)
+            _log(f"已清除 {n} 条记录")
+            return 0
+        entries = queue.entries()
+        if args.json:
+            print(json.dumps(entries, ensure_ascii=False, indent=2))
+            return 0
+        if not entries:
+            _log("没有失败课程")
+            return 0
+        now = time.time()
+        for e in entries:
+            if e["quarantined"]:
+                state = "隔离"
+            elif (e["next_retry_at"] or 0) > now:
+                state = f"退避至 {_fmt_ts(e['next_retry_at'])}"
+            else:
+                state = "待重试"
+            print(f"{e['course_id']}\t{state}\t失败 {e['failures']} 次 {e['causes']}\t最近 {_fmt_ts(e['last_failed_at'])}\t{e['url']}")
+        return 0
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
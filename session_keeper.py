@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import metrics
+from events import emit
+from login import (
+    PW_TIMEOUT_MS,
+    ensure_logged_in,
+    mark_session_verified,
+    _probe_session,
+    _save_storage_state,
+)
+
+# 后台保活：每隔多少秒探测一次登录态（0 表示关闭）
+DEFAULT_KEEPALIVE_INTERVAL = int(os.getenv("DT_KEEPALIVE_INTERVAL", "300"))
+# cookie 距过期不足该秒数时提前在独立 context 中重新登录
+DEFAULT_RELOGIN_BEFORE = int(os.getenv("DT_RELOGIN_BEFORE_SECONDS", "1800"))
+
+
+def _log(msg: str) -> None:
+    print(f"[SESSION] {msg}")
+
+
+def _earliest_expiry(cookies: list[dict]) -> float | None:
+    expiries = [
+        float(c.get("expires") or -1)
+        for c in cookies
+        if "dtdjzx.gov.cn" in str(c.get("domain") or "") and float(c.get("expires") or -1) > 0
+    ]
+    return min(expiries) if expiries else None
+
+
+class SessionKeeper:
+    """
+    后台会话保活：定时用 HTTP 请求探测登录态并原子写回 storage_state.json；
+    登录失效或 cookie 临近过期时，在独立 context 中重新登录，再把新 cookie 注入播放用的 context，
+    播放标签无需等待登录。
+    """
+
+    def __init__(
+        self,
+        browser,
+        context,
+        state_file: Path,
+        username: str,
+        password: str,
+        *,
+        interval: int = DEFAULT_KEEPALIVE_INTERVAL,
+        relogin_before: int = DEFAULT_RELOGIN_BEFORE,
+    ) -> None:
+        self.browser = browser
+        self.context = context
+        self.state_file = state_file
+        self.username = username
+        self.password = password
+        self.interval = interval
+        self.relogin_before = relogin_before
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._relogin_task: asyncio.Task | None = None
+        self._last_ok = 0.0
+        # 最近一次重新登录的结果（None 表示还没有重新登录过）
+        self.last_relogin_ok: bool | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        _log(f"已启动会话保活（每 {self.interval}s 探测一次）")
+
+    async def stop(self) -> None:
+        for task in (self._task, self._relogin_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._relogin_task = None
+
+    @property
+    def relogging(self) -> bool:
+        return self._relogin_task is not None and not self._relogin_task.done()
+
+    def request_relogin(self) -> asyncio.Task:
+        """在后台发起重新登录并立即返回；已有进行中的重新登录时复用它。播放标签不必等待。"""
+        if not self.relogging:
+            self._relogin_task = asyncio.create_task(self.relogin())
+        return self._relogin_task
+
+    async def wait_relogin(self, timeout: float | None = None) -> bool:
+        """等待后台重新登录结束；没有进行中的重新登录时直接探测一次。"""
+        task = self._relogin_task
+        if task is None:
+            return await _probe_session(self.context)
+        try:
+            return bool(await asyncio.wait_for(asyncio.shield(task), timeout))
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                _log(f"保活检查异常：{exc}")
+
+    async def check(self) -> bool:
+        if not await _probe_session(self.context):
+            _log("探测到登录态失效，后台重新登录")
+            return await self.relogin()
+        self._last_ok = time.monotonic()
+        try:
+            await _save_storage_state(self.context, self.state_file)
+            mark_session_verified(self.state_file)
+        except Exception as exc:
+            _log(f"保存登录态失败：{exc}")
+        expire_at = _earliest_expiry(await self.context.cookies())
+        if expire_at is not None and expire_at - time.time() < self.relogin_before:
+            _log(f"cookie 将在 {int(expire_at - time.time())}s 后过期，提前重新登录")
+            return await self.relogin()
+        return True
+
+    async def relogin(self) -> bool:
+        ok = await self._relogin()
+        self.last_relogin_ok = ok
+        return ok
+
+    async def _relogin(self) -> bool:
+        started = time.monotonic()
+        async with self._lock:
+            # 等锁期间其他调用方已完成重新登录
+            if self._last_ok > started and await _probe_session(self.context):
+                return True
+            metrics.RECOVERY_ACTIONS.inc(level="relogin")
+            login_ctx = None
+            try:
+                login_ctx = await self.browser.new_context()
+                login_ctx.set_default_timeout(PW_TIMEOUT_MS)
+                page = await login_ctx.new_page()
+                await ensure_logged_in(page, username=self.username, password=self.password, open_only=False)
+                cookies = await login_ctx.cookies()
+                await self.context.add_cookies(cookies)
+            except (Exception, SystemExit) as exc:
+                _log(f"后台重新登录失败：{exc}")
+                emit("relogin", ok=False, duration_s=round(time.monotonic() - started, 3), error=str(exc))
+                return False
+            finally:
+                if login_ctx is not None:
+                    try:
+                        await login_ctx.close()
+                    except Exception:
+                        pass
+            if not await _probe_session(self.context):
+                _log("重新登录后探测仍失败")
+                emit("relogin", ok=False, duration_s=round(time.monotonic() - started, 3), error="probe")
+                return False
+            self._last_ok = time.monotonic()
+            try:
+                await _save_storage_state(self.context, self.state_file, force=True)
+                mark_session_verified(self.state_file)
+            except Exception as exc:
+                _log(f"保存登录态失败：{exc}")
+            _log(f"后台重新登录成功（耗时 {time.monotonic() - started:.1f}s）")
+            emit("relogin", ok=True, duration_s=round(time.monotonic() - started, 3))
+            return True
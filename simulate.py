@@ -0,0 +1,409 @@
+import argparse
+import itertools
+import json
+import random
+import statistics
+import sys
+from pathlib import Path
+
+from events import EVENT_LOG_FILE, _iter_events, _log_files
+from watch import (
+    DEFAULT_REFRESH_INTERVAL,
+    NOMINAL_PLAYBACK_RATE,
+    POLL_MIN_SECONDS,
+    STALL_MISSES,
+    STALL_RETRIES,
+    STALL_SECONDS,
+    _completion_threshold,
+    _estimate_playback_rate,
+    _next_poll_delay,
+    _stall_action,
+)
+
+# 离线回放：把每门课的时间线（视频时长、卡住位置与需要几次恢复、媒体错误、各类操作耗时）
+# 按 watch.py 同一套轮询/卡住判定/定时刷新逻辑在虚拟时间里跑一遍，比较不同参数下的 学时/墙钟小时。
+#
+# 课程时间线（JSONL 每行一门）：
+#   {"url": ..., "video_s": 1800, "start_s": 0, "hours": 0.67,
+#    "stalls": [{"at": 600, "attempts": 1}], "media_error_at": null, "nav_error": false}
+# stalls[].attempts 为恢复所需的重新加载次数（新标签重试或定时刷新各算一次），null 表示怎么重试都不会恢复。
+
+# 没有记录时使用的操作耗时（秒）
+DEFAULT_COSTS = {"load_s": 5.0, "recovery_s": 8.0, "refresh_s": 6.0, "transition_s": 3.0}
+# 课程没有学时记录时，按 视频秒数 × 该系数 估算（45 分钟一学时）
+DEFAULT_HOURS_PER_VIDEO_SECOND = 1 / 2700
+
+
+def _log(msg: str) -> None:
+    print(f"[SIM] {msg}")
+
+
+def _median(values, default: float) -> float:
+    values = [float(v) for v in values if isinstance(v, (int, float)) and v >= 0]
+    return round(statistics.median(values), 3) if values else default
+
+
+def traces_from_events(events) -> tuple[list[dict], dict]:
+    """从事件日志重建每门课的时间线，并取各类操作耗时的中位数。返回 (traces, costs)。"""
+    open_courses: dict[tuple, dict] = {}
+    traces: list[dict] = []
+    recovery, refresh, overhead = [], [], []
+    for ev in events:
+        kind = ev.get("event")
+        key = (ev.get("run"), ev.get("pid"), ev.get("url"))
+        if kind == "course_start":
+            open_courses[key] = {"url": ev.get("url"), "video_s": None, "start_s": 0, "stalls": [], "media_error_at": None}
+            continue
+        course = open_courses.get(key)
+        if kind == "recovery" and ev.get("ok"):
+            recovery.append(ev.get("duration_s"))
+        elif kind == "refresh" and ev.get("kind") == "course_periodic":
+            refresh.append(ev.get("duration_s"))
+        if course is None:
+            continue
+        if kind == "video":
+            course["video_s"] = ev.get("duration")
+            course["start_s"] = ev.get("start") or 0
+        elif kind == "stall":
+            at = ev.get("current") or 0
+            stalls = course["stalls"]
+            if stalls and stalls[-1]["at"] == at:
+                stalls[-1]["attempts"] = int(ev.get("attempt") or 1)
+            else:
+                stalls.append({"at": at, "attempts": int(ev.get("attempt") or 1), "stalled_s": ev.get("stalled_s") or 0})
+        elif kind == "media_error":
+            course["media_error_at"] = ev.get("current") or course["start_s"]
+        elif kind == "navigation_error":
+            course["nav_error"] = True
+        elif kind == "course_end":
+            open_courses.pop(key, None)
+            if not course["video_s"] and not course.get("nav_error"):
+                continue
+            if ev.get("status") == "skipped" and ev.get("cause") == "stall" and course["stalls"]:
+                # 重试用尽仍卡住：这一处永远不会恢复
+                course["stalls"][-1]["attempts"] = None
+            if isinstance(ev.get("delta"), (int, float)) and ev["delta"] > 0:
+                course["hours"] = round(float(ev["delta"]), 4)
+            if ev.get("status") == "completed" and course["video_s"] and isinstance(ev.get("duration_s"), (int, float)):
+                # 墙钟中扣除播放与卡住时间，剩下的近似为打开/加载开销
+                play = (course["video_s"] - (course["start_s"] or 0)) / NOMINAL_PLAYBACK_RATE
+                stalled = sum(float(s.get("stalled_s") or 0) for s in course["stalls"])
+                overhead.append(max(0.0, float(ev["duration_s"]) - play - stalled))
+            for s in course["stalls"]:
+                s.pop("stalled_s", None)
+            traces.append(course)
+    costs = dict(DEFAULT_COSTS)
+    costs["recovery_s"] = _median(recovery, DEFAULT_COSTS["recovery_s"])
+    costs["refresh_s"] = _median(refresh, DEFAULT_COSTS["refresh_s"])
+    costs["load_s"] = _median(overhead, DEFAULT_COSTS["load_s"])
+    return traces, costs
+
+
+def fit_contention(events) -> tuple[float | None, dict]:
+    """
+    从事件日志拟合 --contention：按 ts 回放 course_start / course_end 得到每个效率窗口（efficiency 事件）
+    发生时所有 worker 同时在看的课程数 K，取各 K 下实测倍速的中位数，按 rate(1) / rate(K) = 1 + c × (K-1)
+    做过原点的最小二乘。没有 K>1 的窗口时无法拟合，返回 (None, 各 K 的中位倍速)。
+    """
+    watching: set[tuple] = set()
+    rates: dict[int, list[float]] = {}
+    for ev in sorted(events, key=lambda e: str(e.get("ts") or "")):
+        kind = ev.get("event")
+        proc = (ev.get("run"), ev.get("pid"))
+        if kind == "course_start":
+            watching.add((*proc, ev.get("url")))
+        elif kind == "course_end":
+            watching.discard((*proc, ev.get("url")))
+        elif kind in {"run_start", "run_end"}:
+            watching = {w for w in watching if w[:2] != proc}
+        elif kind == "efficiency" and isinstance(ev.get("rate"), (int, float)) and ev["rate"] > 0:
+            rates.setdefault(max(1, len(watching)), []).append(float(ev["rate"]))
+    medians = {k: statistics.median(v) for k, v in sorted(rates.items())}
+    base = medians.get(1, NOMINAL_PLAYBACK_RATE)
+    points = [(k - 1, base / r - 1.0) for k, r in medians.items() if k > 1]
+    if not points:
+        return None, medians
+    c = sum(x * y for x, y in points) / sum(x * x for x, _ in points)
+    return round(max(0.0, c), 4), medians
+
+
+def synthetic_traces(n: int, *, seed: int = 0, stall_rate: float = 0.2, media_error_rate: float = 0.02) -> list[dict]:
+    """随机生成课程时间线：时长 15~60 分钟；卡住的课程大多一两次重试即可恢复，少数永远卡住。"""
+    rnd = random.Random(seed)
+    traces = []
+    for i in range(n):
+        video_s = rnd.randint(15, 60) * 60
+        trace = {"url": f"synthetic://course/{i + 1}", "video_s": video_s, "start_s": 0, "stalls": [], "media_error_at": None}
+        if rnd.random() < media_error_rate:
+            trace["media_error_at"] = rnd.randint(0, video_s // 2)
+        elif rnd.random() < stall_rate:
+            attempts = rnd.choices([1, 2, 3, None], weights=[60, 20, 10, 10])[0]
+            trace["stalls"].append({"at": rnd.randint(60, video_s - 60), "attempts": attempts})
+        traces.append(trace)
+    return traces
+
+
+def simulate_course(trace: dict, policy: dict, costs: dict, *, rate: float = NOMINAL_PLAYBACK_RATE) -> dict:
+    """
+    按 _watch_course 的循环在虚拟时间里回放一门课：每次检测读取当前位置，依次处理定时刷新、卡住判定、播完判定，
+    再按 _next_poll_delay 等待。返回 {"wall_s", "status", "cause", "reloads"}。
+    """
+    if trace.get("nav_error"):
+        return {"wall_s": costs["load_s"], "status": "skipped", "cause": "navigation", "reloads": 0}
+    dur = int(trace["video_s"])
+    t = costs["load_s"]
+    pos = float(trace.get("start_s") or 0)
+    pending = sorted((dict(s) for s in trace.get("stalls") or []), key=lambda s: s["at"])
+    media_error_at = trace.get("media_error_at")
+    reloads_on_stall = 0
+    reloads = 0
+    clock = t  # 位置已推进到的时刻
+
+    def advance(to_t: float) -> None:
+        nonlocal pos, clock
+        stop = min(float(pending[0]["at"]), float(dur)) if pending else float(dur)
+        if pos < stop:
+            pos = min(stop, pos + (to_t - clock) * rate)
+        clock = to_t
+
+    def reload(cost: float) -> None:
+        # 重新加载期间不播放；卡住处累计够次数即恢复（网站会从原位置续播）
+        nonlocal t, clock, reloads_on_stall, reloads
+        advance(t)
+        t += cost
+        clock = t
+        reloads += 1
+        if pending and pos >= pending[0]["at"]:
+            reloads_on_stall += 1
+            needed = pending[0]["attempts"]
+            if needed is not None and reloads_on_stall >= needed:
+                pending.pop(0)
+                reloads_on_stall = 0
+
+    last_cur: int | None = None
+    last_progress_t = t
+    last_read_t = t
+    est_rate = NOMINAL_PLAYBACK_RATE
+    attempts = 0
+    refresh_t = t
+    refresh_interval = policy["refresh_interval"]
+    while True:
+        advance(t)
+        if media_error_at is not None and pos >= media_error_at:
+            return {"wall_s": t, "status": "skipped", "cause": "media_error", "reloads": reloads}
+        cur = int(pos)
+        progressing = False
+        if last_cur is None:
+            last_cur, last_progress_t = cur, t
+        elif cur != last_cur:
+            progressing = cur > last_cur
+            if progressing:
+                est_rate = _estimate_playback_rate(est_rate, cur, last_cur, t - last_read_t)
+            last_cur, last_progress_t, attempts = cur, t, 0
+        last_read_t = t
+
+        if refresh_interval > 0 and t - refresh_t >= refresh_interval:
+            reload(costs["refresh_s"])
+            refresh_t = t
+
+        action = _stall_action(
+            t - last_progress_t,
+            0,
+            attempts,
+            stall_seconds=policy["stall_seconds"],
+            stall_misses=STALL_MISSES,
+            retries=policy["retries"],
+        )
+        if action == "skip":
+            return {"wall_s": t, "status": "skipped", "cause": "stall", "reloads": reloads}
+        if action == "retry":
+            attempts += 1
+            reload(costs["recovery_s"])
+            last_progress_t = t
+            last_cur = None
+            refresh_t = t
+
+        if pos >= dur:
+            # 播完即出现 ended / Replay，本次检测即可确认
+            return {"wall_s": t, "status": "completed", "cause": None, "reloads": reloads}
+        if cur >= _completion_threshold(dur):
+            delay = POLL_MIN_SECONDS
+        else:
+            until_refresh = max(0.0, refresh_interval - (t - refresh_t)) if refresh_interval > 0 else None
+            delay, _ = _next_poll_delay(
+                cur, dur, est_rate, progressing=progressing, until_refresh=until_refresh, stall_seconds=policy["stall_seconds"]
+            )
+        t += delay
+
+
+def _remaining_video_s(trace: dict) -> float:
+    return float((trace.get("video_s") or 0) - (trace.get("start_s") or 0))
+
+
+ORDERS = {
+    "file": lambda traces: list(traces),
+    "shortest": lambda traces: sorted(traces, key=_remaining_video_s),
+    "longest": lambda traces: sorted(traces, key=lambda tr: -_remaining_video_s(tr)),
+}
+
+
+def _course_hours(trace: dict, hours_per_video_second: float) -> float:
+    if isinstance(trace.get("hours"), (int, float)):
+        return float(trace["hours"])
+    return _remaining_video_s(trace) * hours_per_video_second
+
+
+def simulate(traces: list[dict], policy: dict, costs: dict, *, contention: float = 0.0, hours_per_video_second: float) -> dict:
+    """多个并行观看槽位按顺序领取课程（谁先空闲谁领取），返回该参数组合的预测吞吐。"""
+    lanes = [0.0] * max(1, policy["concurrency"])
+    # 同时观看时每路的实际倍速按 1 / (1 + contention × (K-1)) 折减
+    rate = NOMINAL_PLAYBACK_RATE / (1.0 + contention * (len(lanes) - 1))
+    hours = 0.0
+    completed = skipped = reloads = 0
+    for trace in ORDERS[policy["order"]](traces):
+        lane = min(range(len(lanes)), key=lanes.__getitem__)
+        result = simulate_course(trace, policy, costs, rate=rate)
+        lanes[lane] += result["wall_s"] + costs["transition_s"]
+        reloads += result["reloads"]
+        if result["status"] == "completed":
+            completed += 1
+            hours += _course_hours(trace, hours_per_video_second)
+        else:
+            skipped += 1
+    wall_h = max(lanes) / 3600.0
+    return {
+        **policy,
+        "wall_h": round(wall_h, 3),
+        "hours": round(hours, 3),
+        "hours_per_wall_hour": round(hours / wall_h, 3) if wall_h > 0 else None,
+        "courses_per_wall_hour": round(completed / wall_h, 2) if wall_h > 0 else None,
+        "completed": completed,
+        "skipped": skipped,
+        "reloads": reloads,
+    }
+
+
+def _float_list(text: str) -> list[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def _load_traces(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="按课程时间线离线回放观看策略，预测 学时/墙钟小时")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--events", default=None, help=f"从事件日志重建时间线（默认 {EVENT_LOG_FILE}，含轮转文件）")
+    src.add_argument("--traces", default=None, help="课程时间线文件（JSONL）")
+    src.add_argument("--synthetic", type=int, default=0, help="随机生成 N 门课程（配合 --seed / --stall-rate / --media-error-rate）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stall-rate", type=float, default=0.2)
+    parser.add_argument("--media-error-rate", type=float, default=0.02)
+    parser.add_argument("--save-traces", default=None, help="把时间线写入 JSONL（可编辑后用 --traces 回放）")
+    parser.add_argument("--refresh-interval", default=str(DEFAULT_REFRESH_INTERVAL), help="定时刷新间隔，逗号分隔多个（0 关闭）")
+    parser.add_argument("--stall-seconds", default=f"{STALL_SECONDS:g}", help="进度多少秒未变化判定卡住，逗号分隔多个")
+    parser.add_argument("--retries", default=str(STALL_RETRIES), help="卡住后新标签重试次数上限，逗号分隔多个")
+    parser.add_argument("--concurrency", default="1", help="同时观看的课程数，逗号分隔多个")
+    parser.add_argument("--order", default="file", help=f"观看顺序：{' / '.join(ORDERS)}，逗号分隔多个")
+    parser.add_argument(
+        "--contention",
+        type=float,
+        default=None,
+        help="同时观看时每多一路，实际倍速折减系数（默认从事件日志拟合；回放时间线/随机课程时比较并行数必须给出）",
+    )
+    parser.add_argument("--hours-per-video-hour", type=float, default=None, help="课程无学时记录时，每视频小时折算学时（默认按已有记录拟合，无记录为 4/3）")
+    parser.add_argument("--top", type=int, default=20, help="按吞吐显示前 N 个组合")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出全部结果")
+    args = parser.parse_args(argv)
+
+    costs = dict(DEFAULT_COSTS)
+    if args.traces:
+        traces = _load_traces(Path(args.traces))
+    elif args.synthetic > 0:
+        traces = synthetic_traces(args.synthetic, seed=args.seed, stall_rate=args.stall_rate, media_error_rate=args.media_error_rate)
+    else:
+        path = Path(args.events) if args.events else EVENT_LOG_FILE
+        events = list(_iter_events(_log_files(path)))
+        traces, costs = traces_from_events(events)
+        if args.contention is None:
+            fitted, medians = fit_contention(events)
+            by_k = "、".join(f"{k} 路 {r:.2f}x" for k, r in medians.items()) or "无效率窗口"
+            if fitted is not None:
+                args.contention = fitted
+                _log(f"按事件日志拟合 contention={fitted:g}（实测倍速中位数：{by_k}）")
+            else:
+                _log(f"事件日志中没有同时观看多门课的效率窗口，无法拟合 contention（{by_k}）")
+    if not traces:
+        raise SystemExit("没有可回放的课程时间线（事件日志中需要有 video 与 course_end 事件；也可用 --synthetic N）")
+    if args.save_traces:
+        Path(args.save_traces).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_traces).write_text("".join(json.dumps(tr, ensure_ascii=False) + "\n" for tr in traces), encoding="utf-8")
+        _log(f"已写入时间线：{args.save_traces}（{len(traces)} 门）")
+
+    if args.hours_per_video_hour is not None:
+        hours_per_video_second = args.hours_per_video_hour / 3600.0
+    else:
+        recorded = [tr for tr in traces if isinstance(tr.get("hours"), (int, float)) and tr["video_s"]]
+        video = sum(_remaining_video_s(tr) for tr in recorded)
+        hours_per_video_second = (
+            sum(tr["hours"] for tr in recorded) / video if video > 0 else DEFAULT_HOURS_PER_VIDEO_SECOND
+        )
+
+    concurrency = _int_list(args.concurrency)
+    if args.contention is None:
+        if max(concurrency, default=1) > 1:
+            # contention=0 时吞吐随并行数线性增长，比较并行数的结果没有意义
+            raise SystemExit("比较多路并行需要 --contention（事件日志中没有多路并行的效率窗口可供拟合）")
+        args.contention = 0.0
+    elif args.contention <= 0 and max(concurrency, default=1) > 1:
+        _log("警告：--contention 0 假设多路并行互不影响，预测吞吐会随并行数线性增长")
+
+    orders = [o.strip() for o in args.order.split(",") if o.strip()]
+    unknown = [o for o in orders if o not in ORDERS]
+    if unknown:
+        raise SystemExit(f"未知的 --order：{unknown}（可选 {', '.join(ORDERS)}）")
+    grid = itertools.product(
+        _int_list(args.refresh_interval),
+        _float_list(args.stall_seconds),
+        _int_list(args.retries),
+        concurrency,
+        orders,
+    )
+    results = []
+    for refresh_interval, stall_seconds, retries, concurrency, order in grid:
+        policy = {
+            "refresh_interval": refresh_interval,
+            "stall_seconds": stall_seconds,
+            "retries": retries,
+            "concurrency": concurrency,
+            "order": order,
+        }
+        results.append(
+            simulate(traces, policy, costs, contention=args.contention, hours_per_video_second=hours_per_video_second)
+        )
+    results.sort(key=lambda r: r["hours_per_wall_hour"] or 0, reverse=True)
+
+    if args.json:
+        print(json.dumps({"courses": len(traces), "costs": costs, "contention": args.contention, "results": results}, ensure_ascii=False, indent=2))
+        return 0
+    _log(
+        f"{len(traces)} 门课程；操作耗时：加载 {costs['load_s']:g}s、新标签恢复 {costs['recovery_s']:g}s、"
+        f"定时刷新 {costs['refresh_s']:g}s、切换 {costs['transition_s']:g}s；contention={args.contention:g}"
+    )
+    print("刷新间隔  卡住判定  重试  并行  顺序      学时/小时  课程/小时  完成  跳过  重新加载  墙钟(h)")
+    for r in results[: args.top]:
+        print(
+            f"{r['refresh_interval']:>8}  {r['stall_seconds']:>8g}  {r['retries']:>4}  {r['concurrency']:>4}  {r['order']:<8}"
+            f"  {r['hours_per_wall_hour'] or 0:>9.3f}  {r['courses_per_wall_hour'] or 0:>9.2f}  {r['completed']:>4}"
+            f"  {r['skipped']:>4}  {r['reloads']:>8}  {r['wall_h']:>7.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from autoscale import Autoscaler, CpuSampler, low_memory
+from course_store import PENDING, CourseStore
+from events import RUN_ID, emit
+from login import cdp_endpoints
+
+# worker 异常退出后最多重启次数（每个 worker 单独计数）
+DEFAULT_MAX_RESTARTS = int(os.getenv("DT_WORKER_MAX_RESTARTS", "10"))
+# 重启退避上限（秒）：1, 2, 4, ... 封顶
+DEFAULT_RESTART_BACKOFF_MAX = float(os.getenv("DT_WORKER_RESTART_BACKOFF_MAX", "60"))
+# 依次错开启动 worker 的间隔（秒）：登录态失效时避免所有 worker 同时走验证码登录
+DEFAULT_START_STAGGER = float(os.getenv("DT_WORKER_START_STAGGER", "5"))
+
+
+def _log(msg: str) -> None:
+    print(f"[SUPERVISOR] {msg}")
+
+
+def strip_option(argv: list[str], name: str) -> list[str]:
+    """从命令行参数中去掉 name 及其取值（支持 --name v 与 --name=v）。"""
+    out: list[str] = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg == name:
+            skip = True
+            continue
+        if arg.startswith(name + "="):
+            continue
+        out.append(arg)
+    return out
+
+
+class _Worker:
+    def __init__(self, worker_id: str) -> None:
+        self.worker_id = worker_id
+        self.proc: subprocess.Popen | None = None
+        self.restarts = 0
+        self.next_start = 0.0
+        self.finished = False
+        # --autoscale：parked 为当前不需要的 worker（未启动）；draining 为已通知看完手头课程后退出
+        self.parked = False
+        self.draining = False
+
+
+class Supervisor:
+    """
+    多进程观看：把 URL 写入共享课程库，启动 K 个 watch.py worker 进程（各自的 Playwright 驱动与 context），
+    worker 从课程库领取课程；异常退出的 worker 释放其领取中的课程并按退避重启。
+    """
+
+    def __init__(
+        self,
+        store: CourseStore,
+        worker_cmd: list[str],
+        workers: int,
+        *,
+        metrics_port: int = 0,
+        max_restarts: int = DEFAULT_MAX_RESTARTS,
+        backoff_max: float = DEFAULT_RESTART_BACKOFF_MAX,
+        start_stagger: float = DEFAULT_START_STAGGER,
+        follow=None,
+        autoscaler: Autoscaler | None = None,
+    ) -> None:
+        self.store = store
+        self.worker_cmd = worker_cmd
+        self.workers = [_Worker(str(i)) for i in range(1, max(1, workers) + 1)]
+        self.metrics_port = metrics_port
+        self.max_restarts = max_restarts
+        self.backoff_max = backoff_max
+        self.start_stagger = start_stagger
+        # --follow：每轮检查 URL 文件，新增课程写入课程库（follow.poll() 返回 [(line_no, url)]）
+        self.follow = follow
+        # --autoscale：按窗口实测吞吐、CPU 与卡住率调整同时运行的 worker 数（workers 为上限）
+        self.autoscaler = autoscaler
+        self._window: tuple[float, float, dict] | None = None
+        self._cpu: CpuSampler | None = None
+        # 第一个窗口含 worker 启动与登录，不参与比较
+        self._skip_window = True
+
+    def _spawn(self, w: _Worker) -> None:
+        cmd = self.worker_cmd + ["--worker-id", w.worker_id, "--course-store", str(self.store.path)]
+        if self.metrics_port > 0:
+            # 每个 worker 各自的指标端点：端口依次递增
+            cmd += ["--metrics-port", str(self.metrics_port + int(w.worker_id) - 1)]
+        # 各 worker 的事件沿用本次运行的 run id，events.py summary 按一次运行统计墙钟与学时
+        env = {**os.environ, "DT_RUN_ID": RUN_ID}
+        endpoints = cdp_endpoints()
+        if len(endpoints) > 1:
+            # 多个 Chrome：按 worker 编号轮换端点顺序，首位即该 worker 的浏览器，其余为断开后的备选
+            k = (int(w.worker_id) - 1) % len(endpoints)
+            env["PLAYWRIGHT_CDP_ENDPOINT"] = ",".join(endpoints[k:] + endpoints[:k])
+            _log(f"worker {w.worker_id} 分配浏览器：{endpoints[k]}")
+        w.proc = subprocess.Popen(cmd, env=env)
+        _log(f"启动 worker {w.worker_id}（pid={w.proc.pid}）")
+        emit("worker_start", worker=w.worker_id, pid=w.proc.pid, restarts=w.restarts)
+
+    def _has_work(self) -> bool:
+        return not self.store.flag("all_done") and self.store.counts().get(PENDING, 0) > 0
+
+    def _reap(self, w: _Worker, now: float) -> None:
+        code = w.proc.poll() if w.proc is not None else None
+        if w.proc is None or code is None:
+            return
+        requeued = self.store.release_worker(w.worker_id)
+        emit("worker_exit", worker=w.worker_id, pid=w.proc.pid, code=code, requeued=requeued)
+        w.proc = None
+        if w.draining:
+            # 自动伸缩减少的 worker：看完手头课程后退出，等需要时再启动
+            self.store.clear_flag(f"drain:{w.worker_id}")
+            w.draining = False
+            w.parked = True
+            w.restarts = 0
+            _log(f"worker {w.worker_id} 已按自动伸缩退出（code={code}）")
+            return
+        if code == 0 and not self._has_work():
+            _log(f"worker {w.worker_id} 已完成")
+            w.finished = True
+            return
+        if not self._has_work():
+            _log(f"worker {w.worker_id} 退出（code={code}），已无待看课程，不再重启")
+            w.finished = True
+            return
+        if w.restarts >= self.max_restarts:
+            _log(f"worker {w.worker_id} 已重启 {w.restarts} 次仍退出（code={code}），放弃")
+            w.finished = True
+            return
+        delay = min(self.backoff_max, 2.0 ** w.restarts)
+        w.restarts += 1
+        w.next_start = now + delay
+        _log(f"worker {w.worker_id} 退出（code={code}），释放 {requeued} 门课程，{delay:.0f}s 后重启")
+
+    def _active(self) -> list[_Worker]:
+        return [w for w in self.workers if not w.finished and not w.parked and not w.draining]
+
+    def _scale_to(self, target: int, now: float) -> None:
+        active = self._active()
+        while len(active) < target:
+            # 优先撤销尚未退出的 draining，其次启动 parked 的 worker
+            w = next((w for w in self.workers if w.draining and not w.finished), None)
+            if w is not None:
+                self.store.clear_flag(f"drain:{w.worker_id}")
+                w.draining = False
+            else:
+                w = next((w for w in self.workers if w.parked and not w.finished), None)
+                if w is None:
+                    break
+                w.parked = False
+                w.next_start = now
+            active.append(w)
+        while len(active) > target:
+            w = active.pop()
+            if w.proc is None:
+                w.parked = True
+                continue
+            # 不打断正在看的课程：worker 领取课程前检查该标记，看完手头的课后正常退出
+            self.store.set_flag(f"drain:{w.worker_id}")
+            w.draining = True
+
+    def _replace_given_up(self, now: float) -> None:
+        """
+        自动伸缩时在跑的 worker 重启次数用尽被放弃、而仍有待看课程：启动 parked 的 worker 补足目标数，
+        否则只剩 parked 的 worker 时主循环直接结束，课程留在队列里。
+        """
+        missing = self.autoscaler.target - len(self._active()) - sum(1 for w in self.workers if w.draining)
+        while missing > 0 and self._has_work():
+            w = next((w for w in self.workers if w.parked and not w.finished), None)
+            if w is None:
+                return
+            w.parked = False
+            w.next_start = now
+            missing -= 1
+            _log(f"有 worker 已放弃且仍有待看课程，启动 worker {w.worker_id} 接替")
+
+    def _autoscale(self, now: float) -> None:
+        if self._window is None:
+            self._window = (now, time.time(), self.store.playback())
+            self._cpu = CpuSampler()
+            return
+        started, started_wall, before = self._window
+        if now - started < self.autoscaler.interval:
+            return
+        after = self.store.playback()
+        cpu = self._cpu.sample()
+        self._window = (now, time.time(), after)
+        video_s = wall_s = 0.0
+        stalls = 0
+        for worker, cur in after.items():
+            prev = before.get(worker, (0.0, 0.0, 0))
+            # worker 重启后累计值从 0 开始
+            delta = [c - p if c >= p else c for c, p in zip(cur, prev)]
+            video_s += delta[0]
+            wall_s += delta[1]
+            stalls += int(delta[2])
+        elapsed = now - started
+        sample = {
+            "workers": len(self._active()),
+            "throughput": video_s / elapsed,
+            "efficiency": video_s / wall_s if wall_s > 0 else None,
+            "stalls_per_hour": stalls / (wall_s / 3600.0) if wall_s > 0 else 0.0,
+            "cpu": cpu,
+            "low_memory": low_memory(),
+            "credited_per_hour": self.store.credited_since(started_wall) * 3600.0 / elapsed,
+        }
+        if wall_s <= 0:
+            _log("自动伸缩：本窗口没有 worker 在播放，不调整")
+            return
+        if self._skip_window or any(w.draining for w in self.workers):
+            # 刚调整过：新 worker 登录、打开课程或旧 worker 仍在看最后一门课，这个窗口不代表新规模
+            self._skip_window = False
+            return
+        current = self.autoscaler.target
+        target, reason = self.autoscaler.decide(sample)
+        cpu_text = f"{cpu:.0%}" if cpu is not None else "未知"
+        efficiency = sample["efficiency"]
+        _log(
+            f"自动伸缩：{sample['workers']} 个 worker，吞吐 {sample['throughput']:.2f} 视频秒/秒，"
+            f"每标签 {efficiency:.2f}x，卡住 {sample['stalls_per_hour']:.1f} 次/标签小时，CPU {cpu_text}，"
+            f"学时 {sample['credited_per_hour']:.2f}/小时 → {target} 个（{reason}）"
+        )
+        emit(
+            "autoscale",
+            workers=sample["workers"],
+            target=target,
+            reason=reason,
+            throughput=round(sample["throughput"], 4),
+            efficiency=round(efficiency, 4),
+            stalls_per_hour=round(sample["stalls_per_hour"], 3),
+            cpu=round(cpu, 3) if cpu is not None else None,
+            low_memory=sample["low_memory"],
+            credited_per_hour=round(sample["credited_per_hour"], 4),
+        )
+        if target != current:
+            self._scale_to(target, now)
+            self._skip_window = True
+
+    def run(self) -> int:
+        _log(f"共 {len(self.workers)} 个 worker，课程库：{self.store.path}，待看 {self.store.counts().get(PENDING, 0)} 门")
+        try:
+            started = time.monotonic()
+            for i, w in enumerate(self.workers):
+                w.next_start = started + i * self.start_stagger
+            if self.autoscaler is not None:
+                for w in self.workers[self.autoscaler.target :]:
+                    w.parked = True
+                _log(f"自动伸缩：从 {self.autoscaler.target} 个 worker 开始（{self.autoscaler.min_workers}～{len(self.workers)}）")
+            while not all(w.finished or w.parked for w in self.workers):
+                now = time.monotonic()
+                if self.follow is not None:
+                    added = self.store.add(self.follow.poll())
+                    if added:
+                        _log(f"URL 文件新增课程：{added} 门")
+                if self.autoscaler is not None:
+                    self._autoscale(now)
+                for w in self.workers:
+                    if w.finished or w.parked:
+                        continue
+                    if w.proc is not None:
+                        self._reap(w, now)
+                    elif now >= w.next_start:
+                        self._spawn(w)
+                if self.autoscaler is not None:
+                    self._replace_given_up(now)
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            _log("收到中断，通知 worker 退出")
+        finally:
+            self._stop_all()
+        counts = self.store.counts()
+        _log("课程状态：" + "，".join(f"{k}={v}" for k, v in sorted(counts.items())))
+        emit("supervisor_end", counts=counts)
+        return 0 if all(w.restarts < self.max_restarts for w in self.workers) else 1
+
+    def _stop_all(self) -> None:
+        live = [w for w in self.workers if w.proc is not None and w.proc.poll() is None]
+        for w in live:
+            try:
+                if os.name == "nt":
+                    w.proc.terminate()
+                else:
+                    w.proc.send_signal(signal.SIGINT)
+            except Exception:
+                pass
+        deadline = time.monotonic() + 30
+        for w in live:
+            try:
+                w.proc.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                w.proc.kill()
+            # 正常停止（中断或全部结束），不是课程导致的退出
+            self.store.release_worker(w.worker_id, count_attempt=False)
+
+
+def run_supervisor(
+    argv: list[str],
+    items: list[tuple[int, str]],
+    url_file: Path,
+    workers: int,
+    *,
+    store_path: Path,
+    metrics_port: int = 0,
+    remove_url=None,
+    follow=None,
+    autoscaler: Autoscaler | None = None,
+) -> int:
+    """watch.py --workers K 的入口：按 URL 文件建队，运行 worker，结束后从 URL 文件删除已看完/判定看完的课程。"""
+    store = CourseStore(store_path)
+    store.reset()
+    added = store.add(items)
+    _log(f"已写入课程库：{added} 门（{url_file}）")
+    cmd = [sys.executable, str(Path(__file__).resolve().parent / "watch.py")]
+    cmd += strip_option(strip_option(strip_option(argv, "--workers"), "--metrics-port"), "--course-store")
+    code = Supervisor(store, cmd, workers, metrics_port=metrics_port, follow=follow, autoscaler=autoscaler).run()
+    if remove_url is not None:
+        # 与单进程一致：看完（worker 按本标签播放到结尾判定）与判定已看完的课程从 URL 文件删除
+        for url in store.urls(("completed", "skipped_force")):
+            remove_url(url_file, url)
+    leftover = store.urls((PENDING, "leased", "failed"))
+    if leftover:
+        _log(f"仍有 {len(leftover)} 门课程未完成（pending/leased/failed），保留在 URL 文件中")
+    store.close()
+    return code
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import time
+
+import metrics
+from events import emit
+
+# 每个 browser context 最多同时打开的标签页数（含个人中心、播放页、预取的下一门课、学时核算页、站点弹出页）
+DEFAULT_MAX_PAGES = int(os.getenv("DT_TAB_POOL_MAX_PAGES", "6"))
+# 归还后保留为 about:blank 以便复用的空闲标签数
+DEFAULT_MAX_IDLE = int(os.getenv("DT_TAB_POOL_MAX_IDLE", "1"))
+# 本 context 各标签 JS 堆合计上限（MB，0 表示不检查）
+DEFAULT_HEAP_LIMIT_MB = int(os.getenv("DT_TAB_HEAP_LIMIT_MB", "1536"))
+# 系统可用内存下限（MB，0 表示不检查；仅在可读取 /proc/meminfo 时生效）
+DEFAULT_MIN_AVAILABLE_MB = int(os.getenv("DT_TAB_MIN_AVAILABLE_MB", "512"))
+# 超过上限时最多等待的秒数：标签数超限则报错，内存超限则告警后放行，避免单任务永久卡住
+DEFAULT_ADMISSION_TIMEOUT = float(os.getenv("DT_TAB_ADMISSION_TIMEOUT", "60"))
+
+
+class TabPoolExhausted(RuntimeError):
+    pass
+
+
+def _log(msg: str) -> None:
+    print(f"[TABS] {msg}")
+
+
+def available_memory_mb() -> float | None:
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+class TabPool:
+    """
+    按 context 管理标签页：限制同时打开的页数，归还的页导航到 about:blank 留作复用，
+    新开页前通过 CDP Performance.getMetrics 汇总各标签 JS 堆并检查系统可用内存，超限时先回收空闲页再等待。
+    """
+
+    def __init__(
+        self,
+        context,
+        *,
+        label: str = "watch",
+        max_pages: int = DEFAULT_MAX_PAGES,
+        max_idle: int = DEFAULT_MAX_IDLE,
+        heap_limit_mb: int = DEFAULT_HEAP_LIMIT_MB,
+        min_available_mb: int = DEFAULT_MIN_AVAILABLE_MB,
+        admission_timeout: float = DEFAULT_ADMISSION_TIMEOUT,
+    ) -> None:
+        self.context = context
+        self.label = label
+        self.max_pages = max(1, max_pages)
+        self.max_idle = max(0, max_idle)
+        self.heap_limit_mb = heap_limit_mb
+        self.min_available_mb = min_available_mb
+        self.admission_timeout = admission_timeout
+        self._idle: list = []
+        self._sessions: dict = {}
+        self._changed = asyncio.Condition()
+        metrics.OPEN_TABS.set_function(lambda: len(self._live_pages()), context=label)
+
+    def _live_pages(self) -> list:
+        return [p for p in self.context.pages if not p.is_closed()]
+
+    def is_idle(self, page) -> bool:
+        return page in self._idle
+
+    async def _page_heap_bytes(self, page) -> float:
+        # 每个标签只开一个 CDP 会话并缓存；标签关闭（含站点/浏览器自行关闭）时分离
+        session = self._sessions.get(page)
+        if session is None:
+            session = await self.context.new_cdp_session(page)
+            self._sessions[page] = session
+            page.once("close", lambda p: asyncio.ensure_future(self._detach(p)))
+            await session.send("Performance.enable")
+        result = await session.send("Performance.getMetrics")
+        for item in result.get("metrics") or []:
+            if item.get("name") == "JSHeapUsedSize":
+                return float(item.get("value") or 0)
+        return 0.0
+
+    async def renderer_heap_mb(self) -> float | None:
+        """本 context 所有标签的 JS 堆合计（MB）；CDP 不可用时返回 None。"""
+        for page in [p for p in self._sessions if p.is_closed()]:
+            await self._detach(page)
+        total = 0.0
+        ok = False
+        for page in self._live_pages():
+            try:
+                total += await self._page_heap_bytes(page)
+                ok = True
+            except Exception:
+                await self._detach(page)
+        if not ok:
+            return None
+        metrics.RENDERER_HEAP.set(total, context=self.label)
+        return total / (1024 * 1024)
+
+    async def memory_pressure(self) -> str | None:
+        """返回内存超限原因；未超限返回 None。"""
+        if self.min_available_mb > 0:
+            avail = available_memory_mb()
+            if avail is not None and avail < self.min_available_mb:
+                return f"系统可用内存 {avail:.0f}MB < {self.min_available_mb}MB"
+        if self.heap_limit_mb > 0:
+            heap = await self.renderer_heap_mb()
+            if heap is not None and heap > self.heap_limit_mb:
+                return f"标签 JS 堆合计 {heap:.0f}MB > {self.heap_limit_mb}MB"
+        return None
+
+    async def _drop_idle(self) -> bool:
+        dropped = False
+        while self._idle:
+            page = self._idle.pop()
+            await self._close(page)
+            dropped = True
+        return dropped
+
+    async def _detach(self, page) -> None:
+        session = self._sessions.pop(page, None)
+        if session is not None:
+            try:
+                await session.detach()
+            except Exception:
+                pass
+
+    async def _close(self, page) -> None:
+        await self._detach(page)
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+    async def acquire(self, reason: str = ""):
+        """取一个可用标签：优先复用空闲页；需要新开时先做标签数与内存准入。"""
+        self._idle = [p for p in self._idle if not p.is_closed()]
+        if self._idle:
+            return self._idle.pop()
+
+        started = time.monotonic()
+        warned = False
+        while True:
+            live = len(self._live_pages())
+            pressure = await self.memory_pressure() if live > 0 else None
+            if pressure and await self._drop_idle():
+                continue
+            if live < self.max_pages and not pressure:
+                break
+            waited = time.monotonic() - started
+            if waited >= self.admission_timeout:
+                if live >= self.max_pages:
+                    emit("tab_admission", context=self.label, reason="max_pages", waited_s=round(waited, 3), ok=False)
+                    raise TabPoolExhausted(f"标签页已达上限 {self.max_pages}，等待 {waited:.0f}s 仍无空位")
+                _log(f"{pressure}，等待 {waited:.0f}s 后仍放行：{reason}")
+                emit("tab_admission", context=self.label, reason="memory", detail=pressure, waited_s=round(waited, 3), ok=True)
+                break
+            if not warned:
+                why = pressure or f"标签页已达上限 {self.max_pages}"
+                _log(f"{why}，等待释放后再打开：{reason}")
+                metrics.TAB_ADMISSION_WAITS.inc(context=self.label, reason="memory" if pressure else "max_pages")
+                warned = True
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=min(5.0, max(0.1, self.admission_timeout - waited)))
+                except asyncio.TimeoutError:
+                    pass
+        return await self.context.new_page()
+
+    async def release(self, page, *, reuse: bool = True) -> None:
+        """归还标签：可复用则导航到 about:blank 留作空闲页，否则关闭（卡死/出错的页不复用）。"""
+        if page is None:
+            return
+        if page in self._idle:
+            return
+        if reuse and not page.is_closed() and len(self._idle) < self.max_idle:
+            try:
+                await page.goto("about:blank", wait_until="domcontentloaded", timeout=5000)
+                self._idle.append(page)
+            except Exception:
+                await self._close(page)
+        else:
+            await self._close(page)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def prune(self, keep: set) -> None:
+        """关闭 keep 与空闲页之外的所有标签（站点弹出页、残留页）。"""
+        for page in list(self.context.pages):
+            if page in keep or page in self._idle:
+                continue
+            await self._close(page)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def close(self) -> None:
+        await self._drop_idle()
+        for page in list(self._sessions):
+            await self._detach(page)
+        metrics.OPEN_TABS.remove(context=self.label)
+        metrics.RENDERER_HEAP.remove(context=self.label)
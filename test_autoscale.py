@@ -0,0 +1,50 @@
+from autoscale import Autoscaler
+
+
+def _scaler(**kw):
+    kw.setdefault("min_workers", 1)
+    kw.setdefault("cpu_high", 0.85)
+    kw.setdefault("max_stalls_per_hour", 2)
+    kw.setdefault("min_gain", 0.5)
+    kw.setdefault("cooldown_windows", 2)
+    return Autoscaler(kw.pop("max_workers", 4), **kw)
+
+
+def _sample(throughput, **kw):
+    return {"throughput": throughput, "stalls_per_hour": 0.0, "cpu": 0.2, "low_memory": False, **kw}
+
+
+def test_probes_up_while_each_worker_pays_off():
+    s = _scaler(max_workers=3)
+    assert s.target == 1
+    assert s.decide(_sample(1.0)) == (2, "probe")
+    assert s.decide(_sample(2.0)) == (3, "probe")
+    assert s.decide(_sample(2.9)) == (3, "steady")
+
+
+def test_reverts_probe_without_gain_and_backs_off_longer_each_time():
+    s = _scaler(max_workers=4, cooldown_windows=1)
+    assert s.decide(_sample(1.0)) == (2, "probe")
+    # 增量 0.2 < 人均 1.0 × 0.5：撤回并冷却 1 个窗口
+    assert s.decide(_sample(1.2)) == (1, "no_gain")
+    assert s.decide(_sample(1.0)) == (1, "cooldown")
+    assert s.decide(_sample(1.0)) == (2, "probe")
+    # 同一处第二次无收益：冷却时间加倍
+    assert s.decide(_sample(1.1)) == (1, "no_gain")
+    assert [s.decide(_sample(1.0))[1] for _ in range(3)] == ["cooldown", "cooldown", "probe"]
+
+
+def test_overload_steps_down_and_holds_at_min():
+    s = _scaler(max_workers=3)
+    s.decide(_sample(1.0))
+    s.decide(_sample(2.0))
+    assert s.target == 3
+    assert s.decide(_sample(2.5, cpu=0.95)) == (2, "overload")
+    assert s.decide(_sample(2.0, stalls_per_hour=5)) == (1, "overload")
+    assert s.decide(_sample(1.0, low_memory=True)) == (1, "overload_at_min")
+    assert s.decide(_sample(1.0)) == (1, "cooldown")
+
+
+def test_unknown_cpu_is_not_overload():
+    s = _scaler(max_workers=2)
+    assert s.decide(_sample(1.0, cpu=None)) == (2, "probe")
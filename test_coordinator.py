@@ -0,0 +1,53 @@
+from course_store import CourseStore
+from coordinator import Coordinator, CoordinatorClient, start_coordinator
+
+
+def _serve(tmp_path, **kw):
+    store = CourseStore(tmp_path / "coord.sqlite3")
+    store.add([(1, "https://a/1"), (2, "https://a/2")])
+    coordinator = Coordinator(store, lease_seconds=60, **kw)
+    server = start_coordinator(coordinator, "127.0.0.1", 0)
+    return store, coordinator, server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_only_known_workers_can_mark_all_done(tmp_path):
+    store, coordinator, server, url = _serve(tmp_path)
+    try:
+        stranger = CoordinatorClient(url, "stranger")
+        stranger.set_flag("all_done")
+        assert store.flag("all_done") is None
+
+        worker = CoordinatorClient(url, "w1")
+        assert worker.claim()[2] == "https://a/1"
+        worker.set_flag("drain:w2")
+        assert store.flag("drain:w2") is None
+        worker.set_flag("all_done")
+        assert store.flag("all_done") == "1"
+        assert worker.claim() is None
+    finally:
+        coordinator.stopped.set()
+        server.shutdown()
+
+
+def test_finish_removes_completed_url_under_lock(tmp_path):
+    removed = []
+
+    def remove_url(path, u):
+        assert coordinator.lock.locked()
+        removed.append(u)
+
+    store, coordinator, server, url = _serve(tmp_path, url_file=tmp_path / "url.txt", remove_url=remove_url)
+    try:
+        worker = CoordinatorClient(url, "w1")
+        course = worker.claim()
+        worker.finish(course[2], "completed")
+        worker.finish(worker.claim()[2], "skipped", cause="stall")
+        assert removed == ["https://a/1"]
+    finally:
+        coordinator.stopped.set()
+        server.shutdown()
+
+
+def test_claim_treats_unreachable_coordinator_as_no_course():
+    client = CoordinatorClient("http://127.0.0.1:9", "w1")
+    assert client.claim(retry_seconds=0) is None
@@ -0,0 +1,97 @@
+import time
+
+from course_store import LEASED, PENDING, CourseStore
+
+
+def _store(tmp_path, **kw):
+    store = CourseStore(tmp_path / "courses.sqlite3", **kw)
+    store.add([(1, "https://a/1"), (2, "https://a/2"), (3, "https://a/3")])
+    return store
+
+
+def test_claim_hands_out_each_course_once_in_order(tmp_path):
+    store = _store(tmp_path)
+    other = CourseStore(tmp_path / "courses.sqlite3")
+    assert store.claim("1") == (1, 1, "https://a/1")
+    assert other.claim("2") == (2, 2, "https://a/2")
+    assert store.claim("1") == (3, 3, "https://a/3")
+    assert other.claim("2") is None
+    assert store.workers() == {"1": 2, "2": 1}
+
+
+def test_claim_stops_when_all_done_flag_is_set(tmp_path):
+    store = _store(tmp_path)
+    store.set_flag("all_done")
+    assert store.claim("1") is None
+
+
+def test_add_ignores_known_urls(tmp_path):
+    store = _store(tmp_path)
+    assert store.add([(4, "https://a/1"), (5, "https://a/5")]) == 1
+
+
+def test_requeue_expired_only_touches_expired_leases(tmp_path):
+    store = _store(tmp_path)
+    store.claim("1", lease_seconds=0.01)
+    store.claim("2", lease_seconds=3600)
+    store.claim("3")
+    time.sleep(0.05)
+    assert store.requeue_expired() == 1
+    assert store.counts() == {PENDING: 1, LEASED: 2}
+    assert store.claim("4") == (1, 1, "https://a/1")
+
+
+def test_requeue_expired_fails_course_after_max_attempts(tmp_path):
+    store = _store(tmp_path, max_attempts=2)
+    for _ in range(2):
+        assert store.claim("1", lease_seconds=0.01)[2] == "https://a/1"
+        time.sleep(0.05)
+        store.requeue_expired()
+    assert "https://a/1" in store.urls(("failed",))
+
+
+def test_release_worker_requeues_only_that_workers_courses(tmp_path):
+    store = _store(tmp_path)
+    store.claim("1")
+    store.claim("2")
+    assert store.release_worker("1") == 1
+    assert store.urls((PENDING,)) == ["https://a/1", "https://a/3"]
+    assert store.workers() == {"2": 1}
+
+
+def test_finish_does_not_overwrite_completed(tmp_path):
+    store = _store(tmp_path)
+    store.claim("1")
+    store.finish("https://a/1", "completed")
+    store.finish("https://a/1", "skipped", cause="stall")
+    assert store.urls(("completed",)) == ["https://a/1"]
+
+
+def test_release_worker_without_counting_an_attempt(tmp_path):
+    store = _store(tmp_path, max_attempts=1)
+    store.claim("1")
+    # 浏览器断开归还：不计次数，max_attempts=1 也不会被标记 failed
+    assert store.release_worker("1", count_attempt=False) == 1
+    assert store.claim("1")[2] == "https://a/1"
+    assert store.release_worker("1") == 0
+    assert store.urls(("failed",)) == ["https://a/1"]
+
+
+def test_credited_since_uses_account_hours_when_reported(tmp_path):
+    store = _store(tmp_path)
+    store.report_account_hours("1", 10.0)
+    start = time.time()
+    time.sleep(0.01)
+    # 共用账号：课程结束时不记差值，入账按账号总数的增长计算
+    store.finish("https://a/1", "completed", None)
+    store.report_account_hours("2", 10.5)
+    store.report_account_hours("1", 11.25)
+    assert store.credited_since(start) == 1.25
+
+
+def test_credited_since_without_account_hours_sums_course_deltas(tmp_path):
+    store = _store(tmp_path)
+    start = time.time()
+    store.finish("https://a/1", "completed", 0.5)
+    store.finish("https://a/2", "completed", 0.25)
+    assert store.credited_since(start) == 0.75
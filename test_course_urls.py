@@ -0,0 +1,56 @@
+import pytest
+
+import course_urls
+
+
+def test_course_id_ignores_extra_parameters_and_decodes():
+    a = "https://x/content#/courseDetail?courseId=abc%20&flag=1"
+    b = "https://x/content#/courseDetail?flag=2&courseId=abc"
+    assert course_urls._course_id(a) == course_urls._course_id(b) == "abc"
+    assert course_urls._course_id(" https://x/plain ") == "https://x/plain"
+
+
+def test_iter_urls_dedups_by_course_id_and_keeps_first_line(tmp_path):
+    f = tmp_path / "url.txt"
+    f.write_text(
+        "\n".join(
+            [
+                "https://x/c?courseId=1&flag=a",
+                "not a url",
+                "",
+                "https://x/c?courseId=2",
+                "https://x/c?courseId=1&flag=b",
+                "https://x/c?courseId=3",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    assert list(course_urls._iter_urls(f, quiet=True)) == [
+        (1, "https://x/c?courseId=1&flag=a"),
+        (4, "https://x/c?courseId=2"),
+        (6, "https://x/c?courseId=3"),
+    ]
+    # 去重只在所选行范围内：第 1 行不在范围内，第 5 行照常返回
+    assert [i for i, _ in course_urls._iter_urls(f, lines_range="4-5", quiet=True)] == [4, 5]
+
+
+def test_parse_shard_accepts_i_of_n():
+    assert course_urls._parse_shard(None) is None
+    assert course_urls._parse_shard(" 2 / 3 ") == (2, 3)
+
+
+def test_parse_shard_rejects_bad_values():
+    for bad in ("0/3", "4/3", "1/0", "a/b", "1-3"):
+        with pytest.raises(SystemExit):
+            course_urls._parse_shard(bad)
+
+
+def test_in_shard_partitions_courses_without_overlap():
+    urls = [f"https://x/content#/courseDetail?courseId=c{i}&from=list" for i in range(60)]
+    owners = [[i for i in (1, 2, 3) if course_urls._in_shard(u, (i, 3))] for u in urls]
+    assert all(len(o) == 1 for o in owners)
+    assert {o[0] for o in owners} == {1, 2, 3}
+    # 同一课程的不同链接形式落在同一分片
+    assert course_urls._in_shard(urls[0], (owners[0][0], 3))
+    assert course_urls._in_shard("https://x/other?courseId=c0", (owners[0][0], 3))
+    assert all(course_urls._in_shard(u, None) for u in urls)
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import events
+
+_T0 = datetime(2026, 1, 1, 10)
+
+
+def _ev(sec, event, run="r1", pid=1, **fields):
+    ts = (_T0 + timedelta(seconds=sec)).isoformat(timespec="milliseconds")
+    return {"ts": ts, "t": sec, "run": run, "pid": pid, "event": event, **fields}
+
+
+def test_summary_counts_account_growth_for_shared_account_runs():
+    evs = [
+        _ev(0, "account_hours", pid=1, hours=10.0),
+        _ev(5, "account_hours", pid=2, hours=10.0),
+        _ev(600, "course_end", pid=1, status="completed", delta=None),
+        _ev(600, "account_hours", pid=1, hours=10.5),
+        _ev(1200, "course_end", pid=2, status="completed", delta=None),
+        _ev(1200, "account_hours", pid=2, hours=11.25),
+    ]
+    total = events.summarize(evs)
+    assert total["runs"] == 1
+    assert total["hours"] == 1.25
+    assert total["courses"] == 2
+
+
+def test_summary_measures_wall_time_across_processes_of_one_run():
+    # 两个进程并行各跑 20 分钟：单调时钟 t 各自从 0 开始，墙钟跨度按 ts 只算一次
+    evs = [
+        _ev(0, "run_start", pid=1),
+        _ev(1200, "run_end", pid=1),
+        {**_ev(0, "run_start", pid=2), "t": 5000},
+        {**_ev(1200, "run_end", pid=2), "t": 6200},
+    ]
+    total = events.summarize(evs)
+    assert total["wall_s"] == 1200
+
+
+def test_summary_still_sums_course_deltas():
+    evs = [_ev(0, "run_start"), _ev(1800, "hours_delta", delta=0.5), _ev(3600, "hours_delta", delta=0.5)]
+    total = events.summarize(evs)
+    assert total["hours"] == 1.0
+    assert total["hours_per_wall_hour"] == 1.0
@@ -0,0 +1,37 @@
+import lite_playback
+
+MASTER = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1280x720
+720p/index.m3u8
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=600000,RESOLUTION=640x360
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1200000,RESOLUTION=854x480
+
+480p/index.m3u8
+"""
+
+
+def test_lowest_variant_playlist_keeps_only_lowest_bandwidth():
+    out = lite_playback.lowest_variant_playlist(MASTER)
+    assert out is not None
+    lines = out.splitlines()
+    assert lines[:2] == ["#EXTM3U", "#EXT-X-VERSION:3"]
+    assert lines[-2:] == ["#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=600000,RESOLUTION=640x360", "360p/index.m3u8"]
+    assert "720p/index.m3u8" not in out and "480p/index.m3u8" not in out
+
+
+def test_lowest_variant_playlist_ignores_media_and_single_variant_playlists():
+    media = "#EXTM3U\n#EXT-X-TARGETDURATION:10\n#EXTINF:10,\nseg0.ts\n#EXT-X-ENDLIST\n"
+    assert lite_playback.lowest_variant_playlist(media) is None
+    single = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=600000\nlow.m3u8\n"
+    assert lite_playback.lowest_variant_playlist(single) is None
+
+
+def test_lowest_variant_playlist_does_not_match_average_bandwidth():
+    text = (
+        "#EXTM3U\n"
+        "#EXT-X-STREAM-INF:AVERAGE-BANDWIDTH=100,BANDWIDTH=900000\nhigh.m3u8\n"
+        "#EXT-X-STREAM-INF:AVERAGE-BANDWIDTH=800000,BANDWIDTH=1000\nlow.m3u8\n"
+    )
+    assert lite_playback.lowest_variant_playlist(text).splitlines()[-1] == "low.m3u8"
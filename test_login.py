@@ -0,0 +1,182 @@
+import login
+
+
+def test_vote_captcha_chars_weights_each_position():
+    text, confs = login._vote_captcha_chars([("AB12", 0.9), ("AB1Z", 0.6), ("XB12", 0.3)])
+    assert text == "AB12"
+    assert len(confs) == 4
+    # 某位置信度 = 胜出字符的得分之和 / 候选数
+    assert abs(confs[1] - (0.9 + 0.6 + 0.3) / 3) < 1e-9
+    assert abs(confs[0] - (0.9 + 0.6) / 3) < 1e-9
+
+
+def test_vote_captcha_chars_without_exact_length_falls_back():
+    text, confs = login._vote_captcha_chars([("AB1", 0.9)])
+    assert confs == []
+    assert text
+
+
+def test_vote_captcha_chars_equal_weights_when_scores_missing():
+    text, confs = login._vote_captcha_chars([("AB12", 0.0), ("AB12", 0.0)])
+    assert text == "AB12"
+    assert confs == [1.0, 1.0, 1.0, 1.0]
+
+
+def _fake_ocr(monkeypatch, results):
+    calls = []
+    monkeypatch.setattr(login, "_ensure_ocr_ready", lambda: None)
+    monkeypatch.setattr(
+        login, "_build_captcha_variants", lambda _: [(tag, login.Image.new("L", (4, 4))) for tag in login.CAPTCHA_VOTE_VARIANTS]
+    )
+
+    def run(_arr):
+        calls.append(1)
+        return results[len(calls) - 1]
+
+    monkeypatch.setattr(login, "_run_ocr_on_array", run)
+    monkeypatch.setattr(login, "_extract_ocr_candidates", lambda r: [r])
+    return calls
+
+
+def test_confident_first_variant_skips_the_rest(monkeypatch):
+    calls = _fake_ocr(monkeypatch, [("AB12", 0.95), ("AB12", 0.9), ("AB12", 0.9)])
+    code, confs = login._ocr_captcha_scored(b"")
+    assert code == "AB12"
+    assert len(calls) == 1
+
+
+def test_low_confidence_runs_extra_variants(monkeypatch):
+    calls = _fake_ocr(monkeypatch, [("AB12", 0.1), ("AB12", 0.3), ("AB12", 0.9)])
+    code, _ = login._ocr_captcha_scored(b"")
+    assert code == "AB12"
+    assert len(calls) == 3
+
+
+def test_wrong_length_runs_extra_variants(monkeypatch):
+    calls = _fake_ocr(monkeypatch, [("AB1", 0.99), ("AB12", 0.9), ("AB12", 0.9)])
+    code, _ = login._ocr_captcha_scored(b"")
+    assert code == "AB12"
+    assert len(calls) >= 2
+
+
+class _Resp:
+    def __init__(self, url, body, ok=True):
+        self.url = url
+        self.ok = ok
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+    async def dispose(self):
+        pass
+
+
+class _Request:
+    def __init__(self, resp):
+        self.resp = resp
+
+    async def get(self, url, timeout=None):
+        return self.resp
+
+
+class _Context:
+    def __init__(self, resp):
+        self.request = _Request(resp)
+
+
+def _probe(resp):
+    import asyncio
+
+    return asyncio.run(login._probe_session(_Context(resp)))
+
+
+def test_probe_session_accepts_member_page_without_marker():
+    assert _probe(_Resp(login.MEMBER_URL, '<h3>会员中心</h3><a href="/content#/personalCenter">个人中心</a>'))
+
+
+def test_probe_session_rejects_client_side_redirect():
+    # 前端脚本跳转登录页：HTTP 200、地址不变
+    assert not _probe(_Resp(login.MEMBER_URL, "<script>location.href='/sso/login?service=member'</script>"))
+    assert not _probe(_Resp(login.MEMBER_URL, '<meta http-equiv="refresh" content="0;url=/sso/login">'))
+
+
+def test_probe_session_rejects_logged_out_page():
+    # .el-popover__reference 未登录时也存在，文本为“用户登录”
+    assert not _probe(_Resp(login.MEMBER_URL, '<span class="el-popover__reference">用户登录</span>'))
+    assert not _probe(_Resp(login.MEMBER_URL, '<input id="validateCode">'))
+    assert not _probe(_Resp(login.LOGIN_URL + "?service=member", "<h3>会员中心</h3>"))
+
+
+def test_probe_session_requires_configured_marker(monkeypatch):
+    monkeypatch.setattr(login, "SESSION_PROBE_MARKER", "张三")
+    assert not _probe(_Resp(login.MEMBER_URL, "<h3>会员中心</h3>"))
+    assert _probe(_Resp(login.MEMBER_URL, '<span class="el-popover__reference">张三</span>'))
+
+
+def _captcha_label(path):
+    return path.stem.rsplit("_", 1)[1]
+
+
+def _trained_templates(tmp_path, monkeypatch):
+    import mock_site
+
+    corpus = tmp_path / "train"
+    mock_site.write_captcha_corpus(corpus, 150, seed=1)
+    out = tmp_path / "templates.npz"
+    assert login.train_captcha_templates(corpus, out) == 150
+    monkeypatch.setattr(login, "CAPTCHA_TEMPLATES_FILE", out)
+    monkeypatch.setattr(login, "_captcha_templates", None)
+
+
+def test_template_backend_recognizes_held_out_mock_corpus(tmp_path, monkeypatch):
+    import mock_site
+
+    _trained_templates(tmp_path, monkeypatch)
+    held_out = tmp_path / "test"
+    mock_site.write_captcha_corpus(held_out, 60, seed=2)
+    samples = sorted(held_out.glob("*.png"))
+    correct = 0
+    for path in samples:
+        code, confs = login._recognize_captcha_template(path.read_bytes())
+        if code == _captcha_label(path):
+            correct += 1
+            assert login._captcha_confident(code, confs)
+    assert correct / len(samples) >= 0.95
+
+
+def test_template_backend_dispatch(tmp_path, monkeypatch):
+    import mock_site
+
+    _trained_templates(tmp_path, monkeypatch)
+    monkeypatch.setattr(login, "CAPTCHA_BACKEND", "template")
+    mock_site.write_captcha_corpus(tmp_path / "one", 1, seed=3)
+    path = next((tmp_path / "one").glob("*.png"))
+    code, _ = login._recognize_captcha(path.read_bytes())
+    assert code == _captcha_label(path)
+
+
+def test_template_backend_low_confidence_on_noise_triggers_refresh(tmp_path, monkeypatch):
+    import io
+
+    import numpy as np
+
+    _trained_templates(tmp_path, monkeypatch)
+    noise = login.Image.fromarray((np.random.RandomState(0).rand(40, 100) * 255).astype("uint8"))
+    buf = io.BytesIO()
+    noise.save(buf, "PNG")
+    code, confs = login._recognize_captcha_template(buf.getvalue())
+    assert not login._captcha_confident(code, confs)
+    assert login._should_refresh_low_confidence(confs, 0)
+
+
+def test_refresh_threshold_follows_min_char_confidence(monkeypatch):
+    monkeypatch.setattr(login, "CAPTCHA_MIN_CHAR_CONFIDENCE", 0.5)
+    assert login._captcha_confident("AB12", [0.9, 0.5, 0.8, 0.7])
+    assert not login._captcha_confident("AB12", [0.9, 0.49, 0.8, 0.7])
+    assert not login._captcha_confident("AB1", [0.9, 0.9, 0.9])
+    assert not login._should_refresh_low_confidence([0.9, 0.5, 0.8, 0.7], 0)
+    assert login._should_refresh_low_confidence([0.9, 0.49, 0.8, 0.7], 0)
+    assert login._should_refresh_low_confidence([], 2)
+    # 连续 3 次低置信度后仍提交一次
+    assert not login._should_refresh_low_confidence([0.1, 0.1, 0.1, 0.1], 3)
@@ -0,0 +1,82 @@
+import pytest
+
+import playback_monitor
+import watch
+from playback_monitor import PlaybackMonitor
+
+
+@pytest.fixture(autouse=True)
+def _no_events(monkeypatch):
+    monkeypatch.setattr(playback_monitor, "emit", lambda *a, **kw: None)
+
+
+def test_sink_gets_every_reading_even_outside_evaluation():
+    totals = watch._PlaybackTotals()
+    monitor = PlaybackMonitor("u", 2.0, window_seconds=100, threshold=0.6, sink=totals)
+    monitor.exclude(5)
+    assert monitor.add(20, 10) is None
+    assert monitor.add(20, 10, evaluate=False) is None
+    # 累计不扣除恢复耗时，也不受效率窗口重置影响
+    assert (totals.video_s, totals.wall_s) == (40, 20)
+    assert monitor.add(180, 90) is None
+    assert monitor.add(20, 10) == "ok"
+    assert monitor.efficiency == pytest.approx(1.0)
+
+
+def _monitor(**kw):
+    kw.setdefault("window_seconds", 100)
+    kw.setdefault("threshold", 0.6)
+    kw.setdefault("strikes", 2)
+    return PlaybackMonitor("u", 2.0, **kw)
+
+
+def test_add_waits_for_a_full_window():
+    m = _monitor()
+    assert m.add(100, 50) is None
+    assert m.efficiency is None
+    assert m.add(100, 50) == "ok"
+    assert m.efficiency == pytest.approx(1.0)
+
+
+def test_add_escalates_to_recover_after_consecutive_slow_windows():
+    m = _monitor()
+    assert m.add(60, 100) == "slow"
+    assert m.efficiency == pytest.approx(0.3)
+    assert m.add(60, 100) == "recover"
+    assert m.low_windows == 0
+    assert m.add(60, 100) == "slow"
+    # 一个正常窗口清零计数
+    assert m.add(200, 100) == "ok"
+    assert m.add(60, 100) == "slow"
+
+
+def test_add_excludes_recovery_time_from_the_window():
+    m = _monitor()
+    m.exclude(40)
+    # 100s 墙钟里 40s 花在刷新上：按 60s 计，未满窗口
+    assert m.add(120, 100) is None
+    assert m.add(80, 40) == "ok"
+    assert m.efficiency == pytest.approx(1.0)
+
+
+def test_add_leaves_no_progress_to_stall_detection():
+    m = _monitor()
+    assert m.add(0, 100) is None
+    assert m.low_windows == 0
+
+
+def test_add_disabled_by_zero_window_or_threshold():
+    assert _monitor(window_seconds=0).add(0, 1000) is None
+    assert _monitor(threshold=0).add(10, 1000) is None
+
+
+def test_accept_player_rate_or_stop_evaluating():
+    m = _monitor()
+    m.add(60, 100)
+    m.accept(1.25)
+    assert m.low_windows == 0
+    # 按 1.25x 评估：实测 1.2x 不再偏慢
+    assert m.add(120, 100) == "ok"
+    m.accept()
+    assert not m.enabled
+    assert m.add(10, 1000) is None
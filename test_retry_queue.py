@@ -0,0 +1,83 @@
+import retry_queue
+from retry_queue import RetryQueue, partition
+
+
+def _queue(tmp_path):
+    return RetryQueue(tmp_path / "retry.sqlite3")
+
+
+def test_record_backs_off_exponentially(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "RETRY_BACKOFF_SECONDS", 100.0)
+    monkeypatch.setattr(retry_queue, "RETRY_BACKOFF_MAX_SECONDS", 250.0)
+    q = _queue(tmp_path)
+    first = q.record("c1", "u1", "skipped", "stall")
+    assert first["failures"] == 1
+    assert first["next_retry_at"] - first["last_failed_at"] == 100.0
+    second = q.record("c1", "u1", "skipped", "stall")
+    assert second["next_retry_at"] - second["last_failed_at"] == 200.0
+    third = q.record("c1", "u1", "skipped", "stall")
+    # 封顶 BACKOFF_MAX
+    assert third["next_retry_at"] - third["last_failed_at"] == 250.0
+    assert q.state("c1") == "backoff"
+    assert q.state("c1", now=third["next_retry_at"] + 1) == "ready"
+    assert q.due("c1", now=third["next_retry_at"] + 1)
+
+
+def test_record_quarantines_course_failures_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "QUARANTINE_AFTER", 2)
+    monkeypatch.setattr(retry_queue, "MAX_FAILURES", 5)
+    q = _queue(tmp_path)
+    q.record("c1", "u1", "skipped", "media_error")
+    q.record("c1", "u1", "skipped", "stall")
+    assert q.state("c1", now=0) != "quarantined"
+    entry = q.record("c1", "u1", "skipped", "media_error")
+    assert entry["quarantined"] == 1
+    assert q.state("c1") == "quarantined"
+    assert not q.due("c1", now=entry["next_retry_at"] + 1)
+
+
+def test_record_quarantines_after_max_failures_of_any_cause(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "MAX_FAILURES", 3)
+    q = _queue(tmp_path)
+    for _ in range(2):
+        assert not q.record("c1", "u1", "skipped", "navigation")["quarantined"]
+    assert q.record("c1", "u1", "skipped", "stall")["quarantined"]
+
+
+def test_record_login_neither_counts_nor_backs_off(tmp_path):
+    q = _queue(tmp_path)
+    entry = q.record("c1", "u1", "skipped", "login")
+    assert entry["failures"] == 0
+    assert entry["next_retry_at"] == entry["last_failed_at"]
+    assert q.state("c1") == "ready"
+
+
+def test_record_clears_on_completion_and_ignores_other_statuses(tmp_path):
+    q = _queue(tmp_path)
+    q.record("c1", "u1", "skipped", "stall")
+    assert q.record("c1", "u1", "failed", "stall") is None
+    assert q.record("c1", "u1", "skipped", None) is None
+    assert q.entries()[0]["failures"] == 1
+    assert q.record("c1", "u1", "completed", None) is None
+    assert q.entries() == []
+    q.record("c2", "u2", "skipped", "stall")
+    q.record("c2", "u2", "skipped_force", None)
+    assert q.state("c2") == "ready"
+
+
+def test_partition_splits_ready_backoff_and_quarantined(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "QUARANTINE_AFTER", 1)
+    q = _queue(tmp_path)
+    q.record("wait", "u-wait", "skipped", "stall")
+    q.record("bad", "u-bad", "skipped", "media_error")
+    items = [(1, "u-ok"), (2, "u-wait"), (3, "u-bad")]
+    ids = {"u-ok": "ok", "u-wait": "wait", "u-bad": "bad"}
+    ready, waiting, quarantined = partition(items, q, ids.__getitem__)
+    assert ready == [(1, "u-ok")]
+    assert waiting == [(2, "u-wait")]
+    assert quarantined == [(3, "u-bad")]
+
+
+def test_partition_without_queue_keeps_everything(tmp_path):
+    items = [(1, "a"), (2, "b")]
+    assert partition(iter(items), None, lambda u: u) == (items, [], [])
@@ -0,0 +1,46 @@
+import pytest
+
+import simulate
+
+
+def _ev(ts, event, pid=1, **fields):
+    return {"ts": f"2026-01-01T00:00:{ts:02d}", "run": f"r{pid}", "pid": pid, "event": event, **fields}
+
+
+def test_fit_contention_from_concurrent_efficiency_windows():
+    events = [
+        _ev(0, "course_start", pid=1, url="a"),
+        _ev(1, "efficiency", pid=1, rate=2.0),
+        _ev(2, "course_start", pid=2, url="b"),
+        # 两路同时观看：2.0 / 1.6 = 1 + c → c = 0.25
+        _ev(3, "efficiency", pid=1, rate=1.6),
+        _ev(4, "efficiency", pid=2, rate=1.6),
+        _ev(5, "course_end", pid=2, url="b"),
+        _ev(6, "efficiency", pid=1, rate=2.0),
+    ]
+    c, medians = simulate.fit_contention(events)
+    assert c == pytest.approx(0.25)
+    assert medians == {1: 2.0, 2: 1.6}
+
+
+def test_fit_contention_needs_concurrent_windows():
+    events = [_ev(0, "course_start", url="a"), _ev(1, "efficiency", rate=1.9), _ev(2, "run_end")]
+    c, medians = simulate.fit_contention(events)
+    assert c is None
+    assert medians == {1: 1.9}
+
+
+def test_concurrency_sweep_without_contention_is_refused():
+    with pytest.raises(SystemExit):
+        simulate.main(["--synthetic", "5", "--concurrency", "1,2"])
+
+
+def test_contention_slows_each_lane():
+    traces = simulate.synthetic_traces(20, seed=3, stall_rate=0, media_error_rate=0)
+    policy = {"refresh_interval": 0, "stall_seconds": 60, "retries": 3, "order": "file"}
+    kw = {"hours_per_video_second": simulate.DEFAULT_HOURS_PER_VIDEO_SECOND}
+    one = simulate.simulate(traces, {**policy, "concurrency": 1}, simulate.DEFAULT_COSTS, **kw)
+    free = simulate.simulate(traces, {**policy, "concurrency": 2}, simulate.DEFAULT_COSTS, **kw)
+    shared = simulate.simulate(traces, {**policy, "concurrency": 2}, simulate.DEFAULT_COSTS, contention=1.0, **kw)
+    assert free["hours_per_wall_hour"] > 1.8 * one["hours_per_wall_hour"]
+    assert shared["hours_per_wall_hour"] < free["hours_per_wall_hour"]
@@ -0,0 +1,42 @@
+from supervisor import strip_option
+
+
+def test_strip_option_removes_both_forms():
+    argv = ["--workers", "3", "--lines", "1-5", "--workers=4", "--follow"]
+    assert strip_option(argv, "--workers") == ["--lines", "1-5", "--follow"]
+
+
+def test_strip_option_keeps_options_sharing_a_prefix():
+    argv = ["--workers-extra", "x", "--metrics-port", "9100", "--metrics-port-base=1"]
+    assert strip_option(argv, "--metrics-port") == ["--workers-extra", "x", "--metrics-port-base=1"]
+
+
+def _supervisor(tmp_path, workers, target):
+    from autoscale import Autoscaler
+    from course_store import CourseStore
+    from supervisor import Supervisor
+
+    store = CourseStore(tmp_path / "courses.sqlite3")
+    store.add([(1, "https://a/1")])
+    scaler = Autoscaler(workers, min_workers=target)
+    sup = Supervisor(store, ["true"], workers, autoscaler=scaler)
+    for w in sup.workers[target:]:
+        w.parked = True
+    return sup
+
+
+def test_parked_worker_replaces_one_that_gave_up(tmp_path):
+    sup = _supervisor(tmp_path, 3, 1)
+    sup.workers[0].finished = True
+    sup._replace_given_up(5.0)
+    assert not sup.workers[1].parked
+    assert sup.workers[1].next_start == 5.0
+    assert sup.workers[2].parked
+
+
+def test_no_replacement_without_pending_courses(tmp_path):
+    sup = _supervisor(tmp_path, 2, 1)
+    sup.store.claim("1")
+    sup.workers[0].finished = True
+    sup._replace_given_up(5.0)
+    assert sup.workers[1].parked
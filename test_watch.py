@@ -0,0 +1,166 @@
+import asyncio
+
+import watch
+
+
+def test_estimate_playback_rate_smooths_observed_rate():
+    assert watch._estimate_playback_rate(2.0, 120, 100, 10.0) == 2.0
+    # 实测 1x：与上次估计各占一半
+    assert watch._estimate_playback_rate(2.0, 110, 100, 10.0) == 1.5
+
+
+def test_estimate_playback_rate_keeps_previous_on_short_or_backward_reads():
+    assert watch._estimate_playback_rate(1.7, 105, 100, 1.0) == 1.7
+    assert watch._estimate_playback_rate(1.7, 90, 100, 10.0) == 1.7
+    assert watch._estimate_playback_rate(1.7, 100, 100, 10.0) == 1.7
+
+
+def test_estimate_playback_rate_clamps_jumps():
+    # 刷新后跳到服务端进度等大跨度前进按 4x 封顶
+    assert watch._estimate_playback_rate(2.0, 1000, 100, 10.0) == 3.0
+
+
+def test_next_poll_delay_falls_back_to_base_when_not_progressing():
+    assert watch._next_poll_delay(None, 600, 2.0, progressing=True) == (watch.POLL_BASE_SECONDS, "base")
+    assert watch._next_poll_delay(100, 600, 2.0, progressing=False) == (watch.POLL_BASE_SECONDS, "base")
+
+
+def test_next_poll_delay_is_capped_by_half_the_stall_window():
+    delay, phase = watch._next_poll_delay(0, 7200, 2.0, progressing=True, stall_seconds=60)
+    assert phase == "adaptive"
+    assert delay <= 30
+    delay, _ = watch._next_poll_delay(0, 7200, 2.0, progressing=True, stall_seconds=20)
+    assert delay <= 10
+
+
+def test_next_poll_delay_gets_dense_near_the_end_and_respects_refresh():
+    delay, phase = watch._next_poll_delay(597, 600, 2.0, progressing=True)
+    assert phase == "ending"
+    assert delay == watch.POLL_MIN_SECONDS
+    delay, _ = watch._next_poll_delay(0, 7200, 2.0, progressing=True, until_refresh=4.0)
+    assert delay == 4.0
+
+
+def test_remove_url_from_file_drops_duplicates_and_keeps_others(tmp_path):
+    f = tmp_path / "url.txt"
+    f.write_text("https://x/a?courseId=1\nhttps://x/b?courseId=2\nhttps://x/a?courseId=1&p=2\n", encoding="utf-8")
+    watch._remove_url_from_file(f, "https://x/a?courseId=1")
+    assert f.read_text(encoding="utf-8") == "https://x/b?courseId=2\n"
+
+
+def test_slow_tab_action_reopens_up_to_the_limit():
+    assert watch._slow_tab_action(0, 2.0, retries=2, final="accept") == "reopen"
+    assert watch._slow_tab_action(1, None, retries=2, final="accept") == "reopen"
+    assert watch._slow_tab_action(2, 2.0, retries=2, final="accept") == "accept"
+    assert watch._slow_tab_action(2, 2.0, retries=2, final="skip") == "skip"
+
+
+def test_slow_tab_action_accepts_player_refusing_2x():
+    assert watch._slow_tab_action(0, 1.5, retries=2, final="skip") == "player_rate"
+    assert watch._slow_tab_action(0, 0, retries=2, final="skip") == "reopen"
+
+
+class _PersonalPage:
+    async def wait_for_timeout(self, _ms):
+        pass
+
+
+def _account(monkeypatch, tmp_path, after_hours, status, *, shared=False):
+    url = "https://x/a?courseId=1"
+    f = tmp_path / "url.txt"
+    f.write_text(url + "\n", encoding="utf-8")
+
+    async def refresh(*_a, **_kw):
+        return _PersonalPage()
+
+    async def read(_page):
+        return after_hours
+
+    async def progress(_context, page):
+        return False, page
+
+    async def release(_page, reuse=True):
+        pass
+
+    monkeypatch.setattr(watch, "_refresh_personal_center", refresh)
+    monkeypatch.setattr(watch, "_read_watched_hours_value", read)
+    monkeypatch.setattr(watch, "_print_progress", progress)
+    monkeypatch.setattr(watch, "_release_page", release)
+    monkeypatch.setattr(watch, "_append_watched_diff", lambda *a, **kw: None)
+    monkeypatch.setattr(watch, "emit", lambda *a, **kw: None)
+    monkeypatch.setattr(watch, "_shared_account", shared)
+    asyncio.run(watch._account_course(None, 1.0, f, url, 1, status, 60.0))
+    return f.read_text(encoding="utf-8").strip()
+
+
+def test_account_course_keeps_url_played_to_the_end_without_credit(monkeypatch, tmp_path):
+    assert _account(monkeypatch, tmp_path, 1.0, "completed") == "https://x/a?courseId=1"
+    assert _account(monkeypatch, tmp_path, 1.5, "skipped") == ""
+    assert _account(monkeypatch, tmp_path, 1.0, "skipped_force") == ""
+
+
+def test_account_course_shared_account_removes_completed(monkeypatch, tmp_path):
+    assert _account(monkeypatch, tmp_path, 3.0, "completed", shared=True) == ""
+    assert _account(monkeypatch, tmp_path, 3.0, "skipped", shared=True) == "https://x/a?courseId=1"
+
+
+class _HangingPage:
+    def __init__(self):
+        self.released = False
+
+    async def goto(self, *_a, **_kw):
+        await asyncio.sleep(3600)
+
+
+def test_cancelled_prefetch_releases_its_tab(monkeypatch):
+    page = _HangingPage()
+
+    async def new_page(_context, _reason, **_kw):
+        return page
+
+    async def release(p, reuse=True):
+        p.released = True
+
+    monkeypatch.setattr(watch, "_new_page", new_page)
+    monkeypatch.setattr(watch, "_release_page", release)
+    monkeypatch.setattr(watch, "emit", lambda *a, **kw: None)
+
+    async def run():
+        prefetch = watch._CoursePrefetch(60)
+        await prefetch.start(None, "https://x/a?courseId=1")
+        await asyncio.sleep(0)
+        assert page in watch._pinned_pages
+        # 换成另一门课：上一个预取在 goto 中被取消，标签归还
+        await prefetch.start(None, "https://x/a?courseId=2")
+        assert page.released
+        assert page not in watch._pinned_pages
+        await prefetch.cancel()
+
+    asyncio.run(run())
+
+
+def test_store_call_runs_coordinator_requests_off_the_event_loop(monkeypatch):
+    import threading
+
+    from coordinator import CoordinatorClient
+
+    client = object.__new__(CoordinatorClient)
+    threads = []
+    client.set_flag = lambda name, value="1": threads.append((threading.get_ident(), name))
+    monkeypatch.setattr(watch, "_course_store", client)
+
+    async def run():
+        await watch._store_call("set_flag", "all_done")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and threads[0][1] == "all_done"
+    assert threads[0][0] != loop_thread
+
+
+def test_poll_cap_is_the_tightest_of_max_stall_and_refresh(monkeypatch):
+    monkeypatch.setattr(watch, "POLL_MAX_SECONDS", 90.0)
+    assert watch._poll_cap(30, stall_seconds=60) == 30
+    assert watch._poll_cap(0, stall_seconds=60) == 30
+    assert watch._poll_cap(0, stall_seconds=180) == 90
+    assert watch._poll_cap(300, stall_seconds=0) == 90
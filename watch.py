@@ -2,45 +2,99 @@ import argparse
 import asyncio
 import os
 import re
-import smtplib
+import socket
+import sys
 import time
 from datetime import datetime
-from email.mime.text import MIMEText
 from pathlib import Path
 
 from playwright.async_api import async_playwright, Page
 
+import metrics
+import profiling
+from lite_playback import DEFAULT_LITE_PLAYBACK, LitePlayback
+from netblock import BLOCK_PROFILES, DEFAULT_WATCH_PROFILE, apply_block_profile
+from playback_monitor import PlaybackMonitor
+from events import emit
+from notify import notify
+
 # 默认播放页定时刷新间隔（秒）
 DEFAULT_REFRESH_INTERVAL = 30
+# 当前课程剩余不足该秒数时，后台预取下一门课（打开并初始化播放器、保持暂停）；0 关闭
+DEFAULT_PREFETCH_SECONDS = float(os.getenv("DT_PREFETCH_SECONDS", "60"))
+# 开始下一门课前最多等待上一门课学时核算的秒数（核算要读到 100% 才能及时停止）；超时则先开播，下一门课前再取结果
+ACCOUNTING_WAIT_SECONDS = float(os.getenv("DT_ACCOUNTING_WAIT_SECONDS", "30"))
+# --follow：队列看完后继续跟随 URL 文件（扫描追加的新课程）/课程库，空闲超过该秒数才结束；0 一直等待
+DEFAULT_FOLLOW = os.getenv("DT_WATCH_FOLLOW", "0").strip().lower() in {"1", "true", "yes", "on"}
+DEFAULT_FOLLOW_IDLE_SECONDS = float(os.getenv("DT_FOLLOW_IDLE_SECONDS", "1800"))
+# 跟随时检查 URL 文件（大小/修改时间）或课程库的间隔
+FOLLOW_POLL_SECONDS = float(os.getenv("DT_FOLLOW_POLL_SECONDS", "5"))
+
+# 自适应轮询：下一次检测的等待 = 距完成的剩余墙钟时间（剩余视频时长 / 实测倍速）× POLL_FRACTION，
+# 限制在 [POLL_MIN_SECONDS, POLL_MAX_SECONDS] 且不超过 STALL_SECONDS / 2（卡住最迟在 1.5 × STALL_SECONDS 内发现）；
+# 读不到时间或进度没有前进时退回 POLL_BASE_SECONDS
+POLL_BASE_SECONDS = float(os.getenv("DT_POLL_BASE_SECONDS", "10"))
+POLL_MIN_SECONDS = float(os.getenv("DT_POLL_MIN_SECONDS", "1"))
+POLL_MAX_SECONDS = float(os.getenv("DT_POLL_MAX_SECONDS", "30"))
+POLL_FRACTION = float(os.getenv("DT_POLL_FRACTION", "0.5"))
+# 设置 2x 后的名义倍速；实测倍速在两次读数之间估算
+NOMINAL_PLAYBACK_RATE = 2.0
+# 卡住判定：进度 STALL_SECONDS 秒未变化或连续 STALL_MISSES 次读不到播放时间即新标签重试，重试 STALL_RETRIES 次后跳过
+STALL_SECONDS = float(os.getenv("DT_STALL_SECONDS", "60"))
+STALL_MISSES = int(os.getenv("DT_STALL_MISSES", "6"))
+STALL_RETRIES = int(os.getenv("DT_STALL_RETRIES", "3"))
+# 播放效率连续偏低时每门课最多换新标签几次；用尽后 accept 接受当前倍速继续看，skip 跳过（原因 slow）
+SLOW_TAB_RETRIES = int(os.getenv("DT_SLOW_TAB_RETRIES", "2"))
+SLOW_TAB_FINAL = os.getenv("DT_SLOW_TAB_FINAL", "accept").strip().lower()
+# worker 向课程库回报累计播放量（供 supervisor --autoscale）的最小间隔
+PLAYBACK_REPORT_SECONDS = 30.0
 
 from login import (
     LOGIN_URL,
     MEMBER_URL,
     PERSONAL_CENTER_URL,
     PW_TIMEOUT_MS,
-    connect_chrome_over_cdp,
     ensure_logged_in,
     load_local_secrets,
+    mark_session_verified,
+    verify_session,
     _save_storage_state,
 )
-STATE_FILE = Path(os.getenv("DT_STORAGE_STATE_FILE", "storage_state.json"))
-
+from browser_pool import BrowserPool
+from coordinator import DEFAULT_COORDINATOR_URL, CoordinatorClient
+from course_store import DEFAULT_COURSE_STORE, CourseStore
+from retry_queue import DEFAULT_RETRY_QUEUE, RetryQueue, partition as _retry_partition
+from session_keeper import DEFAULT_KEEPALIVE_INTERVAL, SessionKeeper
+from autoscale import DEFAULT_AUTOSCALE, DEFAULT_AUTOSCALE_INTERVAL, DEFAULT_AUTOSCALE_MIN, Autoscaler
+from supervisor import run_supervisor
+from course_urls import _course_id, _iter_urls, _parse_shard
+from file_lock import locked
+from tab_pool import TabPool, TabPoolExhausted
 
-#发邮件提醒
-def send_email(subject, body, to_email='ibjxk0@gmail.com'):
-    from_email = "hqlak47@gmail.com"
-    password = "zkgamebmeqnyxwlj"
-
-    msg = MIMEText(body, "plain", "utf-8")
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = to_email
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(from_email, password)
-            server.sendmail(from_email, to_email, msg.as_string())
-    except Exception as e:
-        print(f"邮件发送失败: {e}")
+STATE_FILE = Path(os.getenv("DT_STORAGE_STATE_FILE", "storage_state.json"))
+# main 中启动的后台会话保活；登录失效时由它在独立 context 中重新登录
+_session_keeper: SessionKeeper | None = None
+# main 中创建的标签池：限制标签数、复用空闲页、新开前检查渲染进程内存
+_tab_pool: TabPool | None = None
+# --lite-playback：最低码率、不全屏、小视口
+_lite_playback: LitePlayback | None = None
+# 下一门课的预取标签
+_prefetch: "_CoursePrefetch | None" = None
+# 后台任务持有的标签（预取页、学时核算的个人中心页），清理多余标签时保留
+_pinned_pages: set[Page] = set()
+# --workers / --coordinator 模式下本进程的 worker 编号与课程队列（单进程模式为 None）
+_worker_id: str | None = None
+_course_store: CourseStore | CoordinatorClient | None = None
+# 多个观看进程共用同一账号时，个人中心学时的变化混有其他进程的入账，不能按差值判定本课看完或记为本课学时；
+# 此时课程结果只看本标签自己的播放状态（ended/Replay、刷新后起始时间）
+_shared_account = False
+# 跳过课程的重试队列（退避 + 隔离），--no-retry-queue 时为 None
+_retry_queue: RetryQueue | None = None
+
+
+#发邮件提醒：交给后台通知线程投递（合并、重试），不阻塞事件循环
+def send_email(subject, body):
+    notify(subject, body)
 
 def _ts() -> str:
     now = datetime.now()
@@ -52,7 +106,10 @@ def _ts_full() -> str:
 
 
 def _log(msg: str) -> None:
-    print(f"{_ts()} {msg}")
+    if _worker_id:
+        print(f"{_ts()} [W{_worker_id}] {msg}")
+    else:
+        print(f"{_ts()} {msg}")
 
 
 
@@ -65,85 +122,350 @@ def _pick_url_file() -> Path:
     return candidates[-1]
 
 
-def _parse_lines_range(lines_arg: str | None) -> tuple[int | None, int | None]:
-    if not lines_arg:
-        return None, None
-    s = str(lines_arg).strip()
-    if not s:
-        return None, None
-
-    if "-" not in s:
-        try:
-            n = int(s)
-        except Exception as exc:
-            raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32 / 32- / 32-34）") from exc
-        if n <= 0:
-            raise SystemExit(f"--lines 行号必须为正整数：{lines_arg!r}")
-        return n, n
-
-    start_s, end_s = [p.strip() for p in s.split("-", 1)]
-    if not start_s:
-        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）")
-
-    try:
-        start = int(start_s)
-    except Exception as exc:
-        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）") from exc
-    if start <= 0:
-        raise SystemExit(f"--lines 起始行号必须为正整数：{lines_arg!r}")
-
-    if end_s == "":
-        return start, None
-
-    try:
-        end = int(end_s)
-    except Exception as exc:
-        raise SystemExit(f"--lines 参数格式错误：{lines_arg!r}（示例：32- 或 32-34）") from exc
-    if end <= 0:
-        raise SystemExit(f"--lines 结束行号必须为正整数：{lines_arg!r}")
-    if end < start:
-        raise SystemExit(f"--lines 结束行号不能小于起始行号：{lines_arg!r}")
-
-    return start, end
+class _UrlFollower:
+    """
+    跟随 URL 文件：文件大小或修改时间变化时重新读取，只返回之前没见过的课程。
+    扫描（get_no_test_urls.py）持续追加、观看删除已看完的行，都不会让同一课程重复入队。
+    """
 
+    def __init__(self, path: Path, *, lines_range: str | None = None, shard: tuple[int, int] | None = None, seen=()) -> None:
+        self.path = path
+        self.lines_range = lines_range
+        self.shard = shard
+        # 已入队课程的 courseId
+        self.seen: set[str] = {_course_id(u) for u in seen}
+        self._stamp: tuple[int, int] | None = None
 
-def _iter_urls(p: Path, *, lines_range: str | None = None):
-    try:
-        lines = p.read_text(encoding="utf-8").splitlines()
-    except Exception:
+    def _file_stamp(self) -> tuple[int, int] | None:
         try:
-            lines = p.read_text(encoding="utf-8-sig").splitlines()
-        except Exception as exc:
-            raise SystemExit(f"无法读取 URL 文件：{p} ({exc})") from exc
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
 
-    start, end = _parse_lines_range(lines_range)
-    for idx, raw in enumerate(lines, start=1):
-        if start is not None and idx < start:
-            continue
-        if end is not None and idx > end:
-            break
+    def _partial_last_line(self) -> bool:
+        try:
+            with self.path.open("rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                return fh.read(1) != b"\n"
+        except OSError:
+            return False
+
+    def poll(self) -> list[tuple[int, str]]:
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return []
+        self._stamp = stamp
+        try:
+            items = list(_iter_urls(self.path, lines_range=self.lines_range, shard=self.shard, quiet=True))
+        except SystemExit as exc:
+            # 扫描进程正在写入等瞬时读取失败：下次再读
+            _log(f"读取 URL 文件失败，稍后重试：{exc}")
+            self._stamp = None
+            return []
+        if items and self._partial_last_line():
+            # 最后一行还没写完（没有换行结尾）：这次不取，写完后文件变化会再读到
+            last = max(line_no for line_no, _ in items)
+            items = [(line_no, url) for line_no, url in items if line_no != last]
+        new = [(line_no, url) for line_no, url in items if _course_id(url) not in self.seen]
+        self.seen.update(_course_id(url) for _, url in new)
+        return new
+
+
+class _CourseQueue:
+    """
+    观看队列：pull() 返回下一门 (course_no, line_no, url) 或 None（可以是协程函数）。
+    follow 时队列暂空不结束，按 FOLLOW_POLL_SECONDS 继续拉取，空闲超过 idle_seconds（0 不限）才结束。
+    pull_nowait 用于不等待的预读（为预取看一眼下一门），未给出时同 pull。
+    """
 
-        s = (raw or "").strip()
-        if not s:
-            continue
-        if not s.startswith("https"):
-            continue
-        yield idx, s
+    def __init__(
+        self,
+        pull,
+        *,
+        follow: bool = False,
+        idle_seconds: float = DEFAULT_FOLLOW_IDLE_SECONDS,
+        defer=None,
+        draining=None,
+        pull_nowait=None,
+    ) -> None:
+        self.pull = pull
+        self.pull_nowait = pull_nowait
+        self.follow = follow
+        self.idle_seconds = idle_seconds
+        # defer(line_no, url)：跳过的课程放回队尾，退避结束后本轮内再看（共享课程库模式不支持，为 None）
+        self.defer = defer
+        # draining() 为真时不再领取、也不等待新课程（supervisor 自动伸缩减少 worker）
+        self.draining = draining
+
+    async def next(self, *, wait: bool = True, stop=None):
+        if self.draining is not None and self.draining():
+            if wait:
+                _log("supervisor 已减少 worker：不再领取新课程")
+            return None
+        item = await self._pull(wait)
+        if item is not None or not wait or not self.follow:
+            return item
+        _log("队列已看完，等待新课程（--follow）")
+        deadline = time.monotonic() + self.idle_seconds if self.idle_seconds > 0 else None
+        while True:
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+            item = await self._pull(True)
+            if item is not None:
+                emit("follow_new", url=item[2], line_no=item[1])
+                return item
+            if stop is not None and stop():
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                _log(f"{self.idle_seconds:g}s 内没有新课程，结束跟随")
+                return None
+
+    async def _pull(self, wait: bool):
+        pull = self.pull if wait or self.pull_nowait is None else self.pull_nowait
+        item = pull()
+        if asyncio.iscoroutine(item):
+            item = await item
+        return item
+
+
+def _initial_items(url_file: Path, args: argparse.Namespace) -> list[tuple[int, str]]:
+    # --follow 时允许从空文件（扫描尚未写入）开始
+    if args.follow and not url_file.exists():
+        return []
+    items = list(_iter_urls(url_file, lines_range=args.lines, shard=_parse_shard(args.shard)))
+    if not items and not args.follow:
+        raise SystemExit(f"未找到任何课程 URL：{url_file}（lines={args.lines!r} shard={args.shard!r}）")
+    return items
+
+
+def _retry_filter(items: list[tuple[int, str]], deferred: list[tuple[int, str]]) -> list[tuple[int, str]]:
+    """去掉重试队列中已隔离的课程；退避中的放入 deferred，到期后再看。"""
+    ready, waiting, quarantined = _retry_partition(items, _retry_queue, _course_id)
+    if waiting or quarantined:
+        _log(f"重试队列：{len(waiting)} 门课程退避中（稍后重试），{len(quarantined)} 门已隔离（python retry_queue.py list）")
+    deferred.extend(waiting)
+    return ready
+
+
+def _url_file_queue(url_file: Path, items: list[tuple[int, str]], args: argparse.Namespace) -> _CourseQueue:
+    deferred: list[tuple[int, str]] = []
+    pending = _retry_filter(items, deferred)
+    follower = None
+    if args.follow:
+        follower = _UrlFollower(url_file, lines_range=args.lines, shard=_parse_shard(args.shard), seen=(u for _, u in items))
+        pending.extend(_retry_filter(follower.poll(), deferred))
+    course_no = 0
+
+    def pull():
+        nonlocal course_no
+        if not pending and follower is not None:
+            new = follower.poll()
+            if new:
+                _log(f"URL 文件新增课程：{len(new)} 门")
+                pending.extend(_retry_filter(new, deferred))
+        if not pending and deferred and _retry_queue is not None:
+            now = time.time()
+            for item in [d for d in deferred if _retry_queue.due(_course_id(d[1]), now)]:
+                deferred.remove(item)
+                pending.append(item)
+                _log(f"退避结束，重试课程：{item[1]}")
+        if not pending:
+            return None
+        course_no += 1
+        line_no, url = pending.pop(0)
+        return course_no, line_no, url
+
+    return _CourseQueue(pull, follow=args.follow, idle_seconds=float(args.follow_idle), defer=lambda *item: deferred.append(item))
 
 
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="看视频：登录→个人中心进度→按 URL.txt/url.txt 逐课播放（2x + 卡住刷新）")
     parser.add_argument("--url-file", default=None, help="URL 文件路径（默认优先 URL.txt，其次 url.txt）")
     parser.add_argument("--lines", default=None, help="读取的行范围：32 / 32- / 32-34（按 URL 文件行号）")
+    parser.add_argument(
+        "--shard",
+        default=os.getenv("DT_SHARD") or None,
+        help="只看属于第 i 个分片的课程：i/n（按 courseId 哈希划分，多个独立进程互不重叠；也可设 DT_SHARD）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("DT_WATCH_WORKERS", "1")),
+        help="worker 进程数：>1 时本进程作为 supervisor，各 worker 独立的 Playwright 驱动与 context，共享课程库（默认 1）",
+    )
+    parser.add_argument(
+        "--autoscale",
+        action="store_true",
+        default=DEFAULT_AUTOSCALE,
+        help="按实测吞吐、CPU 与卡住率自动调整同时运行的 worker 数，--workers 为上限（也可设 DT_AUTOSCALE=1）",
+    )
+    parser.add_argument(
+        "--autoscale-min",
+        type=int,
+        default=DEFAULT_AUTOSCALE_MIN,
+        help=f"--autoscale 的最少 worker 数，也是起始数（默认 {DEFAULT_AUTOSCALE_MIN}）",
+    )
+    parser.add_argument(
+        "--autoscale-interval",
+        type=float,
+        default=DEFAULT_AUTOSCALE_INTERVAL,
+        help=f"--autoscale 每个评估窗口的秒数（默认 {DEFAULT_AUTOSCALE_INTERVAL:g}）",
+    )
+    parser.add_argument(
+        "--course-store",
+        default=str(DEFAULT_COURSE_STORE),
+        help=f"多进程模式的共享课程库（sqlite，默认 {DEFAULT_COURSE_STORE}）",
+    )
+    parser.add_argument(
+        "--coordinator",
+        default=DEFAULT_COORDINATOR_URL or None,
+        help="从 coordinator（python coordinator.py serve）领取课程并回报结果，如 http://192.168.1.10:8770（也可设 DT_COORDINATOR_URL）",
+    )
+    parser.add_argument("--worker-id", default=None, help="worker 编号（--coordinator 时默认 主机名-pid）")
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        default=DEFAULT_FOLLOW,
+        help="看完现有课程后继续跟随 URL 文件/课程队列，边扫描边观看（也可设 DT_WATCH_FOLLOW=1）",
+    )
+    parser.add_argument(
+        "--follow-idle",
+        type=float,
+        default=DEFAULT_FOLLOW_IDLE_SECONDS,
+        help=f"--follow 时持续多少秒没有新课程后结束（0 一直等待，默认 {DEFAULT_FOLLOW_IDLE_SECONDS:g}）",
+    )
+    parser.add_argument(
+        "--retry-queue",
+        default=str(DEFAULT_RETRY_QUEUE),
+        help=f"跳过课程的重试队列（sqlite，按原因退避、反复失败隔离；默认 {DEFAULT_RETRY_QUEUE}）",
+    )
+    parser.add_argument("--no-retry-queue", action="store_true", help="不使用重试队列：跳过的课程下次照常按原位置观看")
     parser.add_argument(
         "--refresh-interval",
         type=int,
         default=DEFAULT_REFRESH_INTERVAL,
         help=f"播放页定时刷新间隔（秒，默认 {DEFAULT_REFRESH_INTERVAL}）",
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=metrics.DEFAULT_METRICS_PORT,
+        help="本地 Prometheus 指标端点端口（0 关闭，默认读取 DT_METRICS_PORT）",
+    )
+    parser.add_argument(
+        "--keepalive-interval",
+        type=int,
+        default=DEFAULT_KEEPALIVE_INTERVAL,
+        help=f"后台登录态保活探测间隔（秒，0 关闭，默认 {DEFAULT_KEEPALIVE_INTERVAL}）",
+    )
+    parser.add_argument(
+        "--lite-playback",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_LITE_PLAYBACK,
+        help="低开销播放：最低码率、不全屏、小视口，后台标签保持前台状态（也可设 DT_LITE_PLAYBACK=1；--no-lite-playback 关闭）",
+    )
+    parser.add_argument(
+        "--prefetch-seconds",
+        type=float,
+        default=DEFAULT_PREFETCH_SECONDS,
+        help=f"当前课程剩余不足该秒数时后台预取下一门课（0 关闭，默认 {DEFAULT_PREFETCH_SECONDS:g}）",
+    )
+    parser.add_argument(
+        "--block-profile",
+        choices=sorted(BLOCK_PROFILES),
+        default=DEFAULT_WATCH_PROFILE,
+        help=f"请求拦截配置（默认 {DEFAULT_WATCH_PROFILE}：丢弃图片/字体/统计脚本，保留视频流与进度上报；off 关闭）",
+    )
+    parser.add_argument(
+        "--profile-cdp",
+        action="store_true",
+        help="剖析 Playwright 调用耗时，退出时输出按调用点汇总与折叠栈（也可设 DT_PROFILE_CDP=1）",
+    )
     return parser.parse_args(argv)
 
 
+def _completion_threshold(dur: int) -> int:
+    # 播放完成后会卡在最后一秒；过短的视频按 88s 兜底
+    return max(dur - 1, 88)
+
+
+def _estimate_playback_rate(prev_rate: float, cur: int, last_cur: int, elapsed: float) -> float:
+    """用两次读数估算实际倍速（平滑），读数间隔太短或倒退时沿用上次估计。"""
+    if elapsed < 2 or cur <= last_cur:
+        return prev_rate
+    observed = min(max((cur - last_cur) / elapsed, 0.25), 4.0)
+    return prev_rate * 0.5 + observed * 0.5
+
+
+def _next_poll_delay(
+    cur: int | None,
+    dur: int | None,
+    rate: float,
+    *,
+    progressing: bool,
+    until_refresh: float | None = None,
+    stall_seconds: float = STALL_SECONDS,
+) -> tuple[float, str]:
+    """
+    返回 (等待秒数, 阶段)。播放正常时按剩余时间成比例退避，越接近结尾越密，结尾附近约 1s 一次。
+    上限不超过卡住判定时长的一半：播放中途卡住时，最迟在 stall_seconds 之后半个判定时长内发现。
+    """
+    if cur is None or dur is None or not progressing:
+        delay, phase = POLL_BASE_SECONDS, "base"
+    else:
+        remaining = max(0.0, _completion_threshold(dur) - cur) / max(rate, 0.25)
+        delay = min(remaining * POLL_FRACTION, POLL_MAX_SECONDS)
+        phase = "adaptive" if delay > POLL_BASE_SECONDS else "ending"
+    if stall_seconds > 0:
+        delay = min(delay, stall_seconds / 2)
+    if until_refresh is not None:
+        delay = min(delay, until_refresh)
+    return max(POLL_MIN_SECONDS, delay), phase
+
+
+def _poll_cap(refresh_interval: float, stall_seconds: float = STALL_SECONDS) -> float:
+    """播放正常时两次检测之间的最长等待：POLL_MAX、卡住判定的一半与定时刷新间隔中最小者。"""
+    caps = [POLL_MAX_SECONDS]
+    if stall_seconds > 0:
+        caps.append(stall_seconds / 2)
+    if refresh_interval > 0:
+        caps.append(refresh_interval)
+    return max(POLL_MIN_SECONDS, min(caps))
+
+
+def _stall_action(
+    since_progress: float,
+    missing_reads: int,
+    attempts: int,
+    *,
+    stall_seconds: float = STALL_SECONDS,
+    stall_misses: int = STALL_MISSES,
+    retries: int = STALL_RETRIES,
+) -> str | None:
+    """卡住时的处理：None 继续等待，"retry" 新标签重试，"skip" 跳过该课程（simulate.py 复用同一判定）。"""
+    if since_progress < stall_seconds and missing_reads < stall_misses:
+        return None
+    return "skip" if attempts >= retries else "retry"
+
+
+def _slow_tab_action(
+    reopened: int,
+    player_rate,
+    *,
+    retries: int = SLOW_TAB_RETRIES,
+    final: str = SLOW_TAB_FINAL,
+) -> str:
+    """
+    播放效率连续偏低（recover）时的处理："player_rate" 播放器自己停在低于 2x 的倍速（设置过仍不接受），
+    换标签无济于事，按其倍速继续评估；"reopen" 换新标签；已换 retries 次后为 final（"accept" / "skip"）。
+    """
+    if isinstance(player_rate, (int, float)) and 0 < player_rate < NOMINAL_PLAYBACK_RATE - 0.01:
+        return "player_rate"
+    if reopened < retries:
+        return "reopen"
+    return "skip" if final == "skip" else "accept"
+
+
 def _parse_clock_text_to_seconds(text: str) -> int | None:
     s = (text or "").strip()
     if not s:
@@ -163,8 +485,9 @@ def _parse_clock_text_to_seconds(text: str) -> int | None:
 
 
 async def _read_video_state_js(page: Page) -> dict | None:
+    started = time.monotonic()
     try:
-        return await page.evaluate(
+        state = await page.evaluate(
             """() => {
                 const v = document.querySelector('video.vjs-tech');
                 if (!v) return null;
@@ -174,9 +497,12 @@ async def _read_video_state_js(page: Page) -> dict | None:
                     paused: !!v.paused,
                     ended: !!v.ended,
                     readyState: v.readyState,
+                    playbackRate: Number.isFinite(v.playbackRate) ? v.playbackRate : null,
                 };
             }"""
         )
+        metrics.CDP_LATENCY.observe(time.monotonic() - started, op="video_state")
+        return state
     except Exception:
         return None
 
@@ -391,29 +717,45 @@ def _remove_url_from_file(url_file: Path, url: str) -> None:
         _log(f"URL 文件不存在，跳过删除：{url_file}")
         return
 
-    try:
-        lines = url_file.read_text(encoding="utf-8").splitlines()
-    except Exception:
+    # 多个 --shard 进程与扫描进程（--follow 边扫描边观看）会同时改写/追加同一个文件：读改写整体放在跨进程文件锁内；
+    # 不走锁的外部写入方仍按文件大小检测，变了就重读，避免覆盖新追加的行
+    with locked(url_file):
+        _remove_url_locked(url_file, url)
+
+
+def _remove_url_locked(url_file: Path, url: str) -> None:
+    for _ in range(5):
+        size = url_file.stat().st_size
         try:
-            lines = url_file.read_text(encoding="utf-8-sig").splitlines()
-        except Exception as exc:
-            _log(f"读取 URL 文件失败，跳过删除：{url_file} ({exc})")
+            lines = url_file.read_text(encoding="utf-8").splitlines()
+        except Exception:
+            try:
+                lines = url_file.read_text(encoding="utf-8-sig").splitlines()
+            except Exception as exc:
+                _log(f"读取 URL 文件失败，跳过删除：{url_file} ({exc})")
+                return
+
+        # 同一课程（courseId 相同）的重复行一并删除
+        cid = _course_id(url)
+        removed = False
+        new_lines: list[str] = []
+        for raw in lines:
+            line = raw.strip()
+            if line == url or (line.startswith(("https://", "http://")) and _course_id(line) == cid):
+                removed = True
+                continue
+            new_lines.append(raw)
+
+        if not removed:
+            _log(f"未在 URL 文件中找到要删除的链接：{url}")
             return
 
-    removed = False
-    new_lines: list[str] = []
-    for raw in lines:
-        if raw.strip() == url:
-            removed = True
+        if url_file.stat().st_size != size:
             continue
-        new_lines.append(raw)
-
-    if not removed:
-        _log(f"未在 URL 文件中找到要删除的链接：{url}")
+        url_file.write_text("\n".join(new_lines) + ("\n" if new_lines else ""), encoding="utf-8")
+        _log(f"已从 URL 文件删除：{url}")
         return
-
-    url_file.write_text("\n".join(new_lines) + ("\n" if new_lines else ""), encoding="utf-8")
-    _log(f"已从 URL 文件删除：{url}")
+    _log(f"URL 文件持续变化，本次跳过删除：{url}")
 
 
 async def _print_progress(context, page: Page) -> tuple[bool, Page]:
@@ -436,26 +778,46 @@ async def _goto_personal_center_in_current_tab(page: Page) -> None:
         await page.wait_for_timeout(500)
 
 
-async def _refresh_personal_center(context, page: Page | None, refocus_page: Page | None = None) -> Page:
+async def _refresh_personal_center(
+    context, page: Page | None, refocus_page: Page | None = None, *, pin: bool = False
+) -> Page:
     """
     新开标签打开个人中心；只关闭旧的“个人中心”标签，避免误关播放页/其它页面。
     如检测到登录失效，将尝试自动重新登录后再进入个人中心。
+    pin=True（或旧页由后台任务持有）时新页加入 _pinned_pages，不会被清理多余标签时关闭。
     """
     old_page = page if page is not None and not page.is_closed() else None
+    started = time.monotonic()
 
-    new_page = await context.new_page()
-    await new_page.goto(PERSONAL_CENTER_URL, wait_until="domcontentloaded", timeout=15000)
+    new_page = await _new_page(context, "个人中心")
+    if pin or (old_page is not None and old_page in _pinned_pages):
+        _pinned_pages.add(new_page)
+    try:
+        await new_page.goto(PERSONAL_CENTER_URL, wait_until="domcontentloaded", timeout=15000)
+    except Exception:
+        _pinned_pages.discard(new_page)
+        await _release_page(new_page, reuse=False)
+        raise
     if "personalCenter" not in (new_page.url or ""):
         try:
             await new_page.goto(PERSONAL_CENTER_URL, wait_until="domcontentloaded", timeout=15000)
         except Exception:
             pass
     if new_page.url.startswith(LOGIN_URL) or "sso/login" in (new_page.url or ""):
+        if _session_keeper is not None and refocus_page is not None and _session_keeper.last_relogin_ok is not False:
+            # 播放中：交给后台重新登录，保留旧的个人中心标签，播放不等待；下次定时刷新再检查
+            _session_keeper.request_relogin()
+            _pinned_pages.discard(new_page)
+            await _release_page(new_page, reuse=False)
+            raise RuntimeError("登录失效，已在后台重新登录，播放继续")
         _log("打开个人中心跳转到登录页，检测到登录失效，自动尝试重新登录")
         username = os.getenv("DT_CRAWLER_USERNAME", "")
         password = os.getenv("DT_CRAWLER_PASSWORD", "")
         try:
-            await ensure_logged_in(new_page, username=username, password=password, open_only=False, skip_login=False)
+            if _session_keeper is not None:
+                await _session_keeper.relogin()
+            else:
+                await ensure_logged_in(new_page, username=username, password=password, open_only=False, skip_login=False)
             await new_page.goto(PERSONAL_CENTER_URL, wait_until="domcontentloaded", timeout=15000)
         except Exception as exc:
             _log(f"自动重新登录失败：{exc}")
@@ -472,10 +834,8 @@ async def _refresh_personal_center(context, page: Page | None, refocus_page: Pag
 
     # 仅当旧页本身就是个人中心时关闭它，避免误关播放页
     if old_page and old_page is not new_page and "personalCenter" in (old_page.url or ""):
-        try:
-            await old_page.close()
-        except Exception:
-            pass
+        _pinned_pages.discard(old_page)
+        await _release_page(old_page)
 
     # 保证播放页在前台
     if refocus_page:
@@ -484,6 +844,8 @@ async def _refresh_personal_center(context, page: Page | None, refocus_page: Pag
         except Exception:
             pass
 
+    emit("refresh", kind="personal_center", duration_s=round(time.monotonic() - started, 3))
+    metrics.PERSONAL_CENTER_LATENCY.observe(time.monotonic() - started)
     return new_page
 
 
@@ -559,6 +921,8 @@ async def _set_speed_2x(page: Page) -> None:
 
 
 async def _play_and_set_2x(page: Page) -> None:
+    if _lite_playback is not None:
+        await _lite_playback.apply_page(page)
     await _wait_player_ready(page)
 
     _log("点击 vjs-tech：开始播放")
@@ -572,13 +936,14 @@ async def _play_and_set_2x(page: Page) -> None:
     _log("设置倍速：点击第一个 vjs-menu-item-text（期望 2x）")
     await _set_speed_2x(page)
 
-    _log("点击全屏按钮")
-    try:
-        fs_btn = page.locator('xpath=//*[@id="vjs_video_433"]/div[4]/button[2]').first
-        if await fs_btn.count():
-            await fs_btn.click(force=True, timeout=PW_TIMEOUT_MS)
-    except Exception as exc:
-        _log(f"点击全屏按钮失败：{exc}")
+    if _lite_playback is None:
+        _log("点击全屏按钮")
+        try:
+            fs_btn = page.locator('xpath=//*[@id="vjs_video_433"]/div[4]/button[2]').first
+            if await fs_btn.count():
+                await fs_btn.click(force=True, timeout=PW_TIMEOUT_MS)
+        except Exception as exc:
+            _log(f"点击全屏按钮失败：{exc}")
 
     _log("点击 vjs-tech：恢复播放（2x）")
     await _click_vjs_tech(page, "恢复播放（2x）")
@@ -607,12 +972,70 @@ async def _recover_course_page(page: Page, url: str, reason: str) -> None:
         _log(f"重新打开课程链接仍失败（err={exc}），稍后继续尝试")
 
 
+async def _nudge_slow_tab(page: Page, efficiency: float) -> None:
+    """播放效率偏低但仍在前进（后台限流、倍速被重置）：切到前台、恢复倍速与播放。"""
+    metrics.SLOW_TAB_ACTIONS.inc(action="nudge")
+    state = await _read_video_state_js(page) or {}
+    rate = state.get("playbackRate")
+    _log(f"播放效率偏低（{efficiency:.2f}，播放器倍速 {rate}）：切到前台并恢复 {NOMINAL_PLAYBACK_RATE:g}x")
+    try:
+        await page.bring_to_front()
+    except Exception:
+        pass
+    if isinstance(rate, (int, float)) and rate < NOMINAL_PLAYBACK_RATE - 0.01:
+        try:
+            await _set_speed_2x(page)
+        except (Exception, SystemExit) as exc:
+            _log(f"恢复倍速失败（err={exc}）")
+    await _ensure_playing(page, "播放效率偏低")
+
+
+async def _reopen_course_tab(
+    context, page: Page, url: str, personal_page: Page, kind: str
+) -> tuple[Page | None, bool]:
+    """
+    关闭当前播放标签（不复用，由标签池重新准入），新标签打开课程并初始化播放；返回 (新标签, 是否打开成功)。
+    标签池一直没有空位时返回 (None, False)，由调用方跳过该课程。
+    """
+    started = time.monotonic()
+    await _release_page(page, reuse=False)
+    try:
+        page = await _new_page(context, f"重试课程 {url}", keep={personal_page})
+    except TabPoolExhausted as exc:
+        _log(f"新标签打开课程失败（{exc}），跳过该课程")
+        emit("recovery", kind=kind, url=url, ok=False, duration_s=round(time.monotonic() - started, 3))
+        return None, False
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+    except Exception as exc:
+        _log(f"新标签打开课程失败（err={exc}），继续等待下一次检测")
+        emit("recovery", kind=kind, url=url, ok=False, duration_s=round(time.monotonic() - started, 3))
+        return page, False
+
+    await _close_other_pages(context, {personal_page, page})
+    try:
+        await _play_and_set_2x(page)
+    except Exception as exc:
+        _log(f"新标签播放初始化失败（err={exc}），继续检测")
+    emit("recovery", kind=kind, url=url, ok=True, duration_s=round(time.monotonic() - started, 3))
+    return page, True
+
+
 async def _check_login_or_exit(page: Page, course_url: str) -> None:
     try:
         await page.goto(MEMBER_URL, wait_until="domcontentloaded", timeout=15000)
     except Exception:
         pass
 
+    if (page.url.startswith(LOGIN_URL) or "sso/login" in (page.url or "")) and _session_keeper is not None:
+        _log("检测到登录失效，等待后台重新登录")
+        _session_keeper.request_relogin()
+        if await _session_keeper.wait_relogin():
+            try:
+                await page.goto(MEMBER_URL, wait_until="domcontentloaded", timeout=15000)
+            except Exception:
+                pass
+
     if page.url.startswith(LOGIN_URL) or "sso/login" in (page.url or ""):
         _log("检测到登录失效，发送邮件提醒并退出")
         try:
@@ -628,6 +1051,51 @@ async def _check_login_or_exit(page: Page, course_url: str) -> None:
         pass
 
 
+class _PlaybackTotals:
+    """本进程累计的 视频前进秒数 / 观看标签墙钟秒数 / 卡住次数；worker 模式定期写入课程库，供 supervisor 自动伸缩。"""
+
+    def __init__(self) -> None:
+        self.video_s = 0.0
+        self.wall_s = 0.0
+        self.stalls = 0
+        self._reported_ts = 0.0
+
+    def add(self, video_s: float, wall_s: float) -> None:
+        self.video_s += max(0.0, video_s)
+        self.wall_s += max(0.0, wall_s)
+
+    def report(self, *, force: bool = False) -> None:
+        if not isinstance(_course_store, CourseStore):
+            return
+        now = time.monotonic()
+        if not force and now - self._reported_ts < PLAYBACK_REPORT_SECONDS:
+            return
+        self._reported_ts = now
+        try:
+            _course_store.report_playback(_worker_id, round(self.video_s, 3), round(self.wall_s, 3), self.stalls)
+        except Exception as exc:
+            _log(f"回报播放量失败：{exc}")
+
+
+_playback = _PlaybackTotals()
+
+
+def _report_account_hours(hours: float | None) -> None:
+    """
+    共用账号时记录读到的账号已完成学时（account_hours 事件，events.py summary 按其增长统计新增学时）；
+    worker 模式同时写入课程库，supervisor 据此计算账号整体的入账速度。
+    """
+    if hours is None or not _shared_account:
+        return
+    emit("account_hours", hours=hours, worker=_worker_id)
+    if not isinstance(_course_store, CourseStore):
+        return
+    try:
+        _course_store.report_account_hours(_worker_id, hours)
+    except Exception as exc:
+        _log(f"回报账号学时失败：{exc}")
+
+
 async def _watch_course(
     context,
     page: Page,
@@ -637,41 +1105,50 @@ async def _watch_course(
     state_file: Path,
     refresh_interval: int,
     completed_hours_cache: float | None,
-) -> tuple[Page | None, Page, str]:
+    next_url: str | None = None,
+) -> tuple[Page | None, Page, str, str | None]:
+    """返回 (课程页, 个人中心页, 结果, 跳过原因)；跳过原因见 retry_queue.CAUSES，其余结果为 None。"""
     if await _has_media_load_error(page):
         _log("检测到媒体加载失败提示，跳过该课程")
-        try:
-            await page.close()
-        except Exception:
-            pass
-        return None, personal_page, "skipped"
+        emit("media_error", url=url, course_no=course_no)
+        await _release_page(page, reuse=False)
+        return None, personal_page, "skipped", "media_error"
 
     _log("进入课程页，开始播放")
     await _play_and_set_2x(page)
 
     last_cur: int | None = None
     last_progress_ts = time.monotonic()
+    last_read_ts = time.monotonic()
+    playback_rate = NOMINAL_PLAYBACK_RATE
+    progressing = False
     refresh_attempts = 0
     missing_time_count = 0
     completion_candidate_ts: float | None = None
     periodic_refresh_ts = time.monotonic()
     post_refresh_check = False
     small_start_count = 0
+    video_reported = False
+    meter_ts = time.monotonic()
+    slow_reopened = 0
+    monitor = PlaybackMonitor(url, NOMINAL_PLAYBACK_RATE, sink=_playback)
 
     while True:
         if await _has_media_load_error(page):
             _log("播放过程中检测到媒体加载失败提示，跳过该课程")
-            try:
-                await page.close()
-            except Exception:
-                pass
-            return None, personal_page, "skipped"
+            emit("media_error", url=url, course_no=course_no, current=last_cur)
+            await _release_page(page, reuse=False)
+            return None, personal_page, "skipped", "media_error"
 
         current_text = ""
         duration_text = ""
         try:
+            read_started = time.monotonic()
             current_text = ((await page.locator(".vjs-current-time-display").first.inner_text()) or "").strip()
+            metrics.CDP_LATENCY.observe(time.monotonic() - read_started, op="inner_text")
+            read_started = time.monotonic()
             duration_text = ((await page.locator(".vjs-duration-display").first.inner_text()) or "").strip()
+            metrics.CDP_LATENCY.observe(time.monotonic() - read_started, op="inner_text")
         except Exception:
             pass
 
@@ -687,25 +1164,95 @@ async def _watch_course(
                 if dur is None and isinstance(js_state.get("duration"), (int, float)):
                     dur = int(js_state["duration"])
 
+        if dur is not None and not video_reported:
+            # 视频时长与起始位置：simulate.py 据此从事件日志重建每门课的时间线
+            emit("video", url=url, course_no=course_no, duration=dur, start=cur)
+            video_reported = True
+
         _log(f"current={current_text} duration={duration_text}")
         if completed_hours_cache is not None:
             print(f"已看学时：{_format_hours_value(completed_hours_cache)}")
         else:
             print("已看学时：未知")
 
+        progressing = False
+        advanced = 0.0
         if cur is not None:
+            now_ts = time.monotonic()
             if last_cur is None:
+                # 新标签重试后的第一次读数：只作为基准，不清零重试次数（否则永远达不到跳过上限）
                 last_cur = cur
-                last_progress_ts = time.monotonic()
-                refresh_attempts = 0
+                last_progress_ts = now_ts
                 missing_time_count = 0
             elif cur != last_cur:
+                progressing = cur > last_cur
+                if progressing:
+                    playback_rate = _estimate_playback_rate(playback_rate, cur, last_cur, now_ts - last_read_ts)
+                    # 刷新后播放器跳到服务端记录的位置等大跨度跳转不算播放量
+                    advanced = min(cur - last_cur, (now_ts - last_read_ts) * 4.0)
                 last_cur = cur
-                last_progress_ts = time.monotonic()
+                last_progress_ts = now_ts
                 refresh_attempts = 0
                 missing_time_count = 0
+            last_read_ts = now_ts
         else:
             missing_time_count += 1
+        elapsed = time.monotonic() - meter_ts
+        meter_ts = time.monotonic()
+        # 最后一个窗口内不评估：结尾停在最后一秒会拉低效率
+        near_end = cur is not None and dur is not None and (
+            _completion_threshold(dur) - cur <= monitor.window_seconds * NOMINAL_PLAYBACK_RATE
+        )
+        # 同一份读数同时计入进程累计（_playback，供自动伸缩）与本标签的效率窗口
+        verdict = monitor.add(advanced, elapsed, evaluate=not near_end)
+        _playback.report()
+        if verdict == "slow":
+            action_started = time.monotonic()
+            await _nudge_slow_tab(page, monitor.efficiency)
+            monitor.exclude(time.monotonic() - action_started)
+        elif verdict == "recover":
+            state = await _read_video_state_js(page) or {}
+            player_rate = state.get("playbackRate")
+            slow_action = _slow_tab_action(slow_reopened, player_rate)
+            if slow_action == "player_rate":
+                # 偏慢窗口里已设置过 2x 仍停在该倍速：是播放器限制而不是标签被限流，后续按其倍速评估
+                _log(f"播放器倍速停在 {player_rate:g}x、不接受 {NOMINAL_PLAYBACK_RATE:g}x：不换标签，按 {player_rate:g}x 评估效率")
+                metrics.SLOW_TAB_ACTIONS.inc(action="accept")
+                monitor.accept(float(player_rate))
+            elif slow_action == "accept":
+                _log(f"已换新标签 {slow_reopened} 次播放效率仍偏低（{monitor.efficiency:.2f}）：接受当前倍速继续播放")
+                metrics.SLOW_TAB_ACTIONS.inc(action="accept")
+                monitor.accept()
+            elif slow_action == "skip":
+                _log(f"已换新标签 {slow_reopened} 次播放效率仍偏低（{monitor.efficiency:.2f}）：跳过该课程")
+                metrics.SLOW_TAB_ACTIONS.inc(action="skip")
+                await _release_page(page, reuse=False)
+                return None, personal_page, "skipped", "slow"
+            else:
+                # 定时刷新只是 reload，限流的标签刷新后往往仍然偏慢：换新标签（次数单独计，不计入卡住重试次数）
+                slow_reopened += 1
+                _log(
+                    f"播放效率连续 {monitor.strikes} 个窗口偏低（{monitor.efficiency:.2f}），"
+                    f"关闭当前标签并新标签重新播放（{slow_reopened}/{SLOW_TAB_RETRIES}）"
+                )
+                metrics.SLOW_TAB_ACTIONS.inc(action="new_tab")
+                action_started = time.monotonic()
+                page, _ = await _reopen_course_tab(context, page, url, personal_page, "slow_tab")
+                if page is None:
+                    return None, personal_page, "skipped", "navigation"
+                last_cur = None
+                last_progress_ts = time.monotonic()
+                completion_candidate_ts = None
+                periodic_refresh_ts = time.monotonic()
+                monitor.reset()
+                monitor.exclude(time.monotonic() - action_started)
+                continue
+
+        # 最后一分钟内预取下一门课，课程切换时直接接管已加载好的标签
+        if next_url and _prefetch is not None and progressing and dur is not None:
+            remaining_s = max(0, _completion_threshold(dur) - cur) / max(playback_rate, 0.25)
+            if remaining_s <= _prefetch.lead_seconds:
+                await _prefetch.start(context, next_url)
 
         if post_refresh_check and cur is not None:
             if cur < 66:
@@ -714,17 +1261,16 @@ async def _watch_course(
                 _log(f"定时刷新后起始时间<66s（第{small_start_count}次）")
                 if small_start_count >= 2:
                     _log("连续2次刷新后起始时间<66s，判定已看完本课，跳过该课程")
-                    try:
-                        await page.close()
-                    except Exception:
-                        pass
-                    return None, personal_page, "skipped_force"
+                    await _release_page(page)
+                    return None, personal_page, "skipped_force", None
             else:
                 small_start_count = 0
             post_refresh_check = False
 
         if refresh_interval > 0 and time.monotonic() - periodic_refresh_ts >= refresh_interval:
             _log(f"每隔{refresh_interval}s刷新播放页面并重新播放")
+            refresh_started = time.monotonic()
+            metrics.RECOVERY_ACTIONS.inc(level="reload")
             await _recover_course_page(page, url, "定时刷新")
             # 同步刷新个人中心：新开个人中心标签，若旧标签也是个人中心则关闭，播放页保持前台
             try:
@@ -734,50 +1280,59 @@ async def _watch_course(
                     await page.bring_to_front()
                 except Exception:
                     pass
-                await _save_storage_state(context, state_file)
-                _log(f"已保存登录态：{state_file}")
+                saved = await _save_storage_state(context, state_file)
+                # 个人中心刚刚正常打开，说明登录态有效
+                mark_session_verified(state_file)
+                if saved:
+                    _log(f"已保存登录态：{state_file}")
             except Exception as exc:
                 _log(f"定时刷新个人中心失败：{exc}")
             try:
                 await _play_and_set_2x(page)
             except Exception as exc:
                 _log(f"定时刷新后重播失败（err={exc}）")
+            emit("refresh", kind="course_periodic", url=url, duration_s=round(time.monotonic() - refresh_started, 3))
+            monitor.exclude(time.monotonic() - refresh_started)
             periodic_refresh_ts = time.monotonic()
             post_refresh_check = True
 
-        if time.monotonic() - last_progress_ts >= 60 or missing_time_count >= 6:
-            if refresh_attempts >= 3:
+        stall_action = _stall_action(time.monotonic() - last_progress_ts, missing_time_count, refresh_attempts)
+        if stall_action is not None:
+            if stall_action == "skip":
                 _log("播放多次重试仍未变化：跳过该课程")
-                try:
-                    await page.close()
-                except Exception:
-                    pass
-                return None, personal_page, "skipped"
+                metrics.RECOVERY_ACTIONS.inc(level="skip")
+                # 卡在登录页说明是登录态问题而不是课程本身
+                cause = "login" if "sso/login" in (page.url or "") or (page.url or "").startswith(LOGIN_URL) else "stall"
+                await _release_page(page, reuse=False)
+                return None, personal_page, "skipped", cause
 
             refresh_attempts += 1
-            if missing_time_count >= 6:
-                _log(f"连续多次无法读取播放时间，关闭当前标签并新标签重试（{refresh_attempts}/3）")
+            _playback.stalls += 1
+            recovery_started = time.monotonic()
+            metrics.RECOVERY_ACTIONS.inc(level="new_tab")
+            emit(
+                "stall",
+                url=url,
+                course_no=course_no,
+                reason="no_time" if missing_time_count >= STALL_MISSES else "no_progress",
+                attempt=refresh_attempts,
+                current=last_cur,
+                stalled_s=round(recovery_started - last_progress_ts, 3),
+            )
+            if missing_time_count >= STALL_MISSES:
+                _log(f"连续多次无法读取播放时间，关闭当前标签并新标签重试（{refresh_attempts}/{STALL_RETRIES}）")
             else:
-                _log(f"播放 60s 未变化，关闭当前标签并新标签重试（{refresh_attempts}/3）")
-            try:
-                await page.close()
-            except Exception:
-                pass
-            page = await context.new_page()
-            try:
-                await page.goto(url, wait_until="domcontentloaded", timeout=15000)
-            except Exception as exc:
-                _log(f"新标签打开课程失败（err={exc}），继续等待下一次检测")
+                _log(f"播放 {STALL_SECONDS:g}s 未变化，关闭当前标签并新标签重试（{refresh_attempts}/{STALL_RETRIES}）")
+            page, opened = await _reopen_course_tab(context, page, url, personal_page, "new_tab")
+            if page is None:
+                return None, personal_page, "skipped", "navigation"
+            monitor.reset()
+            monitor.exclude(time.monotonic() - recovery_started)
+            if not opened:
                 last_progress_ts = time.monotonic()
                 last_cur = None
                 continue
 
-            await _close_other_pages(context, {personal_page, page})
-            try:
-                await _play_and_set_2x(page)
-            except Exception as exc:
-                _log(f"新标签播放初始化失败（err={exc}），继续检测")
-
             last_progress_ts = time.monotonic()
             last_cur = None
             missing_time_count = 0
@@ -786,25 +1341,67 @@ async def _watch_course(
 
         #如果当前时间、总时间都存在，而且当前时间接近总时间，说明可能播放完（播放完成后会卡在最后一秒）
         ended = bool(js_state.get("ended")) if isinstance(js_state, dict) else False
-        if cur is not None and dur is not None and cur >= max(dur - 1, 88):
+        if cur is not None and dur is not None and cur >= _completion_threshold(dur):
             now_ts = time.monotonic()
             if completion_candidate_ts is None:
                 completion_candidate_ts = now_ts
-            elif now_ts - completion_candidate_ts >= 3:
-                if ended or await _is_replay_state(page):
-                    try:
-                        await page.reload(wait_until="domcontentloaded", timeout=15000)
-                    except Exception:
-                        pass
-                    print(f"【{_ts_full()} 第{course_no}个课程 {url} 已看完。】")
-                    return page, personal_page, "completed"
+            # ended / Replay 状态即可确认播完；未出现前按 POLL_MIN_SECONDS 密集检测
+            if ended or await _is_replay_state(page):
+                try:
+                    await page.reload(wait_until="domcontentloaded", timeout=15000)
+                except Exception:
+                    pass
+                print(f"【{_ts_full()} 第{course_no}个课程 {url} 已看完。】")
+                return page, personal_page, "completed", None
         else:
             completion_candidate_ts = None
 
-        await page.wait_for_timeout(10000)
+        if completion_candidate_ts is not None:
+            delay, phase = POLL_MIN_SECONDS, "completing"
+        else:
+            until_refresh = None
+            if refresh_interval > 0:
+                until_refresh = max(0.0, refresh_interval - (time.monotonic() - periodic_refresh_ts))
+            delay, phase = _next_poll_delay(cur, dur, playback_rate, progressing=progressing, until_refresh=until_refresh)
+        metrics.WATCH_POLL_DELAY.observe(delay, phase=phase)
+        await page.wait_for_timeout(delay * 1000)
+
+
+async def _new_page(context, reason: str = "", *, keep: set[Page] | None = None) -> Page:
+    """
+    从标签池取标签；池满等待超时后先取消下一门课的预取，调用方给出 keep 时再关闭 keep 与固定页之外的标签，
+    然后再等一轮，仍然没有空位才抛出 TabPoolExhausted。
+    """
+    if _tab_pool is not None and _tab_pool.context is context:
+        try:
+            return await _tab_pool.acquire(reason)
+        except TabPoolExhausted as exc:
+            _log(f"{exc}，释放预取与多余标签后重试：{reason}")
+            if _prefetch is not None:
+                await _prefetch.cancel()
+            if keep is not None:
+                await _close_other_pages(context, keep)
+            return await _tab_pool.acquire(reason)
+    return await context.new_page()
+
+
+async def _release_page(page: Page | None, *, reuse: bool = True) -> None:
+    if page is None:
+        return
+    if _tab_pool is not None and page.context is _tab_pool.context:
+        await _tab_pool.release(page, reuse=reuse)
+        return
+    try:
+        await page.close()
+    except Exception:
+        pass
 
 
 async def _close_other_pages(context, keep_pages: set[Page]) -> None:
+    keep_pages = set(keep_pages) | {p for p in _pinned_pages if not p.is_closed()}
+    if _tab_pool is not None and _tab_pool.context is context:
+        await _tab_pool.prune(keep_pages)
+        return
     for p in list(context.pages):
         if p in keep_pages:
             continue
@@ -814,31 +1411,335 @@ async def _close_other_pages(context, keep_pages: set[Page]) -> None:
             pass
 
 
+class _CoursePrefetch:
+    """在后台打开下一门课并等播放器就绪后暂停，课程切换时交给观看循环直接使用。"""
+
+    def __init__(self, lead_seconds: float) -> None:
+        self.lead_seconds = lead_seconds
+        self.url: str | None = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self, context, url: str) -> None:
+        if self.lead_seconds <= 0 or self.url == url:
+            return
+        # 等上一个预取真正结束并归还标签，否则被取消的预取页一直占着标签池名额
+        await self.cancel()
+        self.url = url
+        self.task = asyncio.create_task(self._open(context, url))
+
+    async def _open(self, context, url: str) -> Page | None:
+        started = time.monotonic()
+        page = None
+        ready = False
+        try:
+            page = await _new_page(context, f"预取课程 {url}")
+            _pinned_pages.add(page)
+            _log(f"预取下一门课：\n{url}")
+            await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+            if _lite_playback is not None:
+                await _lite_playback.apply_page(page)
+            await _wait_player_ready(page)
+            await page.evaluate(
+                "() => { const v = document.querySelector('video.vjs-tech'); if (v && !v.paused) v.pause(); }"
+            )
+            emit("prefetch", url=url, ok=True, duration_s=round(time.monotonic() - started, 3))
+            ready = True
+            return page
+        except (Exception, SystemExit) as exc:
+            # 预取只是优化：失败时切换课程按原流程打开
+            _log(f"预取下一门课失败（err={exc}）")
+            emit("prefetch", url=url, ok=False, duration_s=round(time.monotonic() - started, 3))
+            return None
+        finally:
+            # 失败或在 goto / 等待播放器时被取消（CancelledError 不属于 Exception）：释放标签，不留在 _pinned_pages
+            if not ready and page is not None:
+                _pinned_pages.discard(page)
+                await _release_page(page, reuse=False)
+
+    async def take(self, url: str) -> Page | None:
+        """取出 url 对应的预取页；没有预取或预取的是别的课程时返回 None。"""
+        if self.task is None or self.url != url:
+            await self.cancel()
+            return None
+        task, self.task, self.url = self.task, None, None
+        try:
+            page = await task
+        except Exception:
+            page = None
+        if page is None:
+            return None
+        _pinned_pages.discard(page)
+        if page.is_closed():
+            return None
+        return page
+
+    async def cancel(self) -> None:
+        task, self.task, self.url = self.task, None, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            page = await task
+        except (Exception, asyncio.CancelledError):
+            page = None
+        if page is not None:
+            _pinned_pages.discard(page)
+            await _release_page(page)
+
+
+async def _account_course(
+    context,
+    baseline: "asyncio.Task | float | None",
+    url_file: Path | None,
+    url: str,
+    course_no: int,
+    status: str,
+    duration_s: float,
+    cause: str | None = None,
+) -> tuple[float | None, bool]:
+    """
+    课程结束后的学时核算：在单独的个人中心标签读取课后学时、记录增量并更新 URL 文件，与下一门课的播放并行。
+    baseline 为上一门课的核算任务（其课后学时即本课开课前学时）或初始学时；返回 (课后学时, 是否已 100%)。
+    """
+    if isinstance(baseline, asyncio.Task):
+        try:
+            pre_hours, _ = await baseline
+        except Exception:
+            pre_hours = None
+    else:
+        pre_hours = baseline
+
+    page: Page | None = None
+    after_hours = None
+    done = False
+    try:
+        page = await _refresh_personal_center(context, None, pin=True)
+        await page.wait_for_timeout(1500)
+        after_hours = await _read_watched_hours_value(page)
+        done, page = await _print_progress(context, page)
+    except Exception as exc:
+        _log(f"课程结束后读取学时失败：{exc}")
+    finally:
+        if page is not None:
+            _pinned_pages.discard(page)
+            await _release_page(page)
+
+    diff_hours = None
+    if _shared_account and after_hours is not None:
+        _log(f"账号已完成学时：{_format_hours_value(after_hours)}课时（多个进程共用账号，不按差值归属本课）")
+        metrics.COMPLETED_HOURS.set(after_hours)
+        _report_account_hours(after_hours)
+    elif pre_hours is not None and after_hours is not None:
+        diff_hours = after_hours - pre_hours
+        _log(f"本课新增学时：{_format_hours_value(diff_hours)}课时")
+        _append_watched_diff(url, diff_hours, label="差值")
+        emit("hours_delta", url=url, before=pre_hours, after=after_hours, delta=round(diff_hours, 4))
+        if diff_hours > 0:
+            metrics.CREDITED_HOURS.inc(diff_hours)
+        metrics.COMPLETED_HOURS.set(after_hours)
+    credited = diff_hours is not None and diff_hours != 0
+    if credited:
+        status = "completed"
+    # 单账号：只有确实新增了学时（或判定已看完）才删除 URL，播放到结尾却没入账的课程留在文件里下次再看；
+    # 共用账号时没有本课差值，按本标签播放到结尾（completed）删除。
+    # 多进程模式下由 supervisor 在结束时统一改写 URL 文件，避免多个进程同时写
+    if url_file is not None and (
+        credited or status == "skipped_force" or (_shared_account and status == "completed")
+    ):
+        _remove_url_from_file(url_file, url)
+    if _course_store is not None:
+        await _store_call("finish", url, status, diff_hours, cause)
+    _record_retry(url, status, cause)
+    metrics.COURSES.inc(status=status)
+    emit(
+        "course_end",
+        url=url,
+        course_no=course_no,
+        status=status,
+        cause=cause if status == "skipped" else None,
+        delta=diff_hours,
+        duration_s=duration_s,
+    )
+    # 读取失败时沿用开课前学时，后续课程仍能计算增量
+    return (after_hours if after_hours is not None else pre_hours), done
+
+
+def _record_retry(url: str, status: str, cause: str | None) -> None:
+    """看完的课程清除失败记录；跳过的课程按原因记入重试队列（退避或隔离）。coordinator 模式由 coordinator 记录。"""
+    if _retry_queue is None:
+        return
+    entry = _retry_queue.record(_course_id(url), url, status, cause)
+    if entry is None:
+        return
+    metrics.COURSE_FAILURES.inc(cause=cause)
+    next_retry_s = max(0.0, entry["next_retry_at"] - time.time())
+    if entry["quarantined"]:
+        _log(f"课程已隔离（失败 {entry['failures']} 次，最近原因 {cause}），不再自动重试：{url}")
+    else:
+        _log(f"课程跳过（{cause}），{next_retry_s / 60:.0f} 分钟后重试（第 {entry['failures']} 次失败）")
+    emit(
+        "course_retry",
+        url=url,
+        cause=cause,
+        failures=entry["failures"],
+        next_retry_s=round(next_retry_s, 1),
+        quarantined=bool(entry["quarantined"]),
+    )
+
+
+async def _store_call(method: str, *args, **kwargs):
+    """
+    调用课程库方法。CoordinatorClient 是带退避重试的阻塞 HTTP 请求（最坏约 40s），放到线程里执行，
+    不卡住事件循环上的下一门课、后台保活与指标端点；本地 sqlite 课程库直接调用。
+    """
+    fn = getattr(_course_store, method)
+    if isinstance(_course_store, CoordinatorClient):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def _claim_courses(store: CourseStore | CoordinatorClient, worker_id: str, args: argparse.Namespace) -> _CourseQueue:
+    # 课程库标记全部完成后 claim 恒为 None；follow 时照常等到空闲超时，由 stop 提前结束
+    # supervisor --autoscale 减少 worker 时在课程库设置 drain:<worker_id>：看完手头的课后退出
+    def draining() -> bool:
+        return store.flag(f"drain:{worker_id}") is not None
+
+    if isinstance(store, CoordinatorClient):
+        # coordinator 不可达时 claim 会退避重试：放到线程里，不阻塞后台的学时核算与保活；
+        # 预读下一门只试一次，失败就不预取，不耽误当前课程开播
+        return _CourseQueue(
+            lambda: asyncio.to_thread(store.claim, worker_id),
+            follow=args.follow,
+            idle_seconds=float(args.follow_idle),
+            pull_nowait=lambda: asyncio.to_thread(store.claim, worker_id, retry_seconds=0),
+        )
+    return _CourseQueue(
+        lambda: store.claim(worker_id),
+        follow=args.follow,
+        idle_seconds=float(args.follow_idle),
+        draining=draining,
+    )
+
+
 async def main(argv: list[str] | None = None) -> None:
+    global _worker_id, _course_store, _retry_queue, _shared_account
     load_local_secrets()
 
     args = parse_args(argv)
+    profiling.enable_from_env(args.profile_cdp)
+    _parse_shard(args.shard)
+
+    # coordinator 模式下跳过原因随结果回报，由 coordinator 统一记录
+    if not args.no_retry_queue and not args.coordinator:
+        _retry_queue = RetryQueue(Path(args.retry_queue))
+
+    if args.workers > 1 and not args.worker_id and not args.coordinator:
+        url_file = Path(str(args.url_file)) if args.url_file else _pick_url_file()
+        items = _initial_items(url_file, args)
+        worker_argv = list(argv) if argv is not None else sys.argv[1:]
+        if not args.url_file:
+            worker_argv += ["--url-file", str(url_file)]
+        code = run_supervisor(
+            worker_argv,
+            _retry_filter(items, []),
+            url_file,
+            args.workers,
+            store_path=Path(args.course_store),
+            metrics_port=int(args.metrics_port),
+            remove_url=_remove_url_from_file,
+            follow=(
+                _UrlFollower(url_file, lines_range=args.lines, shard=_parse_shard(args.shard), seen=(u for _, u in items))
+                if args.follow
+                else None
+            ),
+            autoscaler=(
+                Autoscaler(args.workers, min_workers=args.autoscale_min, interval=float(args.autoscale_interval))
+                if args.autoscale
+                else None
+            ),
+        )
+        if code:
+            raise SystemExit(code)
+        return
+    if args.coordinator:
+        _worker_id = str(args.worker_id or f"{socket.gethostname()}-{os.getpid()}")
+        _course_store = CoordinatorClient(args.coordinator, _worker_id)
+    elif args.worker_id:
+        _worker_id = str(args.worker_id)
+        _course_store = CourseStore(Path(args.course_store))
+    # --shard：其他分片的进程用同一账号同时在看
+    _shared_account = _course_store is not None or bool(args.shard)
 
     username = os.getenv("DT_CRAWLER_USERNAME") or ""
     password = os.getenv("DT_CRAWLER_PASSWORD") or ""
 
     async with async_playwright() as p:
-        endpoint = os.getenv("PLAYWRIGHT_CDP_ENDPOINT", "http://127.0.0.1:53333")
-        browser = await connect_chrome_over_cdp(p, endpoint)
-
-        # 优先复用已有 context；若没有则新建，并禁用默认 viewport 以便窗口大小可自由调整
-        state_file_path = Path(os.getenv("DT_STORAGE_STATE_FILE", STATE_FILE)).resolve()
-        state_exists = state_file_path.exists()
-        # 始终新建专用 context 并加载 storage_state（若存在）
-        context = await browser.new_context(
-            storage_state=str(state_file_path) if state_exists else None,
-            viewport=None,  # 跟随窗口尺寸，避免内容区域被固定
-        )
-        using_existing_context = False
-        context.set_default_timeout(PW_TIMEOUT_MS)
+        # supervisor 的 worker 已按编号分到各自的首选浏览器（PLAYWRIGHT_CDP_ENDPOINT 轮换顺序），只连首选，断开后再依次换下一个
+        browsers = BrowserPool(p, label="watch", spread=not isinstance(_course_store, CourseStore))
+        await browsers.connect()
+        metrics_server = None
+        if int(args.metrics_port) > 0:
+            metrics_server = await metrics.start_metrics_server(int(args.metrics_port))
+        emit("run_start", argv=argv, refresh_interval=int(args.refresh_interval))
+        poll_cap = _poll_cap(int(args.refresh_interval))
+        if poll_cap <= POLL_BASE_SECONDS * 3:
+            # 默认 30s 刷新、60s 卡住判定下最长只等 30s：远离结尾时也不会明显少检测
+            _log(
+                f"自适应轮询最长等待 {poll_cap:g}s（受 DT_POLL_MAX_SECONDS、DT_STALL_SECONDS/2 与刷新间隔限制）；"
+                "要在远离结尾时减少检测，需同时调大这三项"
+            )
+        try:
+            while True:
+                slot = await browsers.pick()
+                try:
+                    await _run_on_browser(args, browsers, slot, username, password)
+                    break
+                except (Exception, SystemExit) as exc:
+                    if not browsers.lost(slot, exc):
+                        raise
+                # 浏览器中途断开：归还领取中的课程（不是课程本身的问题，不计入重试次数），换浏览器重新建立会话继续观看
+                # （URL 文件模式下未看完的课程仍在文件中，重新读取即从断点继续）
+                if _course_store is not None:
+                    requeued = await _store_call("release_worker", _worker_id, count_attempt=False)
+                    _log(f"已归还 {requeued} 门领取中的课程")
+        finally:
+            emit("run_end")
+            if _course_store is not None:
+                _course_store.close()
+                _course_store = None
+            if _retry_queue is not None:
+                _retry_queue.close()
+                _retry_queue = None
+            if metrics_server is not None:
+                metrics_server.close()
+
+
+async def _run_on_browser(args: argparse.Namespace, browsers: BrowserPool, slot, username: str, password: str) -> None:
+    global _session_keeper, _tab_pool, _lite_playback, _prefetch
+    browser = slot.browser
+
+    # 优先复用已有 context；若没有则新建，并禁用默认 viewport 以便窗口大小可自由调整
+    state_file_path = Path(os.getenv("DT_STORAGE_STATE_FILE", STATE_FILE)).resolve()
+    state_exists = state_file_path.exists()
+    # 始终新建专用 context 并加载 storage_state（若存在）
+    context = await browser.new_context(
+        storage_state=str(state_file_path) if state_exists else None,
+        viewport=None,  # 跟随窗口尺寸，避免内容区域被固定
+    )
+    using_existing_context = False
+    context.set_default_timeout(PW_TIMEOUT_MS)
+    _tab_pool = TabPool(context, label="watch")
+    browsers.register(slot, _tab_pool)
+    _prefetch = _CoursePrefetch(float(args.prefetch_seconds))
+    blocker = None
+    try:
+        blocker = await apply_block_profile(context, args.block_profile, label="watch")
+        if args.lite_playback:
+            _lite_playback = LitePlayback(label="watch")
+            await _lite_playback.apply(context)
 
         # 新建个人中心页；关闭其它空白页
-        personal_page = await context.new_page()
+        personal_page = await _new_page(context, "个人中心")
         for p in list(context.pages):
             if p is personal_page:
                 continue
@@ -848,99 +1749,167 @@ async def main(argv: list[str] | None = None) -> None:
                 except Exception:
                     pass
 
-        await ensure_logged_in(personal_page, username=username, password=password, open_only=False, skip_login=False)
+        # 登录态新鲜或 HTTP 探测有效时，不再加载登录页确认
+        if not (state_exists and await verify_session(context, state_file_path)):
+            await ensure_logged_in(personal_page, username=username, password=password, open_only=False, skip_login=False)
 
         if not using_existing_context:
             await _close_other_pages(context, {personal_page})
 
-        personal_page = await _refresh_personal_center(context, personal_page)
-        await personal_page.wait_for_timeout(1000)
-        initial_hours = await _read_watched_hours_value(personal_page)
-        done_initial, personal_page = await _print_progress(context, personal_page)
-        if done_initial:
-            await _close_other_pages(context, {personal_page})
-            return
-
+        _session_keeper = SessionKeeper(
+            browser, context, state_file_path, username, password, interval=int(args.keepalive_interval)
+        )
+        _session_keeper.start()
+        await _watch_all(args, context, personal_page, using_existing_context)
+    finally:
+        if _session_keeper is not None:
+            await _session_keeper.stop()
+            _session_keeper = None
+        await _prefetch.cancel()
+        _prefetch = None
+        _pinned_pages.clear()
+        browsers.unregister(slot, _tab_pool)
+        try:
+            await _tab_pool.close()
+        except Exception:
+            # 浏览器已断开时标签无法关闭，忽略
+            pass
+        _tab_pool = None
+        if blocker is not None:
+            blocker.report()
+        if _lite_playback is not None:
+            _lite_playback.report()
+            _lite_playback = None
+
+
+async def _watch_all(args: argparse.Namespace, context, personal_page: Page, using_existing_context: bool) -> None:
+    personal_page = await _refresh_personal_center(context, personal_page)
+    await personal_page.wait_for_timeout(1000)
+    initial_hours = await _read_watched_hours_value(personal_page)
+    _report_account_hours(initial_hours)
+    done_initial, personal_page = await _print_progress(context, personal_page)
+    if done_initial:
+        if _course_store is not None:
+            await _store_call("set_flag", "all_done")
         await _close_other_pages(context, {personal_page})
+        return
 
-        url_file = Path(str(args.url_file)) if args.url_file else _pick_url_file()
-        items = list(_iter_urls(url_file, lines_range=args.lines))
-        if not items:
-            raise SystemExit(f"未找到任何 https URL：{url_file}（lines={args.lines!r}）")
-
-        _log(f"读取到课程数量：{len(items)}（file={str(url_file)!r} lines={args.lines!r}）")
-
-        prev_course_page: Page | None = None
-        completed_hours_cache: float | None = initial_hours
-
-        for course_no, (line_no, url) in enumerate(items, start=1):
-            # 开课前刷新个人中心并记录“开课前”学时
-            personal_page = await _refresh_personal_center(context, personal_page)
-            await personal_page.wait_for_timeout(1000)
-            pre_hours = await _read_watched_hours_value(personal_page)
-            done_pre, personal_page = await _print_progress(context, personal_page)
-            if done_pre:
-                await _close_other_pages(context, {personal_page})
-                return
-            if pre_hours is not None:
-                completed_hours_cache = pre_hours
-
-            course_page = await context.new_page()
-            _log(f"新标签打开课程：\n{url}")
-            await course_page.goto(url, wait_until="domcontentloaded", timeout=15000)
-
-            if prev_course_page is not None:
-                await _close_other_pages(context, {personal_page, course_page, prev_course_page})
-            else:
-                await _close_other_pages(context, {personal_page, course_page})
+    await _close_other_pages(context, {personal_page})
 
-            if prev_course_page is not None:
-                await course_page.wait_for_timeout(2000)
+    if _course_store is not None:
+        # worker：从共享课程库逐门领取；下一门在本门开始时预先领取，以便预取
+        url_file = None
+        queue = _claim_courses(_course_store, _worker_id, args)
+        _log(f"worker {_worker_id} 从课程队列领取课程：{_course_store.location}")
+    else:
+        url_file = Path(str(args.url_file)) if args.url_file else _pick_url_file()
+        items = _initial_items(url_file, args)
+        _log(f"读取到课程数量：{len(items)}（file={str(url_file)!r} lines={args.lines!r} shard={args.shard!r}）")
+        queue = _url_file_queue(url_file, items, args)
+        if args.follow:
+            _log(f"跟随 URL 文件新增课程（空闲 {float(args.follow_idle):g}s 后结束）")
+
+    prev_course_page: Page | None = None
+    completed_hours_cache: float | None = initial_hours
+    # 上一门课的学时核算在后台进行；其课后学时即下一门课的开课前学时
+    accounting: asyncio.Task | None = None
+
+    def all_done() -> bool:
+        # 跟随等待期间，上一门课的核算显示已全部看完时不再等待新课程
+        if accounting is None or not accounting.done() or accounting.cancelled() or accounting.exception() is not None:
+            return False
+        return bool(accounting.result()[1])
+
+    upcoming = await queue.next()
+    try:
+        while upcoming is not None:
+            course_no, line_no, url = upcoming
+            # 预取用的下一门课只取已有的，不为它等待
+            upcoming = await queue.next(wait=False)
+            if accounting is not None and not accounting.done():
+                # 核算通常几秒完成；预取的下一门课已加载好、处于暂停，等待不影响其加载
                 try:
-                    await prev_course_page.close()
+                    await asyncio.wait_for(asyncio.shield(accounting), timeout=ACCOUNTING_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    _log(f"上一门课的学时核算 {ACCOUNTING_WAIT_SECONDS:g}s 未完成，先开始下一门课")
                 except Exception:
                     pass
+            if accounting is not None and accounting.done() and not accounting.cancelled() and accounting.exception() is None:
+                after_hours, done_after = accounting.result()
+                if after_hours is not None:
+                    completed_hours_cache = after_hours
+                if done_after:
+                    if _course_store is not None:
+                        await _store_call("set_flag", "all_done")
+                    await _close_other_pages(context, {personal_page})
+                    return
 
-            prev_course_page = course_page
-
-            course_page, personal_page, status = await _watch_course(
-                context,
-                course_page,
-                url,
-                course_no,
-                personal_page,
-                STATE_FILE,
-                int(args.refresh_interval),
-                completed_hours_cache,
-            )
-            prev_course_page = course_page
-
-            _log("课程结束：刷新个人中心并计算本课增量")
-            personal_page = await _refresh_personal_center(context, personal_page, refocus_page=course_page)
-            await personal_page.wait_for_timeout(1500)
-            after_hours = await _read_watched_hours_value(personal_page)
-            done_after, personal_page = await _print_progress(context, personal_page)
-            diff_hours = None
-            if pre_hours is not None and after_hours is not None:
-                diff_hours = after_hours - pre_hours
-                _log(f"本课新增学时：{_format_hours_value(diff_hours)}课时")
-                _append_watched_diff(url, diff_hours, label="差值")
-                completed_hours_cache = after_hours
-            if diff_hours is not None and diff_hours != 0:
-                _remove_url_from_file(url_file, url)
-                status = "completed"
-            elif status == "skipped_force":
-                _remove_url_from_file(url_file, url)
+            course_started = time.monotonic()
+            emit("course_start", url=url, course_no=course_no, line_no=line_no, hours_before=completed_hours_cache)
+            course_page = await _prefetch.take(url) if _prefetch is not None else None
+            if course_page is not None:
+                _log(f"使用预取标签开始课程：\n{url}")
+            else:
+                try:
+                    course_page = await _new_page(
+                        context, f"课程 {url}", keep={p for p in (personal_page, prev_course_page) if p is not None}
+                    )
+                    _log(f"新标签打开课程：\n{url}")
+                    await course_page.goto(url, wait_until="domcontentloaded", timeout=15000)
+                except Exception as exc:
+                    # 浏览器断开时交给 main 换浏览器；单门课程打不开则记入重试队列，继续下一门
+                    if context.browser is not None and not context.browser.is_connected():
+                        raise
+                    _log(f"打开课程失败：{exc}")
+                    emit("navigation_error", url=url, course_no=course_no, error=str(exc))
+                    await _release_page(course_page, reuse=False)
+                    course_page = None
+
+            if course_page is None:
+                status, cause = "skipped", "navigation"
+            else:
+                if prev_course_page is not None:
+                    await _close_other_pages(context, {personal_page, course_page, prev_course_page})
+                    await course_page.wait_for_timeout(2000)
+                    await _release_page(prev_course_page)
+                else:
+                    await _close_other_pages(context, {personal_page, course_page})
+
+                prev_course_page = course_page
+
+                course_page, personal_page, status, cause = await _watch_course(
+                    context,
+                    course_page,
+                    url,
+                    course_no,
+                    personal_page,
+                    STATE_FILE,
+                    int(args.refresh_interval),
+                    completed_hours_cache,
+                    next_url=upcoming[2] if upcoming is not None else None,
+                )
+                prev_course_page = course_page
+            duration_s = round(time.monotonic() - course_started, 3)
+            if status == "skipped" and queue.defer is not None:
+                queue.defer(line_no, url)
 
             if status in {"completed", "skipped", "skipped_force"} and course_page is not None:
-                try:
-                    await course_page.close()
-                except Exception:
-                    pass
+                await _release_page(course_page)
                 prev_course_page = None
 
-            if done_after:
-                return
+            _log("课程结束：后台刷新个人中心并计算本课增量")
+            accounting = asyncio.create_task(
+                _account_course(
+                    context,
+                    accounting if accounting is not None else completed_hours_cache,
+                    url_file,
+                    url,
+                    course_no,
+                    status,
+                    duration_s,
+                    cause,
+                )
+            )
 
             if not using_existing_context:
                 if prev_course_page is not None:
@@ -948,6 +1917,19 @@ async def main(argv: list[str] | None = None) -> None:
                 else:
                     await _close_other_pages(context, {personal_page})
 
+            if upcoming is None:
+                upcoming = await queue.next(stop=all_done)
+    finally:
+        _playback.report(force=True)
+        if accounting is not None and not accounting.done():
+            _log("等待最后一门课的学时核算完成")
+            try:
+                _, done_after = await accounting
+                if done_after and _course_store is not None:
+                    await _store_call("set_flag", "all_done")
+            except Exception as exc:
+                _log(f"学时核算失败：{exc}")
+
 
 if __name__ == "__main__":
     asyncio.run(main())